@@ -3,24 +3,29 @@ Generation endpoints for Music Gen AI API.
 """
 
 import asyncio
+import functools
 import uuid
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
 import numpy as np
 import scipy.io.wavfile
-import torch
 from fastapi import APIRouter, BackgroundTasks, HTTPException
 from pydantic import BaseModel, Field
 
 from ...core.model_manager import ModelManager
+from ...generation.progress import CancellationToken, GenerationProgress
 from ...optimization.fast_generator import GenerationRequest as OptRequest
+from ...utils.exceptions import GenerationCancelled
 
 router = APIRouter()
 
 # Task storage (in production, use Redis or database)
 tasks: Dict[str, Dict[str, Any]] = {}
 
+# Cancellation tokens of single-generation tasks that have not finished yet
+cancellation_tokens: Dict[str, CancellationToken] = {}
+
 # Configuration
 TEMP_DIR = Path("/tmp/musicgen")
 TEMP_DIR.mkdir(exist_ok=True)
@@ -61,6 +66,9 @@ class GenerationResponse(BaseModel):
     duration: Optional[float] = Field(None, description="Actual audio duration")
     metadata: Optional[Dict[str, Any]] = Field(None, description="Generation metadata")
     error: Optional[str] = Field(None, description="Error message if failed")
+    progress: Optional[Dict[str, Any]] = Field(
+        None, description="Tokens generated so far and tokens per second"
+    )
 
 
 class BatchGenerationRequest(BaseModel):
@@ -89,6 +97,7 @@ async def generate_music(
         "request": request.dict(),
         "created_at": asyncio.get_event_loop().time(),
     }
+    cancellation_tokens[task_id] = CancellationToken()
 
     # Start background generation
     background_tasks.add_task(
@@ -164,10 +173,33 @@ async def get_generation_status(task_id: str):
         response.metadata = task.get("metadata")
     elif task["status"] == "failed":
         response.error = task.get("error")
+    response.progress = task.get("progress")
 
     return response
 
 
+@router.delete("/{task_id}", response_model=GenerationResponse)
+async def cancel_generation(task_id: str):
+    """Cancel a pending or running generation task."""
+
+    if task_id not in tasks:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    token = cancellation_tokens.get(task_id)
+    if token is None:
+        raise HTTPException(status_code=409, detail="Task cannot be cancelled")
+
+    # The worker stops at its next decode step and marks the task cancelled
+    token.cancel()
+    tasks[task_id]["status"] = "cancelling"
+
+    return GenerationResponse(
+        task_id=task_id,
+        status="cancelling",
+        progress=tasks[task_id].get("progress"),
+    )
+
+
 @router.get("/batch/{batch_id}")
 async def get_batch_status(batch_id: str):
     """Get status of a batch generation."""
@@ -207,24 +239,41 @@ async def get_batch_status(batch_id: str):
 async def generate_music_task(task_id: str, request: GenerationRequest):
     """Background task for music generation."""
 
+    cancellation_token = cancellation_tokens.get(task_id)
+
+    def report_progress(progress: GenerationProgress):
+        tasks[task_id]["progress"] = {
+            "tokens_done": progress.tokens_done,
+            "total_tokens": progress.total_tokens,
+            "tokens_per_second": progress.tokens_per_second,
+        }
+
     try:
-        tasks[task_id]["status"] = "processing"
+        if tasks[task_id]["status"] == "pending":
+            tasks[task_id]["status"] = "processing"
 
         # Get model from manager
         model_manager = ModelManager()
         model = model_manager.get_model("facebook/musicgen-small")
 
-        # Set random seed if provided
+        # Set random seed if provided; the generator also seeds this request's sampling
         if request.seed is not None:
-            torch.manual_seed(request.seed)
             np.random.seed(request.seed)
 
-        # Generate audio using optimized pipeline
-        result = model.generate_single(
-            prompt=request.prompt,
-            duration=request.duration,
-            temperature=request.temperature,
-            guidance_scale=request.guidance_scale,
+        # Generate audio using optimized pipeline, off the event loop so that
+        # status and cancel requests are served while it runs
+        result = await asyncio.get_running_loop().run_in_executor(
+            None,
+            functools.partial(
+                model.generate_single,
+                prompt=request.prompt,
+                duration=request.duration,
+                temperature=request.temperature,
+                guidance_scale=request.guidance_scale,
+                progress_callback=report_progress,
+                cancellation_token=cancellation_token,
+                seed=request.seed,
+            ),
         )
 
         # Save audio file
@@ -265,6 +314,14 @@ async def generate_music_task(task_id: str, request: GenerationRequest):
             }
         )
 
+    except GenerationCancelled:
+        tasks[task_id].update(
+            {
+                "status": "cancelled",
+                "cancelled_at": asyncio.get_event_loop().time(),
+            }
+        )
+
     except Exception as e:
         tasks[task_id].update(
             {
@@ -274,6 +331,9 @@ async def generate_music_task(task_id: str, request: GenerationRequest):
             }
         )
 
+    finally:
+        cancellation_tokens.pop(task_id, None)
+
 
 async def generate_music_batch_task(batch_id: str, requests: List[GenerationRequest]):
     """Background task for batch music generation."""
@@ -291,6 +351,7 @@ async def generate_music_batch_task(batch_id: str, requests: List[GenerationRequ
                 temperature=req.temperature,
                 guidance_scale=req.guidance_scale,
                 request_id=f"{batch_id}_{i}",
+                seed=req.seed,
             )
             for i, req in enumerate(requests)
         ]
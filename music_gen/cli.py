@@ -3,7 +3,6 @@ Command-line interface for MusicGen.
 """
 
 import logging
-import time
 from pathlib import Path
 from typing import Optional
 
@@ -22,6 +21,7 @@ from rich.progress import (
 )
 from rich.table import Table
 
+from .generation.progress import CancellationToken, GenerationProgress
 from .optimization.fast_generator import FastMusicGenerator
 
 # Configure logging
@@ -133,36 +133,38 @@ def generate(
             TextColumn("[progress.description]{task.description}"),
             BarColumn(),
             TaskProgressColumn(),
+            TextColumn("{task.fields[rate]}"),
             TimeElapsedColumn(),
         ) as progress:
 
             gen_task = progress.add_task(
                 f"Generating '{prompt[:50]}...'" if len(prompt) > 50 else f"Generating '{prompt}'",
                 total=100,
+                rate="",
             )
 
-            start_time = time.time()
-
-            # Simulate progress during generation (since we can't get real progress from model)
-            import threading
-
-            def update_progress():
-                elapsed = 0
-                target_time = 45 if device == "cuda" else 90  # Estimated times
-                while elapsed < target_time and not progress.finished:
-                    elapsed = time.time() - start_time
-                    progress_pct = min(95, (elapsed / target_time) * 100)
-                    progress.update(gen_task, completed=progress_pct)
-                    time.sleep(1)
-
-            progress_thread = threading.Thread(target=update_progress)
-            progress_thread.daemon = True
-            progress_thread.start()
+            # Progress is reported by the decode loop after every token
+            def update_progress(step: GenerationProgress):
+                progress.update(
+                    gen_task,
+                    completed=step.fraction * 100,
+                    rate=f"{step.tokens_per_second:.1f} tok/s",
+                )
 
-            # Actual generation
-            result = model.generate_single(
-                prompt=prompt, duration=duration, temperature=temperature, guidance_scale=3.0
-            )
+            cancellation = CancellationToken()
+            try:
+                result = model.generate_single(
+                    prompt=prompt,
+                    duration=duration,
+                    temperature=temperature,
+                    guidance_scale=3.0,
+                    progress_callback=update_progress,
+                    cancellation_token=cancellation,
+                )
+            except KeyboardInterrupt:
+                # Stop the decode loop instead of leaving it running in the background
+                cancellation.cancel()
+                raise
 
             progress.update(gen_task, completed=100)
 
@@ -3,10 +3,59 @@ Generation utilities for MusicGen.
 """
 
 from .beam_search import BeamHypothesis, BeamSearchConfig, BeamSearcher, beam_search_generate
+from .logits_process import (
+    ClassifierFreeGuidanceLogitsProcessor,
+    LogitsProcessor,
+    LogitsProcessorList,
+    MinLengthLogitsProcessor,
+    NoRepeatNGramLogitsProcessor,
+    RepetitionPenaltyLogitsProcessor,
+    TemperatureLogitsWarper,
+    TopKLogitsWarper,
+    TopPLogitsWarper,
+    TypicalLogitsWarper,
+    apply_repetition_penalty,
+    apply_top_k_filtering,
+    apply_top_p_filtering,
+    apply_typical_filtering,
+    build_logits_processor,
+    build_logits_processor_from_config,
+)
+from .prefix_cache import PrefixCache, PrefixCacheEntry
+from .progress import CancellationToken, GenerationProgress, ProgressCallback, ProgressMonitor
+from .scheduler import ContinuousBatchingScheduler, DecodeRequest
+from .speculative import SpeculativeDecoder
+from .token_buffer import TokenBuffer
 
 __all__ = [
     "BeamSearchConfig",
     "BeamHypothesis",
     "BeamSearcher",
     "beam_search_generate",
+    "ClassifierFreeGuidanceLogitsProcessor",
+    "LogitsProcessor",
+    "LogitsProcessorList",
+    "MinLengthLogitsProcessor",
+    "NoRepeatNGramLogitsProcessor",
+    "RepetitionPenaltyLogitsProcessor",
+    "TemperatureLogitsWarper",
+    "TopKLogitsWarper",
+    "TopPLogitsWarper",
+    "TypicalLogitsWarper",
+    "apply_repetition_penalty",
+    "apply_top_k_filtering",
+    "apply_top_p_filtering",
+    "apply_typical_filtering",
+    "build_logits_processor",
+    "build_logits_processor_from_config",
+    "ContinuousBatchingScheduler",
+    "DecodeRequest",
+    "PrefixCache",
+    "PrefixCacheEntry",
+    "CancellationToken",
+    "GenerationProgress",
+    "ProgressCallback",
+    "ProgressMonitor",
+    "SpeculativeDecoder",
+    "TokenBuffer",
 ]
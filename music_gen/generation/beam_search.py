@@ -9,6 +9,21 @@ from typing import Dict, List, Optional, Tuple
 import torch
 import torch.nn.functional as F
 
+from .logits_process import (
+    LogitsProcessorList,
+    MinLengthLogitsProcessor,
+    NoRepeatNGramLogitsProcessor,
+    RepetitionPenaltyLogitsProcessor,
+    TemperatureLogitsWarper,
+    TopKLogitsWarper,
+    TopPLogitsWarper,
+    apply_repetition_penalty,
+    apply_top_k_filtering,
+    apply_top_p_filtering,
+)
+from .progress import ProgressMonitor
+from .token_buffer import TokenBuffer
+
 logger = logging.getLogger(__name__)
 
 
@@ -33,6 +48,22 @@ class BeamSearchConfig:
     pad_token_id: int = 0
     eos_token_id: int = 2
     bos_token_id: int = 1
+    # Sequences returned per input; with beam groups, each group's best comes first
+    num_return_sequences: int = 1
+    # Select beams with the original per-candidate Python loop (for comparisons)
+    legacy_beam_selection: bool = False
+
+    def __post_init__(self):
+        if self.num_beam_groups < 1 or self.num_beams % self.num_beam_groups != 0:
+            raise ValueError(
+                f"num_beams ({self.num_beams}) must be divisible by "
+                f"num_beam_groups ({self.num_beam_groups})"
+            )
+        if not 1 <= self.num_return_sequences <= self.num_beams:
+            raise ValueError(
+                f"num_return_sequences ({self.num_return_sequences}) must be between 1 "
+                f"and num_beams ({self.num_beams})"
+            )
 
 
 class BeamHypothesis:
@@ -43,10 +74,12 @@ class BeamHypothesis:
         tokens: torch.Tensor,
         score: float,
         past_key_values: Optional[Tuple] = None,
+        group: int = 0,
     ):
         self.tokens = tokens
         self.score = score
         self.past_key_values = past_key_values
+        self.group = group
 
     def __len__(self):
         return len(self.tokens)
@@ -66,7 +99,7 @@ class BeamHypothesis:
         """Add a token to this hypothesis."""
         new_tokens = torch.cat([self.tokens, torch.tensor([token_id], device=self.tokens.device)])
         new_score = self.score + log_prob
-        return BeamHypothesis(new_tokens, new_score, past_key_values)
+        return BeamHypothesis(new_tokens, new_score, past_key_values, self.group)
 
     def get_length_normalized_score(self, length_penalty: float) -> float:
         """Get length-normalized score."""
@@ -90,11 +123,13 @@ class BeamSearcher:
         self.repetition_penalty = config.repetition_penalty
         self.length_penalty = config.length_penalty
         self.diversity_penalty = config.diversity_penalty
+        self.num_return_sequences = config.num_return_sequences
         self.early_stopping = config.early_stopping
         self.no_repeat_ngram_size = config.no_repeat_ngram_size
         self.pad_token_id = config.pad_token_id
         self.eos_token_id = config.eos_token_id
         self.bos_token_id = config.bos_token_id
+        self.legacy_beam_selection = config.legacy_beam_selection
 
         # For diverse beam search
         self.num_beam_groups = config.num_beam_groups
@@ -105,6 +140,15 @@ class BeamSearcher:
                 f"num_beams ({self.num_beams}) must be divisible by num_beam_groups ({self.num_beam_groups})"
             )
 
+        # Penalties and filtering, shared with the sampling decoders. The n-gram
+        # ban keeps a per-beam index that follows the beams as they are reordered
+        self.ngram_processor = (
+            NoRepeatNGramLogitsProcessor(self.no_repeat_ngram_size)
+            if self.no_repeat_ngram_size > 0
+            else None
+        )
+        self.logits_processor = self._build_logits_processor()
+
     @torch.no_grad()
     def search(
         self,
@@ -114,6 +158,8 @@ class BeamSearcher:
         encoder_attention_mask: Optional[torch.Tensor] = None,
         conditioning_embeddings: Optional[torch.Tensor] = None,
         attention_mask: Optional[torch.Tensor] = None,
+        monitor: Optional[ProgressMonitor] = None,
+        past_key_values=None,
         **model_kwargs,
     ) -> Tuple[torch.Tensor, torch.Tensor]:
         """
@@ -126,10 +172,15 @@ class BeamSearcher:
             encoder_attention_mask: Encoder attention mask
             conditioning_embeddings: Conditioning embeddings
             attention_mask: Decoder attention mask
+            monitor: Progress reporting and cancellation check run after every step
+            past_key_values: Empty cache with a row per beam to decode into (e.g. a
+                ``PagedKVCache``, whose beams are reordered without copying keys and
+                values). By default the model's tuple cache is reordered by copying
             **model_kwargs: Additional model arguments
 
         Returns:
-            Tuple of (generated_sequences, scores)
+            Tuple of (generated_sequences, scores). Sequences of one input are
+            consecutive rows: [batch_size * num_return_sequences, length]
         """
 
         batch_size = input_ids.shape[0]
@@ -149,28 +200,40 @@ class BeamSearcher:
         if attention_mask is not None:
             attention_mask = self._expand_for_beams(attention_mask, self.num_beams)
 
-        # Initialize beam search state
-        beam_scores = torch.zeros((batch_size, self.num_beams), dtype=torch.float, device=device)
-        beam_scores[:, 1:] = -1e9  # Only first beam is active initially
+        # Initialize beam search state. Only the first beam of every group is
+        # active initially, so each group starts from the prompt
+        beam_scores = torch.zeros(
+            (batch_size, self.num_beam_groups, self.group_size), dtype=torch.float, device=device
+        )
+        beam_scores[:, :, 1:] = -1e9
         beam_scores = beam_scores.view(-1)  # [batch_size * num_beams]
 
         # Track finished sequences
         done = [False for _ in range(batch_size)]
         generated_hyps = [[] for _ in range(batch_size)]
 
-        # Generation loop
+        # Generation loop. Tokens (and the decoder mask) live in preallocated
+        # buffers so each step writes one column instead of reallocating
         cur_len = input_ids.shape[-1]
-        past_key_values = None
+        if self.ngram_processor is not None:
+            self.ngram_processor.reset()
+        prefill = True
+        tokens = TokenBuffer.from_tokens(
+            input_ids, max(self.max_length, cur_len), fill_value=self.pad_token_id
+        )
+        if attention_mask is not None:
+            mask_buffer = attention_mask.new_ones((attention_mask.shape[0], tokens.max_length))
+            mask_buffer[:, :cur_len] = attention_mask
 
         while cur_len < self.max_length:
-            # Get model outputs
+            # Get model outputs. Once a cache exists only the newest token is fed;
+            # cross-attention keys/values are reused from the cache, so the encoder
+            # states are not re-projected on later steps.
             model_inputs = self._prepare_model_inputs(
-                input_ids=input_ids,
+                input_ids=tokens.view() if prefill else tokens.last(),
                 encoder_hidden_states=encoder_hidden_states,
                 encoder_attention_mask=encoder_attention_mask,
-                conditioning_embeddings=(
-                    conditioning_embeddings if cur_len == input_ids.shape[-1] else None
-                ),
+                conditioning_embeddings=conditioning_embeddings if prefill else None,
                 attention_mask=attention_mask,
                 past_key_values=past_key_values,
                 use_cache=True,
@@ -180,6 +243,7 @@ class BeamSearcher:
             outputs = model(**model_inputs)
             next_token_logits = outputs["logits"][:, -1, :]  # [batch_size * num_beams, vocab_size]
             past_key_values = outputs.get("past_key_values")
+            prefill = past_key_values is None
 
             # Process logits
             next_token_scores = F.log_softmax(next_token_logits, dim=-1)
@@ -187,7 +251,7 @@ class BeamSearcher:
             # Apply penalties and filtering
             next_token_scores = self._postprocess_next_token_scores(
                 scores=next_token_scores,
-                input_ids=input_ids,
+                input_ids=tokens.view(),
                 cur_len=cur_len,
                 batch_size=batch_size,
             )
@@ -208,38 +272,32 @@ class BeamSearcher:
             beam_scores = next_token_scores
 
             # Reorder sequences based on beam indices
-            input_ids = input_ids[beam_indices]
+            tokens.reorder(beam_indices)
+            if self.ngram_processor is not None:
+                self.ngram_processor.reorder(beam_indices)
             if past_key_values is not None:
                 past_key_values = self._reorder_cache(past_key_values, beam_indices)
 
             # Append tokens
-            input_ids = torch.cat([input_ids, next_tokens.unsqueeze(-1)], dim=-1)
-
-            # Update attention mask
-            if attention_mask is not None:
-                attention_mask = torch.cat(
-                    [
-                        attention_mask,
-                        torch.ones(
-                            (attention_mask.shape[0], 1), device=device, dtype=attention_mask.dtype
-                        ),
-                    ],
-                    dim=-1,
-                )
+            tokens.append(next_tokens)
 
             cur_len += 1
+            if attention_mask is not None:
+                attention_mask = mask_buffer[:, :cur_len]
+            if monitor is not None:
+                monitor.step(cur_len - input_ids.shape[-1])
 
             # Check for EOS and early stopping
             if self.early_stopping:
                 done, generated_hyps = self._check_early_stopping(
-                    input_ids, beam_scores, cur_len, batch_size, done, generated_hyps
+                    tokens.view(), beam_scores, cur_len, batch_size, done, generated_hyps
                 )
                 if all(done):
                     break
 
         # Finalize generation
         return self._finalize_generation(
-            input_ids, beam_scores, batch_size, done, generated_hyps, cur_len
+            tokens.view(), beam_scores, batch_size, done, generated_hyps, cur_len
         )
 
     def _expand_for_beams(self, tensor: torch.Tensor, num_beams: int) -> torch.Tensor:
@@ -273,32 +331,24 @@ class BeamSearcher:
         batch_size: int,
     ) -> torch.Tensor:
         """Apply various penalties and filtering to logits."""
+        return self.logits_processor(input_ids, scores)
 
-        # Apply temperature
+    def _build_logits_processor(self) -> LogitsProcessorList:
+        """Build the penalty/filtering pipeline once per searcher."""
+        processors = LogitsProcessorList()
         if self.temperature != 1.0:
-            scores = scores / self.temperature
-
-        # Apply repetition penalty
+            processors.append(TemperatureLogitsWarper(self.temperature))
         if self.repetition_penalty != 1.0:
-            scores = self._apply_repetition_penalty(scores, input_ids)
-
-        # Enforce minimum length
-        if cur_len < self.min_length:
-            scores[:, self.eos_token_id] = -float("inf")
-
-        # Apply n-gram repetition penalty
-        if self.no_repeat_ngram_size > 0:
-            scores = self._apply_ngram_penalty(scores, input_ids, cur_len)
-
-        # Apply top-k filtering
+            processors.append(RepetitionPenaltyLogitsProcessor(self.repetition_penalty))
+        if self.min_length > 0:
+            processors.append(MinLengthLogitsProcessor(self.min_length, self.eos_token_id))
+        if self.ngram_processor is not None:
+            processors.append(self.ngram_processor)
         if self.top_k > 0:
-            scores = self._apply_top_k_filtering(scores)
-
-        # Apply top-p filtering
+            processors.append(TopKLogitsWarper(self.top_k))
         if self.top_p < 1.0:
-            scores = self._apply_top_p_filtering(scores)
-
-        return scores
+            processors.append(TopPLogitsWarper(self.top_p))
+        return processors
 
     def _apply_repetition_penalty(
         self,
@@ -306,74 +356,67 @@ class BeamSearcher:
         input_ids: torch.Tensor,
     ) -> torch.Tensor:
         """Apply repetition penalty."""
-        for i in range(scores.shape[0]):
-            for previous_token in set(input_ids[i].tolist()):
-                if scores[i, previous_token] < 0:
-                    scores[i, previous_token] *= self.repetition_penalty
-                else:
-                    scores[i, previous_token] /= self.repetition_penalty
-        return scores
-
-    def _apply_ngram_penalty(
-        self,
-        scores: torch.Tensor,
-        input_ids: torch.Tensor,
-        cur_len: int,
-    ) -> torch.Tensor:
-        """Apply n-gram repetition penalty."""
-        if cur_len + 1 < self.no_repeat_ngram_size:
-            return scores
-
-        batch_size = input_ids.shape[0]
-
-        for batch_idx in range(batch_size):
-            # Get the last n-1 tokens
-            ngram_prefix = input_ids[batch_idx, -(self.no_repeat_ngram_size - 1) :].tolist()
-
-            # Find all n-grams in the sequence
-            banned_tokens = set()
-            for i in range(len(input_ids[batch_idx]) - self.no_repeat_ngram_size + 1):
-                ngram = input_ids[batch_idx, i : i + self.no_repeat_ngram_size].tolist()
-                if ngram[:-1] == ngram_prefix:
-                    banned_tokens.add(ngram[-1])
-
-            # Ban repeated tokens
-            for token in banned_tokens:
-                scores[batch_idx, token] = -float("inf")
-
-        return scores
+        return apply_repetition_penalty(scores, input_ids, self.repetition_penalty)
 
     def _apply_top_k_filtering(self, scores: torch.Tensor) -> torch.Tensor:
         """Apply top-k filtering."""
-        top_k_scores, top_k_indices = torch.topk(scores, self.top_k, dim=-1)
-        scores_filtered = torch.full_like(scores, -float("inf"))
-        scores_filtered.scatter_(-1, top_k_indices, top_k_scores)
-        return scores_filtered
+        return apply_top_k_filtering(scores, self.top_k)
 
     def _apply_top_p_filtering(self, scores: torch.Tensor) -> torch.Tensor:
         """Apply top-p (nucleus) filtering."""
-        sorted_logits, sorted_indices = torch.sort(scores, descending=True, dim=-1)
-        cumulative_probs = torch.cumsum(F.softmax(sorted_logits, dim=-1), dim=-1)
+        return apply_top_p_filtering(scores, self.top_p)
+
+    def _beam_search_step(
+        self,
+        next_token_scores: torch.Tensor,
+        beam_scores: torch.Tensor,
+        batch_size: int,
+    ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """
+        Perform single beam search step.
+
+        EOS continuations are masked out and the ``num_beams`` best of the
+        remaining ``num_beams * vocab_size`` candidates of every batch item are
+        taken with one top-k, so selection stays on the device and always
+        yields exactly ``num_beams`` beams per item.
 
-        # Remove tokens with cumulative probability above threshold
-        sorted_indices_to_remove = cumulative_probs > self.top_p
-        sorted_indices_to_remove[..., 1:] = sorted_indices_to_remove[..., :-1].clone()
-        sorted_indices_to_remove[..., 0] = 0
+        Returns:
+            Tuple of (beam_scores, beam_tokens, beam_indices), each of shape
+            [batch_size * num_beams]; beam indices are flat rows of the previous step
+        """
+        if self.legacy_beam_selection:
+            return self._beam_search_step_legacy(next_token_scores, beam_scores, batch_size)
 
-        # Set filtered logits to -inf
-        for i in range(scores.shape[0]):
-            indices_to_remove = sorted_indices[i][sorted_indices_to_remove[i]]
-            scores[i][indices_to_remove] = -float("inf")
+        vocab_size = next_token_scores.shape[-1]
 
-        return scores
+        next_scores = next_token_scores + beam_scores[:, None]
+        if self.eos_token_id is not None:
+            next_scores[:, self.eos_token_id] = -float("inf")
+
+        next_scores, candidates = torch.topk(
+            next_scores.view(batch_size, self.num_beams * vocab_size),
+            self.num_beams,
+            dim=1,
+            largest=True,
+            sorted=True,
+        )
 
-    def _beam_search_step(
+        beam_tokens = candidates % vocab_size
+        beam_offsets = torch.arange(
+            0, batch_size * self.num_beams, self.num_beams, device=candidates.device
+        )
+        beam_indices = torch.div(candidates, vocab_size, rounding_mode="floor")
+        beam_indices += beam_offsets[:, None]
+
+        return next_scores.view(-1), beam_tokens.view(-1), beam_indices.view(-1)
+
+    def _beam_search_step_legacy(
         self,
         next_token_scores: torch.Tensor,
         beam_scores: torch.Tensor,
         batch_size: int,
-    ) -> Tuple[torch.Tensor, torch.Tensor]:
-        """Perform single beam search step."""
+    ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        """Reference beam selection looping over candidates in Python (one sync per candidate)."""
 
         vocab_size = next_token_scores.shape[-1]
 
@@ -427,24 +470,83 @@ class BeamSearcher:
         cur_len: int,
         batch_size: int,
     ) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
-        """Perform diverse beam search step."""
-        # For simplicity, fall back to standard beam search
-        # Full diverse beam search implementation would be more complex
-        return self._beam_search_step(next_token_scores, beam_scores, batch_size)
+        """
+        Perform one step of Hamming-diversity group beam search.
+
+        The beams of every batch item form ``num_beam_groups`` groups of
+        ``group_size`` that were all scored by the same forward pass. Groups
+        then select in turn, each keeping its ``group_size`` best continuations
+        of its own beams after lowering every token's score by
+        ``diversity_penalty`` times the number of beams of earlier groups that
+        picked that token at this step.
+
+        Returns:
+            Tuple of (beam_scores, beam_tokens, beam_indices) laid out like
+            :meth:`_beam_search_step`; beams never move between groups
+        """
+        vocab_size = next_token_scores.shape[-1]
+        group_size = self.group_size
+
+        next_scores = next_token_scores + beam_scores[:, None]
+        if self.eos_token_id is not None:
+            next_scores[:, self.eos_token_id] = -float("inf")
+        next_scores = next_scores.view(batch_size, self.num_beam_groups, group_size * vocab_size)
+
+        # How often earlier groups chose each token for every batch item
+        token_counts = next_scores.new_zeros(batch_size, vocab_size)
+        group_scores, group_tokens, group_indices = [], [], []
+        for group in range(self.num_beam_groups):
+            scores = next_scores[:, group]
+            if group > 0 and self.diversity_penalty != 0.0:
+                penalty = self.diversity_penalty * token_counts
+                scores = scores - penalty.repeat(1, group_size)
+
+            scores, candidates = torch.topk(scores, group_size, dim=1, largest=True, sorted=True)
+            tokens = candidates % vocab_size
+            token_counts.scatter_add_(1, tokens, torch.ones_like(scores))
+
+            group_scores.append(scores)
+            group_tokens.append(tokens)
+            group_indices.append(
+                torch.div(candidates, vocab_size, rounding_mode="floor") + group * group_size
+            )
+
+        beam_offsets = torch.arange(
+            0, batch_size * self.num_beams, self.num_beams, device=next_scores.device
+        )
+        beam_indices = torch.cat(group_indices, dim=1) + beam_offsets[:, None]
+
+        return (
+            torch.cat(group_scores, dim=1).view(-1),
+            torch.cat(group_tokens, dim=1).view(-1),
+            beam_indices.view(-1),
+        )
 
     def _reorder_cache(
         self,
         past_key_values: Tuple,
         beam_indices: torch.Tensor,
     ) -> Tuple:
-        """Reorder past key values according to beam indices."""
+        """
+        Reorder past key values according to beam indices.
+
+        Caches that implement ``reorder_beams`` (block-paged caches) reorder in
+        place by moving block references; tuple caches are copied row by row.
+        """
+        if hasattr(past_key_values, "reorder_beams"):
+            past_key_values.reorder_beams(beam_indices)
+            return past_key_values
+
         reordered_past = []
         for layer_past in past_key_values:
             if isinstance(layer_past, tuple):
-                # (key, value) tuple
+                # (key, value) tuple, optionally followed by cross-attention (key, value).
+                # Beams never move across batch items and every beam of an item
+                # attends to the same text, so cross-attention entries stay put.
                 reordered_layer = tuple(
-                    past_state.index_select(0, beam_indices) for past_state in layer_past
+                    past_state.index_select(0, beam_indices) for past_state in layer_past[:2]
                 )
+                reordered_layer = reordered_layer + tuple(layer_past[2:])
             else:
                 # Single tensor
                 reordered_layer = layer_past.index_select(0, beam_indices)
@@ -474,7 +576,10 @@ class BeamSearcher:
                 if beam_tokens[-1] == self.eos_token_id:
                     # This beam finished
                     score = beam_scores[effective_beam_id].item()
-                    hyp = BeamHypothesis(beam_tokens[:-1], score)  # Remove EOS
+                    # Clone: beam_tokens is a view into the reusable token buffer
+                    hyp = BeamHypothesis(
+                        beam_tokens[:-1].clone(), score, group=beam_id // self.group_size
+                    )  # Remove EOS
                     generated_hyps[batch_idx].append(hyp)
 
             # Check if we should stop for this batch
@@ -492,7 +597,7 @@ class BeamSearcher:
         generated_hyps: List[List[BeamHypothesis]],
         cur_len: int,
     ) -> Tuple[torch.Tensor, torch.Tensor]:
-        """Finalize generation and return best sequences."""
+        """Finalize generation and return the best ``num_return_sequences`` sequences per input."""
 
         # Add remaining beams to hypotheses
         for batch_idx in range(batch_size):
@@ -501,22 +606,14 @@ class BeamSearcher:
                 beam_tokens = input_ids[effective_beam_id]
                 score = beam_scores[effective_beam_id].item()
 
-                hyp = BeamHypothesis(beam_tokens, score)
+                hyp = BeamHypothesis(beam_tokens, score, group=beam_id // self.group_size)
                 generated_hyps[batch_idx].append(hyp)
 
-        # Select best hypothesis for each batch
-        output_batch_size = batch_size
-        sent_lengths = torch.zeros(output_batch_size, dtype=torch.long)
-        best_scores = torch.zeros(output_batch_size)
-
-        # Sort hypotheses by score
-        for batch_idx, hyps in enumerate(generated_hyps):
-            sorted_hyps = sorted(
-                hyps, key=lambda x: x.get_length_normalized_score(self.length_penalty), reverse=True
-            )
-            best_hyp = sorted_hyps[0]
-            sent_lengths[batch_idx] = len(best_hyp.tokens)
-            best_scores[batch_idx] = best_hyp.score
+        # Select the returned hypotheses for each batch item, consecutively
+        selected_hyps = [hyp for hyps in generated_hyps for hyp in self._select_hypotheses(hyps)]
+        output_batch_size = len(selected_hyps)
+        sent_lengths = torch.tensor([len(hyp.tokens) for hyp in selected_hyps], dtype=torch.long)
+        best_scores = torch.tensor([hyp.score for hyp in selected_hyps], dtype=torch.float)
 
         # Create output tensor
         max_len = sent_lengths.max().item()
@@ -527,16 +624,34 @@ class BeamSearcher:
             device=input_ids.device,
         )
 
-        # Fill with best sequences
-        for batch_idx, hyps in enumerate(generated_hyps):
-            sorted_hyps = sorted(
-                hyps, key=lambda x: x.get_length_normalized_score(self.length_penalty), reverse=True
-            )
-            best_hyp = sorted_hyps[0]
-            decoded[batch_idx, : len(best_hyp.tokens)] = best_hyp.tokens
+        # Fill with selected sequences
+        for row, hyp in enumerate(selected_hyps):
+            decoded[row, : len(hyp.tokens)] = hyp.tokens
 
         return decoded, best_scores
 
+    def _select_hypotheses(self, hyps: List[BeamHypothesis]) -> List[BeamHypothesis]:
+        """
+        Pick the ``num_return_sequences`` best hypotheses of one batch item.
+
+        Hypotheses are ranked by length-normalized score. With beam groups the
+        best hypothesis of every group is ranked ahead of any group's runner-up,
+        so returning up to ``num_beam_groups`` sequences yields one per group.
+        """
+        sorted_hyps = sorted(
+            hyps, key=lambda x: x.get_length_normalized_score(self.length_penalty), reverse=True
+        )
+        if self.num_beam_groups > 1:
+            group_ranks = {}
+            ranks = []
+            for hyp in sorted_hyps:
+                ranks.append(group_ranks.get(hyp.group, 0))
+                group_ranks[hyp.group] = ranks[-1] + 1
+            # sorted() is stable, so hypotheses of equal rank stay ordered by score
+            order = sorted(range(len(sorted_hyps)), key=lambda i: ranks[i])
+            sorted_hyps = [sorted_hyps[i] for i in order]
+        return sorted_hyps[: self.num_return_sequences]
+
 
 def beam_search_generate(
     model,
@@ -545,6 +660,8 @@ def beam_search_generate(
     encoder_hidden_states: Optional[torch.Tensor] = None,
     encoder_attention_mask: Optional[torch.Tensor] = None,
     conditioning_embeddings: Optional[torch.Tensor] = None,
+    monitor: Optional[ProgressMonitor] = None,
+    past_key_values=None,
     **model_kwargs,
 ) -> Tuple[torch.Tensor, torch.Tensor]:
     """
@@ -557,6 +674,8 @@ def beam_search_generate(
         encoder_hidden_states: Encoder outputs
         encoder_attention_mask: Encoder attention mask
         conditioning_embeddings: Conditioning embeddings
+        monitor: Progress reporting and cancellation check run after every step
+        past_key_values: Empty cache to decode into (see :meth:`BeamSearcher.search`)
         **model_kwargs: Additional model arguments
 
     Returns:
@@ -570,5 +689,7 @@ def beam_search_generate(
         encoder_hidden_states=encoder_hidden_states,
         encoder_attention_mask=encoder_attention_mask,
         conditioning_embeddings=conditioning_embeddings,
+        monitor=monitor,
+        past_key_values=past_key_values,
         **model_kwargs,
     )
@@ -0,0 +1,424 @@
+"""
+Batched logits processing for MusicGen sampling and beam search.
+
+Every stage operates on the whole ``(batch, vocab)`` score matrix with
+gather/scatter so the decoding loops never drop into per-row Python code
+or synchronize with the host.
+
+Stages are composed into a :class:`LogitsProcessorList` once per request.
+The list copies the model's scores into a work buffer it owns and every
+stage then edits that buffer in place, so a decoding step allocates no
+new ``(batch, vocab)`` tensors beyond what sorting requires.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import torch
+import torch.nn.functional as F
+
+
+class LogitsProcessor:
+    """
+    Base class for a single logits processing stage.
+
+    Subclasses modify ``scores`` in place and return it. Per-request
+    parameters are validated in ``__init__``; scratch tensors are kept
+    across steps and only reallocated when the batch shape changes.
+    """
+
+    def __init__(self):
+        self._buffers: Dict[str, torch.Tensor] = {}
+
+    def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor) -> torch.Tensor:
+        raise NotImplementedError
+
+    def _buffer(self, name: str, like: torch.Tensor, dtype: torch.dtype) -> torch.Tensor:
+        """Get a reusable scratch tensor shaped like ``like``."""
+        buffer = self._buffers.get(name)
+        if (
+            buffer is None
+            or buffer.shape != like.shape
+            or buffer.dtype != dtype
+            or buffer.device != like.device
+        ):
+            buffer = torch.empty(like.shape, dtype=dtype, device=like.device)
+            self._buffers[name] = buffer
+        return buffer
+
+
+class TemperatureLogitsWarper(LogitsProcessor):
+    """Divide scores by a sampling temperature."""
+
+    def __init__(self, temperature: float):
+        super().__init__()
+        if temperature <= 0:
+            raise ValueError(f"temperature must be positive, got {temperature}")
+        self.temperature = temperature
+
+    def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor) -> torch.Tensor:
+        return scores.div_(self.temperature)
+
+
+class ClassifierFreeGuidanceLogitsProcessor(LogitsProcessor):
+    """
+    Combine conditional and unconditional scores with classifier-free guidance.
+
+    ``scores`` holds the conditional rows followed by the unconditional rows
+    of the same prompts (a doubled batch), ``input_ids`` only the conditional
+    rows. The result is ``uncond + guidance_scale * (cond - uncond)`` for the
+    conditional rows, so this stage must run first and later stages see the
+    original batch size.
+    """
+
+    def __init__(self, guidance_scale: float):
+        super().__init__()
+        if guidance_scale <= 0:
+            raise ValueError(f"guidance_scale must be positive, got {guidance_scale}")
+        self.guidance_scale = guidance_scale
+
+    def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor) -> torch.Tensor:
+        if scores.shape[0] != 2 * input_ids.shape[0]:
+            raise ValueError(
+                f"Expected {2 * input_ids.shape[0]} rows of conditional and unconditional "
+                f"scores, got {scores.shape[0]}"
+            )
+        cond, uncond = scores.chunk(2)
+        return uncond.lerp_(cond, self.guidance_scale)
+
+
+class RepetitionPenaltyLogitsProcessor(LogitsProcessor):
+    """
+    Penalize tokens that already appear in each sequence.
+
+    Negative scores are multiplied by the penalty and positive scores divided
+    by it. Each previously generated token is penalized once, regardless of
+    how often it occurs.
+    """
+
+    def __init__(self, penalty: float):
+        super().__init__()
+        if penalty <= 0:
+            raise ValueError(f"repetition_penalty must be positive, got {penalty}")
+        self.penalty = penalty
+
+    def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor) -> torch.Tensor:
+        previous_scores = torch.gather(scores, 1, input_ids)
+        previous_scores = torch.where(
+            previous_scores < 0, previous_scores * self.penalty, previous_scores / self.penalty
+        )
+        return scores.scatter_(1, input_ids, previous_scores)
+
+
+class MinLengthLogitsProcessor(LogitsProcessor):
+    """Ban the EOS token until sequences reach ``min_length`` tokens."""
+
+    def __init__(self, min_length: int, eos_token_id: int):
+        super().__init__()
+        self.min_length = min_length
+        self.eos_token_id = eos_token_id
+
+    def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor) -> torch.Tensor:
+        if input_ids.shape[-1] < self.min_length:
+            scores[:, self.eos_token_id] = -float("inf")
+        return scores
+
+
+class NoRepeatNGramLogitsProcessor(LogitsProcessor):
+    """
+    Ban tokens that would repeat an n-gram already present in the sequence.
+
+    Every row keeps an index from (n-1)-gram prefix to the tokens that have
+    followed it. When the history grows by one token between calls only the
+    newest n-gram is added, so a step costs O(1) per row instead of a rescan
+    of the whole history. Callers that permute rows between steps (beam
+    search) pass the permutation to :meth:`reorder`; any other change in the
+    shape of the history rebuilds the index from scratch.
+    """
+
+    def __init__(self, ngram_size: int):
+        super().__init__()
+        if ngram_size <= 0:
+            raise ValueError(f"ngram_size must be positive, got {ngram_size}")
+        self.ngram_size = ngram_size
+        self._index: Optional[List[Dict[Tuple[int, ...], Tuple[int, ...]]]] = None
+        self._length = 0
+
+    def reset(self):
+        """Forget the indexed history (e.g. before a new search)."""
+        self._index = None
+        self._length = 0
+
+    def reorder(self, row_indices: torch.Tensor):
+        """Reorder the per-row indices like the batch rows (``rows = rows[row_indices]``)."""
+        if self._index is None:
+            return
+        index = []
+        seen = set()
+        for row in row_indices.tolist():
+            # Entries are shared tuples, so a shallow copy suffices for a row picked twice
+            index.append(dict(self._index[row]) if row in seen else self._index[row])
+            seen.add(row)
+        self._index = index
+
+    def _add_ngram(self, index: Dict[Tuple[int, ...], Tuple[int, ...]], ngram: List[int]):
+        prefix, token = tuple(ngram[:-1]), ngram[-1]
+        banned = index.get(prefix, ())
+        if token not in banned:
+            index[prefix] = banned + (token,)
+
+    def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor) -> torch.Tensor:
+        num_rows, cur_len = input_ids.shape
+        n = self.ngram_size
+
+        # One host transfer per step: the newest n tokens of every row
+        tails = input_ids[:, -n:].tolist()
+        if self._index is not None and len(self._index) == num_rows and cur_len == self._length + 1:
+            if cur_len >= n:
+                for index, tail in zip(self._index, tails):
+                    self._add_ngram(index, tail)
+        else:
+            self._index = []
+            for sequence in input_ids.tolist():
+                index = {}
+                for start in range(cur_len - n + 1):
+                    self._add_ngram(index, sequence[start : start + n])
+                self._index.append(index)
+        self._length = cur_len
+
+        if cur_len + 1 < n:
+            return scores
+
+        # Ban the tokens that followed the current (n-1)-token suffix before
+        rows, tokens = [], []
+        for row, (index, tail) in enumerate(zip(self._index, tails)):
+            banned = index.get(tuple(tail[len(tail) - (n - 1) :]), ())
+            rows.extend([row] * len(banned))
+            tokens.extend(banned)
+
+        if rows:
+            scores[
+                torch.tensor(rows, device=scores.device), torch.tensor(tokens, device=scores.device)
+            ] = -float("inf")
+        return scores
+
+
+class TopKLogitsWarper(LogitsProcessor):
+    """Keep the ``top_k`` highest scores per row and mask the rest with -inf."""
+
+    def __init__(self, top_k: int):
+        super().__init__()
+        if top_k <= 0:
+            raise ValueError(f"top_k must be positive, got {top_k}")
+        self.top_k = top_k
+
+    def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor) -> torch.Tensor:
+        top_k = min(self.top_k, scores.shape[-1])
+        _, top_k_indices = torch.topk(scores, top_k, dim=-1)
+
+        to_remove = self._buffer("to_remove", scores, torch.bool).fill_(True)
+        to_remove.scatter_(-1, top_k_indices, False)
+        return scores.masked_fill_(to_remove, -float("inf"))
+
+
+class TopPLogitsWarper(LogitsProcessor):
+    """
+    Nucleus filtering: keep the smallest set of tokens whose cumulative
+    probability exceeds ``top_p`` and mask the rest with -inf.
+
+    The most likely token is always kept.
+    """
+
+    def __init__(self, top_p: float):
+        super().__init__()
+        if not 0.0 <= top_p <= 1.0:
+            raise ValueError(f"top_p must be in [0, 1], got {top_p}")
+        self.top_p = top_p
+
+    def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor) -> torch.Tensor:
+        sorted_scores, sorted_indices = torch.sort(scores, descending=True, dim=-1)
+        cumulative_probs = torch.cumsum(F.softmax(sorted_scores, dim=-1), dim=-1)
+
+        # Shift right so the first token crossing the threshold is kept
+        sorted_to_remove = cumulative_probs > self.top_p
+        sorted_to_remove[..., 1:] = sorted_to_remove[..., :-1].clone()
+        sorted_to_remove[..., 0] = False
+
+        # sorted_indices is a permutation, so the scatter overwrites every entry
+        to_remove = self._buffer("to_remove", scores, torch.bool)
+        to_remove.scatter_(-1, sorted_indices, sorted_to_remove)
+        return scores.masked_fill_(to_remove, -float("inf"))
+
+
+class TypicalLogitsWarper(LogitsProcessor):
+    """
+    Locally typical sampling.
+
+    Tokens are ranked by how close their information content is to the
+    entropy of the distribution, and the smallest such set with cumulative
+    probability of at least ``typical_p`` is kept.
+    """
+
+    def __init__(self, typical_p: float, min_tokens_to_keep: int = 1):
+        super().__init__()
+        if not 0.0 < typical_p <= 1.0:
+            raise ValueError(f"typical_p must be in (0, 1], got {typical_p}")
+        self.typical_p = typical_p
+        self.min_tokens_to_keep = max(min_tokens_to_keep, 1)
+
+    def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor) -> torch.Tensor:
+        log_probs = F.log_softmax(scores, dim=-1)
+        probs = log_probs.exp()
+        entropy = -(log_probs * probs).nansum(dim=-1, keepdim=True)
+
+        # Distance of each token's surprisal from the expected surprisal
+        shifted_scores = (-log_probs - entropy).abs()
+        sorted_scores, sorted_indices = torch.sort(shifted_scores, dim=-1)
+        cumulative_probs = probs.gather(-1, sorted_indices).cumsum(dim=-1)
+
+        last_index = (cumulative_probs < self.typical_p).sum(dim=-1, keepdim=True)
+        last_index.clamp_(max=scores.shape[-1] - 1)
+        sorted_to_remove = sorted_scores > sorted_scores.gather(-1, last_index)
+        sorted_to_remove[..., : self.min_tokens_to_keep] = False
+
+        to_remove = self._buffer("to_remove", scores, torch.bool)
+        to_remove.scatter_(-1, sorted_indices, sorted_to_remove)
+        return scores.masked_fill_(to_remove, -float("inf"))
+
+
+class LogitsProcessorList(list):
+    """
+    Ordered pipeline of :class:`LogitsProcessor` stages.
+
+    Calling the list copies ``scores`` into a work buffer owned by the
+    pipeline and runs every stage on it in place. The returned tensor is
+    overwritten by the next call, so callers must consume it (e.g. softmax
+    or add to beam scores) before the following step.
+    """
+
+    def __init__(self, processors: Optional[List[LogitsProcessor]] = None):
+        super().__init__(processors or [])
+        self._scores: Optional[torch.Tensor] = None
+
+    def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor) -> torch.Tensor:
+        if not self:
+            return scores
+
+        if (
+            self._scores is None
+            or self._scores.shape != scores.shape
+            or self._scores.dtype != scores.dtype
+            or self._scores.device != scores.device
+        ):
+            self._scores = torch.empty_like(scores)
+        work = self._scores.copy_(scores)
+
+        for processor in self:
+            work = processor(input_ids, work)
+        return work
+
+
+def build_logits_processor(
+    temperature: float = 1.0,
+    top_k: int = 0,
+    top_p: float = 1.0,
+    repetition_penalty: float = 1.0,
+    typical_p: Optional[float] = None,
+    do_sample: bool = True,
+    guidance_scale: Optional[float] = None,
+) -> LogitsProcessorList:
+    """
+    Build the sampling pipeline used by :meth:`MusicGenModel.generate`.
+
+    Stages that would be no-ops are left out. Temperature and top-k, top-p
+    and typical filtering only apply when sampling; greedy decoding takes
+    the argmax of the penalized scores directly. With ``guidance_scale`` the
+    pipeline expects a doubled batch of scores (see
+    :class:`ClassifierFreeGuidanceLogitsProcessor`) and returns guided scores
+    for the conditional rows.
+
+    Args:
+        temperature: Sampling temperature
+        top_k: Top-k filtering (0 disables)
+        top_p: Nucleus filtering threshold (1.0 disables)
+        repetition_penalty: Repetition penalty factor (1.0 disables)
+        typical_p: Typical sampling mass (None or 1.0 disables)
+        do_sample: Whether tokens will be sampled
+        guidance_scale: Classifier-free guidance scale (None disables)
+
+    Returns:
+        Pipeline of logits processors
+    """
+    processors = LogitsProcessorList()
+    if guidance_scale is not None:
+        processors.append(ClassifierFreeGuidanceLogitsProcessor(guidance_scale))
+    if repetition_penalty != 1.0:
+        processors.append(RepetitionPenaltyLogitsProcessor(repetition_penalty))
+    if do_sample:
+        if temperature != 1.0:
+            processors.append(TemperatureLogitsWarper(temperature))
+        if top_k > 0:
+            processors.append(TopKLogitsWarper(top_k))
+        if top_p < 1.0:
+            processors.append(TopPLogitsWarper(top_p))
+        if typical_p is not None and typical_p < 1.0:
+            processors.append(TypicalLogitsWarper(typical_p))
+    return processors
+
+
+def build_logits_processor_from_config(inference_config) -> LogitsProcessorList:
+    """
+    Build the sampling pipeline described by an ``InferenceConfig``.
+
+    Honours ``use_nucleus_sampling`` and ``use_typical_sampling`` in
+    addition to the plain sampling parameters.
+    """
+    return build_logits_processor(
+        temperature=inference_config.temperature,
+        top_k=inference_config.top_k,
+        top_p=inference_config.top_p if inference_config.use_nucleus_sampling else 1.0,
+        repetition_penalty=inference_config.repetition_penalty,
+        typical_p=inference_config.typical_p if inference_config.use_typical_sampling else None,
+        do_sample=inference_config.do_sample,
+    )
+
+
+def apply_repetition_penalty(
+    scores: torch.Tensor,
+    input_ids: torch.Tensor,
+    penalty: float,
+) -> torch.Tensor:
+    """
+    Penalize tokens that already appear in each sequence.
+
+    Args:
+        scores: Next-token scores of shape (batch, vocab)
+        input_ids: Tokens generated so far of shape (batch, seq_len)
+        penalty: Repetition penalty factor
+
+    Returns:
+        Penalized scores (a new tensor)
+    """
+    if penalty == 1.0:
+        return scores
+    return RepetitionPenaltyLogitsProcessor(penalty)(input_ids, scores.clone())
+
+
+def apply_top_k_filtering(scores: torch.Tensor, top_k: int) -> torch.Tensor:
+    """Keep the ``top_k`` highest scores per row and mask the rest with -inf."""
+    if top_k <= 0:
+        return scores
+    return TopKLogitsWarper(top_k)(None, scores.clone())
+
+
+def apply_top_p_filtering(scores: torch.Tensor, top_p: float) -> torch.Tensor:
+    """Nucleus filtering; see :class:`TopPLogitsWarper`."""
+    if top_p >= 1.0:
+        return scores
+    return TopPLogitsWarper(top_p)(None, scores.clone())
+
+
+def apply_typical_filtering(scores: torch.Tensor, typical_p: float) -> torch.Tensor:
+    """Typical filtering; see :class:`TypicalLogitsWarper`."""
+    if typical_p >= 1.0:
+        return scores
+    return TypicalLogitsWarper(typical_p)(None, scores.clone())
@@ -0,0 +1,190 @@
+"""
+Prefix cache for repeated prompts: encoder outputs and the prefilled first decode step.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, Hashable, List, Optional, Tuple, Union
+
+import torch
+
+if TYPE_CHECKING:
+    # Imported lazily: the models package imports this module
+    from ..models.transformer.cache import StaticKVCache
+
+logger = logging.getLogger(__name__)
+
+
+def _tensor_bytes(value: Any) -> int:
+    """Bytes held by the tensors in a (nested) tuple/list/dict."""
+    if isinstance(value, torch.Tensor):
+        return value.numel() * value.element_size()
+    if isinstance(value, dict):
+        return sum(_tensor_bytes(v) for v in value.values())
+    if isinstance(value, (tuple, list)):
+        return sum(_tensor_bytes(v) for v in value)
+    return 0
+
+
+def _key_part(value: Any) -> Hashable:
+    """Hashable form of a conditioning input."""
+    if isinstance(value, torch.Tensor):
+        return tuple(value.flatten().tolist()), tuple(value.shape)
+    return value
+
+
+@dataclass
+class PrefixCacheEntry:
+    """
+    Cached state for one batch of prompts.
+
+    Attributes:
+        encoder_outputs: Output of ``MusicGenModel.prepare_inputs``
+        past_key_values: Tuple-format decoder cache after the BOS step,
+            including cross-attention keys/values
+        logits: Next-token logits of the BOS step (batch, vocab_size)
+    """
+
+    encoder_outputs: Dict[str, Optional[torch.Tensor]]
+    past_key_values: Tuple[Tuple[torch.Tensor, ...], ...]
+    logits: torch.Tensor
+
+    @classmethod
+    def from_step(
+        cls,
+        encoder_outputs: Dict[str, Optional[torch.Tensor]],
+        past_key_values: Union["StaticKVCache", Tuple[Tuple[torch.Tensor, ...], ...]],
+        logits: torch.Tensor,
+    ) -> "PrefixCacheEntry":
+        """Snapshot the state after the BOS step (copies, so decoding can continue in place)."""
+        from ..models.transformer.cache import StaticKVCache
+
+        if isinstance(past_key_values, StaticKVCache):
+            past_key_values = past_key_values.to_legacy_cache()
+        return cls(
+            encoder_outputs=encoder_outputs,
+            past_key_values=tuple(
+                tuple(state.clone() for state in layer_past) for layer_past in past_key_values
+            ),
+            logits=logits.clone(),
+        )
+
+    @property
+    def nbytes(self) -> int:
+        return (
+            _tensor_bytes(self.encoder_outputs)
+            + _tensor_bytes(self.past_key_values)
+            + _tensor_bytes(self.logits)
+        )
+
+
+class PrefixCache:
+    """
+    LRU cache of prefilled prompt state, bounded by the bytes of the stored tensors.
+
+    Entries are keyed by :meth:`make_key` (prompt texts, conditioning inputs
+    and model version) and hold the encoder outputs together with the decoder
+    KV cache and logits after the BOS step, so a repeated prompt skips the
+    text encoder, the conditioning projection and the first decode step.
+    Tensors stay on the device they were computed on.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024**2):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+
+        self._entries: "OrderedDict[Hashable, PrefixCacheEntry]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(
+        texts: List[str],
+        model_version: Hashable,
+        device: Optional[torch.device] = None,
+        **conditioning: Any,
+    ) -> Hashable:
+        """
+        Build a cache key.
+
+        Args:
+            texts: Prompt texts of the batch
+            model_version: Anything identifying the weights and precision
+                the cached state was computed with
+            device: Device the state lives on
+            **conditioning: Conditioning inputs (genre_ids, mood_ids, ...); None
+                values and tensors are both accepted
+        """
+        return (
+            model_version,
+            str(device),
+            tuple(texts),
+            tuple((name, _key_part(value)) for name, value in sorted(conditioning.items())),
+        )
+
+    def get(self, key: Hashable) -> Optional[PrefixCacheEntry]:
+        """Look up an entry and mark it as most recently used."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: Hashable, entry: PrefixCacheEntry):
+        """Store an entry, evicting least recently used ones to stay within ``max_bytes``."""
+        size = entry.nbytes
+        if size > self.max_bytes:
+            logger.debug(f"Prefix cache entry of {size} bytes exceeds max_bytes, not cached")
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._sizes.pop(key)
+                del self._entries[key]
+
+            while self._entries and self.current_bytes + size > self.max_bytes:
+                evicted_key, _ = self._entries.popitem(last=False)
+                self.current_bytes -= self._sizes.pop(evicted_key)
+                self.evictions += 1
+
+            self._entries[key] = entry
+            self._sizes[key] = size
+            self.current_bytes += size
+
+    def clear(self):
+        """Drop all entries (e.g. after the model weights changed)."""
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self.current_bytes = 0
+
+    def __deepcopy__(self, memo) -> "PrefixCache":
+        # A copied model (e.g. converted to another precision) starts with an empty cache
+        return PrefixCache(max_bytes=self.max_bytes)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def get_stats(self) -> Dict[str, int]:
+        """Hit/miss counters and memory use."""
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
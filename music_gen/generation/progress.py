@@ -0,0 +1,134 @@
+"""
+Token-level progress reporting and cooperative cancellation for generation loops.
+
+Decoding loops call :meth:`ProgressMonitor.step` once per decode step. The
+monitor raises :class:`~music_gen.utils.exceptions.GenerationCancelled` as
+soon as the request's :class:`CancellationToken` is set, so an abandoned
+request stops at the next step boundary and releases its worker.
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from ..utils.exceptions import GenerationCancelled
+
+
+@dataclass
+class GenerationProgress:
+    """
+    Progress of one generation request.
+
+    Attributes:
+        tokens_done: Decode steps completed per sequence
+        total_tokens: Decode steps the request may take at most
+        elapsed: Seconds since decoding started
+        tokens_per_second: Decode steps per second so far
+    """
+
+    tokens_done: int
+    total_tokens: int
+    elapsed: float
+    tokens_per_second: float
+
+    @property
+    def fraction(self) -> float:
+        """Completed fraction of ``total_tokens`` (sequences may stop earlier at EOS)."""
+        return min(1.0, self.tokens_done / self.total_tokens) if self.total_tokens > 0 else 1.0
+
+
+ProgressCallback = Callable[[GenerationProgress], None]
+
+
+class CancellationToken:
+    """
+    Thread-safe flag a client sets to abandon a running request.
+
+    Callbacks registered with :meth:`add_callback` run once on cancellation
+    (immediately if the token is already cancelled), e.g. to cancel a future
+    that is still waiting in a queue.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], object]] = []
+
+    def cancel(self):
+        """Request cancellation; running loops stop at their next step."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def add_callback(self, callback: Callable[[], object]):
+        """Run ``callback`` when the token is cancelled."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def raise_if_cancelled(self):
+        """Raise :class:`GenerationCancelled` if cancellation was requested."""
+        if self._event.is_set():
+            raise GenerationCancelled("Generation was cancelled")
+
+
+class ProgressMonitor:
+    """Per-request progress reporter and cancellation check for a decode loop."""
+
+    def __init__(
+        self,
+        total_tokens: int,
+        progress_callback: Optional[ProgressCallback] = None,
+        cancellation_token: Optional[CancellationToken] = None,
+    ):
+        self.total_tokens = total_tokens
+        self.progress_callback = progress_callback
+        self.cancellation_token = cancellation_token
+        self.start_time = time.perf_counter()
+
+    @classmethod
+    def create(
+        cls,
+        total_tokens: int,
+        progress_callback: Optional[ProgressCallback] = None,
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> Optional["ProgressMonitor"]:
+        """A monitor, or None when there is nothing to report to or check."""
+        if progress_callback is None and cancellation_token is None:
+            return None
+        return cls(total_tokens, progress_callback, cancellation_token)
+
+    def step(self, tokens_done: int):
+        """
+        Record a completed decode step.
+
+        Raises:
+            GenerationCancelled: If the request was cancelled
+        """
+        if self.cancellation_token is not None and self.cancellation_token.cancelled:
+            raise GenerationCancelled(
+                f"Generation was cancelled after {tokens_done} of {self.total_tokens} tokens",
+                details={"tokens_done": tokens_done, "total_tokens": self.total_tokens},
+            )
+
+        if self.progress_callback is not None:
+            elapsed = time.perf_counter() - self.start_time
+            self.progress_callback(
+                GenerationProgress(
+                    tokens_done=tokens_done,
+                    total_tokens=self.total_tokens,
+                    elapsed=elapsed,
+                    tokens_per_second=tokens_done / elapsed if elapsed > 0 else 0.0,
+                )
+            )
@@ -0,0 +1,697 @@
+"""
+Continuous (in-flight) batching for MusicGen token generation.
+
+The scheduler keeps a single running decode batch. New requests are
+prefilled on their own and join the batch at the next step boundary;
+sequences that emit EOS or reach their ``max_length`` leave immediately,
+freeing their slot for the next waiting request. Every slot keeps its own
+sampling parameters and its own rows of a shared, preallocated KV cache.
+Cancelled requests leave the batch at the next step boundary.
+"""
+
+import logging
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass
+from queue import Empty, Queue
+from typing import Dict, List, Optional, Tuple
+
+import torch
+import torch.nn.functional as F
+
+from ..models.transformer.cache import StaticKVCache
+from ..utils.exceptions import GenerationCancelled
+from .logits_process import LogitsProcessorList, build_logits_processor
+from .progress import CancellationToken, ProgressCallback, ProgressMonitor
+
+logger = logging.getLogger(__name__)
+
+# (sampling key, batch rows or None for all, per-request generators by group row)
+_SamplingGroup = Tuple[Tuple, Optional[torch.Tensor], Optional[List[Tuple[int, torch.Generator]]]]
+
+
+@dataclass
+class DecodeRequest:
+    """A single token generation request handled by the scheduler."""
+
+    prompt: str
+    max_length: int = 1024
+    temperature: float = 1.0
+    top_k: int = 50
+    top_p: float = 0.9
+    repetition_penalty: float = 1.1
+    typical_p: Optional[float] = None
+    # Classifier-free guidance scale; requires a scheduler created with ``guided=True``
+    guidance_scale: Optional[float] = None
+    do_sample: bool = True
+    genre_ids: Optional[torch.Tensor] = None
+    mood_ids: Optional[torch.Tensor] = None
+    tempo: Optional[torch.Tensor] = None
+    duration: Optional[torch.Tensor] = None
+    instrument_ids: Optional[torch.Tensor] = None
+    request_id: Optional[str] = None
+    # Draws this request's samples, so a seeded request does not depend on its batch
+    generator: Optional[torch.Generator] = None
+    # Called on the decode thread after every step of this request
+    progress_callback: Optional[ProgressCallback] = None
+    cancellation_token: Optional[CancellationToken] = None
+
+    def sampling_key(self) -> Tuple:
+        """Parameters that determine the logits pipeline for this request."""
+        return (
+            self.temperature,
+            self.top_k,
+            self.top_p,
+            self.repetition_penalty,
+            self.typical_p,
+            self.guidance_scale,
+            self.do_sample,
+        )
+
+
+class _Slot:
+    """Decoding state of one running sequence."""
+
+    def __init__(self, request: DecodeRequest, future: Future):
+        self.request = request
+        self.future = future
+        self.start = 0  # First cache column owned by this sequence
+        self.length = 0  # Tokens generated so far, including BOS
+        self.encoder_length = 0
+        self.monitor = ProgressMonitor.create(
+            request.max_length - 1, request.progress_callback, request.cancellation_token
+        )
+
+
+class ContinuousBatchingScheduler:
+    """
+    Step-level scheduler that decodes many requests in one running batch.
+
+    All active sequences share a write cursor into a preallocated KV cache
+    with ``max_batch_size`` rows. A sequence that joins mid-flight owns the
+    cache columns from its join point onwards; earlier columns of its row
+    are masked out of self-attention. Active rows are kept contiguous so
+    each step only runs the model on the occupied part of the batch.
+
+    A ``guided`` scheduler decodes with classifier-free guidance: every
+    sequence owns two adjacent cache rows, conditioned on its prompt and on
+    the null condition, which are fed the same tokens and whose logits are
+    combined with the request's ``guidance_scale`` before sampling.
+
+    Requests are submitted with :meth:`submit`, which returns a future
+    resolving to the generated ``(1, seq_len)`` token tensor. Decoding is
+    driven either by calling :meth:`step` / :meth:`run_until_complete`
+    or by a background thread started with :meth:`start`.
+    """
+
+    def __init__(
+        self,
+        model,
+        max_batch_size: int = 8,
+        max_length: Optional[int] = None,
+        device: Optional[torch.device] = None,
+        guided: bool = False,
+    ):
+        """
+        Args:
+            model: MusicGenModel to decode with
+            max_batch_size: Maximum number of sequences decoded together
+            max_length: Cache capacity in tokens; no request may exceed it.
+                Defaults to the transformer's ``max_sequence_length``.
+            device: Device to run on (defaults to the model's device)
+            guided: Decode with classifier-free guidance; every request must
+                set ``guidance_scale`` and uses two cache rows
+
+        Raises:
+            ValueError: If the model uses the delay codebook pattern, whose
+                per-codebook steps the single-token decode loop cannot run
+        """
+        if model.transformer.num_codebooks > 1:
+            raise ValueError(
+                "Continuous batching requires the flattened codebook pattern; "
+                "use MusicGenModel.generate for delay-pattern models"
+            )
+        self.model = model
+        self.transformer = model.transformer
+        self.max_batch_size = max_batch_size
+        self.guided = guided
+        self.rows_per_slot = 2 if guided else 1
+        self.max_length = max_length or model.config.transformer.max_sequence_length
+        self.device = device or next(model.parameters()).device
+        self.dtype = model.inference_dtype
+
+        self.bos_token_id = model.bos_token_id
+        self.eos_token_id = model.eos_token_id
+
+        self.cache = StaticKVCache.from_config(
+            model.config.transformer,
+            batch_size=max_batch_size * self.rows_per_slot,
+            max_length=self.max_length,
+            device=self.device,
+            dtype=self.dtype,
+        )
+
+        # Token history aligned with the cache columns; the newest sampled token
+        # of every row sits at column ``cursor`` until it is fed to the model.
+        # Unused columns hold BOS, which every sequence already contains, so the
+        # repetition penalty can read whole rows without per-row slicing.
+        self.tokens = torch.full(
+            (max_batch_size, self.max_length + 1),
+            self.bos_token_id,
+            dtype=torch.long,
+            device=self.device,
+        )
+        self.key_mask = torch.zeros(
+            (max_batch_size, self.max_length + 1), dtype=self.dtype, device=self.device
+        )
+        # Cross-attention padding bias, one row per cache row
+        self.encoder_bias: Optional[torch.Tensor] = None
+
+        self.cursor = 0
+        self.slots: List[_Slot] = []
+        self.pending: Queue = Queue()
+        self._processors: Dict[Tuple, LogitsProcessorList] = {}
+        self._groups: Optional[List[_SamplingGroup]] = None
+
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    def submit(self, request: DecodeRequest) -> Future:
+        """Queue a request; it joins the running batch at the next step boundary."""
+        if request.max_length > self.max_length:
+            raise ValueError(
+                f"max_length={request.max_length} exceeds scheduler capacity {self.max_length}"
+            )
+        if request.max_length < 2:
+            raise ValueError("max_length must allow at least one generated token")
+        if self.guided and request.guidance_scale is None:
+            raise ValueError("A guided scheduler requires requests with a guidance_scale")
+        if not self.guided and request.guidance_scale is not None:
+            raise ValueError("guidance_scale requires a scheduler created with guided=True")
+
+        future: Future = Future()
+        if request.cancellation_token is not None:
+            # Requests still waiting for a slot are dropped without being prefilled
+            request.cancellation_token.add_callback(future.cancel)
+        self.pending.put((request, future))
+        self._wakeup.set()
+        return future
+
+    @property
+    def num_active(self) -> int:
+        """Number of sequences currently in the running batch."""
+        return len(self.slots)
+
+    def has_work(self) -> bool:
+        """Whether any request is running or waiting."""
+        return bool(self.slots) or not self.pending.empty()
+
+    @torch.no_grad()
+    def step(self) -> int:
+        """
+        Admit waiting requests into free slots and decode one token for every
+        running sequence.
+
+        Returns:
+            Number of sequences still running after the step
+        """
+        with self._lock:
+            self._admit_pending()
+            if self.slots:
+                self._decode_step()
+            return len(self.slots)
+
+    def run_until_complete(self):
+        """Decode until every submitted request has finished."""
+        while self.has_work():
+            self.step()
+
+    def generate(self, requests: List[DecodeRequest]) -> List[torch.Tensor]:
+        """Submit ``requests``, decode them to completion and return tokens in order."""
+        futures = [self.submit(request) for request in requests]
+        if self._worker is None:
+            self.run_until_complete()
+        return [future.result() for future in futures]
+
+    def start(self):
+        """Run the decode loop on a background thread."""
+        if self._worker is not None:
+            return
+        self._stop.clear()
+        self._worker = threading.Thread(target=self._run, name="decode-scheduler", daemon=True)
+        self._worker.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop the background decode loop."""
+        if self._worker is None:
+            return
+        self._stop.set()
+        self._wakeup.set()
+        self._worker.join(timeout=timeout)
+        self._worker = None
+
+    # ------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------
+
+    def _run(self):
+        """Background loop: decode while there is work, otherwise wait for requests."""
+        while not self._stop.is_set():
+            if not self.has_work():
+                self._wakeup.wait(timeout=0.1)
+                self._wakeup.clear()
+                continue
+            try:
+                self.step()
+            except Exception as e:
+                logger.error(f"Decode step failed: {e}")
+                with self._lock:
+                    self._fail_all(e)
+
+    def _fail_all(self, error: Exception):
+        """Fail every running request and reset the batch (call with the lock held)."""
+        failed = self.slots
+        self.slots = []
+        self._groups = None
+        self.cursor = 0
+        self.cache.seq_length = 0
+
+        # Rows admitted next start at column 0 and must not see the failed rows' masks
+        self.key_mask.zero_()
+        if self.encoder_bias is not None:
+            self.encoder_bias.fill_(torch.finfo(self.dtype).min)
+
+        for slot in failed:
+            if not slot.future.done():
+                slot.future.set_exception(error)
+
+    def _admit_pending(self):
+        """Prefill waiting requests while there are free slots."""
+        while len(self.slots) < self.max_batch_size:
+            try:
+                request, future = self.pending.get_nowait()
+            except Empty:
+                return
+            if not future.set_running_or_notify_cancel():
+                continue
+            if request.cancellation_token is not None and request.cancellation_token.cancelled:
+                future.set_exception(GenerationCancelled("Generation was cancelled"))
+                continue
+            try:
+                self._admit(request, future)
+            except Exception as e:
+                logger.error(f"Failed to start request {request.request_id}: {e}")
+                future.set_exception(e)
+
+    def _admit(self, request: DecodeRequest, future: Future):
+        """Prefill one request on its own and copy its state into a free row."""
+        encoder_outputs = self.model.prepare_inputs(
+            texts=[request.prompt],
+            device=self.device,
+            genre_ids=request.genre_ids,
+            mood_ids=request.mood_ids,
+            tempo=request.tempo,
+            duration=request.duration,
+            instrument_ids=request.instrument_ids,
+        )
+        if self.guided:
+            encoder_outputs = self.model._concat_unconditional_inputs(
+                encoder_outputs, self.model.unconditional_inputs(self.device), 1
+            )
+        encoder_hidden_states = encoder_outputs["text_hidden_states"]
+        encoder_mask = encoder_outputs.get("text_attention_mask")
+        if encoder_mask is not None:
+            # Prompts only have trailing padding; drop what every row pads instead of masking
+            encoder_length = int(encoder_mask.sum(dim=1).max())
+            encoder_hidden_states = encoder_hidden_states[:, :encoder_length]
+            encoder_mask = encoder_mask[:, :encoder_length]
+            if bool(encoder_mask.all()):
+                encoder_mask = None
+
+        num_rows = self.rows_per_slot
+        prefill_cache = StaticKVCache.from_config(
+            self.model.config.transformer,
+            batch_size=num_rows,
+            max_length=1,
+            device=self.device,
+            dtype=self.dtype,
+        )
+        outputs = self.transformer(
+            input_ids=torch.full(
+                (num_rows, 1), self.bos_token_id, dtype=torch.long, device=self.device
+            ),
+            encoder_hidden_states=encoder_hidden_states,
+            encoder_attention_mask=encoder_mask,
+            conditioning_embeddings=encoder_outputs.get("conditioning_embeddings"),
+            past_key_values=prefill_cache,
+            use_cache=True,
+        )
+
+        slot = _Slot(request, future)
+        row = len(self.slots)
+
+        # The next decode step writes column ``cursor``; the prompt occupies the one before
+        if self.cursor == 0:
+            self.cursor = 1
+            self.cache.seq_length = 1
+        column = self.cursor - 1
+        slot.start = column
+        slot.length = 1
+
+        cache_rows = self._cache_rows(row)
+        for layer_idx in range(self.cache.num_layers):
+            self.cache.key_cache[layer_idx][cache_rows, :, column] = prefill_cache.key_cache[
+                layer_idx
+            ][:, :, 0]
+            self.cache.value_cache[layer_idx][cache_rows, :, column] = prefill_cache.value_cache[
+                layer_idx
+            ][:, :, 0]
+        slot.encoder_length = self._store_cross_attention(row, prefill_cache, encoder_mask)
+
+        self.tokens[row].fill_(self.bos_token_id)
+        self.key_mask[row].zero_()
+        self.key_mask[row, column] = 1.0
+
+        # Sample the first token from the prefill logits (conditional row first when guided)
+        logits = outputs["logits"][:, -1, :]
+        processor = self._processor_for(request)
+        next_token = self._sample(
+            processor(self.tokens[row : row + 1, : column + 1], logits),
+            request.do_sample,
+            [(0, request.generator)] if request.generator is not None else None,
+        )
+        self.tokens[row, self.cursor] = next_token[0]
+        slot.length = 2
+
+        if slot.length >= request.max_length or int(next_token[0]) == self.eos_token_id:
+            future.set_result(self.tokens[row : row + 1, column : self.cursor + 1].clone())
+            return
+
+        self.slots.append(slot)
+        self._groups = None
+
+    def _store_cross_attention(
+        self,
+        row: int,
+        prefill_cache: StaticKVCache,
+        encoder_mask: Optional[torch.Tensor] = None,
+    ) -> int:
+        """
+        Copy a prefilled request's cross-attention keys/values into its cache rows.
+
+        Returns:
+            The shortest unpadded encoder length among the request's cache rows
+        """
+        cache_rows = self._cache_rows(row)
+        encoder_length = 0
+        for layer_idx in range(self.cache.num_layers):
+            cross = prefill_cache.get_cross_attention(layer_idx)
+            if cross is None:
+                continue
+            key_states, value_states = cross
+            encoder_length = key_states.shape[2]
+            self._ensure_encoder_capacity(encoder_length)
+            self.cache.cross_key_cache[layer_idx][cache_rows, :, :encoder_length] = key_states
+            self.cache.cross_value_cache[layer_idx][cache_rows, :, :encoder_length] = value_states
+
+        lengths = [encoder_length] * self.rows_per_slot
+        if encoder_mask is not None:
+            lengths = encoder_mask.sum(dim=1).tolist()
+        if self.encoder_bias is not None:
+            self.encoder_bias[cache_rows].fill_(torch.finfo(self.dtype).min)
+            for cache_row, length in zip(range(cache_rows.start, cache_rows.stop), lengths):
+                self.encoder_bias[cache_row, :length] = 0.0
+        return min(lengths)
+
+    def _ensure_encoder_capacity(self, encoder_length: int):
+        """Grow the padded cross-attention buffers to hold ``encoder_length`` positions."""
+        current = 0 if self.encoder_bias is None else self.encoder_bias.shape[1]
+        if encoder_length <= current:
+            return
+
+        shape = (
+            self.cache.batch_size,
+            self.cache.num_heads,
+            encoder_length,
+            self.cache.head_dim,
+        )
+        for layer_idx in range(self.cache.num_layers):
+            for buffers in (self.cache.cross_key_cache, self.cache.cross_value_cache):
+                grown = torch.zeros(shape, dtype=self.dtype, device=self.device)
+                if buffers[layer_idx] is not None:
+                    grown[:, :, :current] = buffers[layer_idx]
+                buffers[layer_idx] = grown
+
+        bias = torch.full(
+            (self.cache.batch_size, encoder_length),
+            torch.finfo(self.dtype).min,
+            dtype=self.dtype,
+            device=self.device,
+        )
+        if self.encoder_bias is not None:
+            bias[:, :current] = self.encoder_bias
+        self.encoder_bias = bias
+
+    # ------------------------------------------------------------------
+    # Decoding
+    # ------------------------------------------------------------------
+
+    def _decode_step(self):
+        """Feed every running sequence its newest token and sample the next one."""
+        if self.cursor >= self.max_length:
+            self._compact()
+
+        num_active = len(self.slots)
+        num_rows = num_active * self.rows_per_slot
+        cursor = self.cursor
+        self.key_mask[:num_active, cursor] = 1.0
+
+        # Masks (and per-row positions) are only needed once rows start at
+        # different columns or have prompts of different lengths
+        attention_mask = None
+        position_ids = None
+        if any(slot.start > 0 for slot in self.slots):
+            attention_mask = self._per_cache_row(self.key_mask[:num_active, : cursor + 1])
+            position_ids = self._per_cache_row(
+                torch.tensor([[cursor - slot.start] for slot in self.slots], device=self.device)
+            )
+
+        encoder_attention_mask = None
+        if self.encoder_bias is not None and any(
+            slot.encoder_length < self.encoder_bias.shape[1] for slot in self.slots
+        ):
+            encoder_attention_mask = self.encoder_bias[:num_rows, None, None, :]
+
+        batch_cache = self._batch_view(num_rows)
+        outputs = self.transformer(
+            input_ids=self._per_cache_row(self.tokens[:num_active, cursor : cursor + 1]),
+            attention_mask=attention_mask,
+            encoder_attention_mask=encoder_attention_mask,
+            past_key_values=batch_cache,
+            use_cache=True,
+            position_ids=position_ids,
+        )
+        self.cursor = batch_cache.seq_length
+        self.cache.seq_length = self.cursor
+
+        logits = outputs["logits"][:, -1, :]
+        if self.guided:
+            # All conditional rows, then all unconditional rows, as guidance expects
+            logits = logits.view(num_active, 2, -1).transpose(0, 1).reshape(num_rows, -1)
+        next_tokens = torch.empty(num_active, dtype=torch.long, device=self.device)
+        history = self.tokens[:num_active, : self.cursor]
+
+        for key, rows, generators in self._sampling_groups():
+            processor = self._processors[key]
+            do_sample = key[-1]
+            if rows is None:
+                next_tokens = self._sample(processor(history, logits), do_sample, generators)
+            else:
+                logit_rows = torch.cat([rows, rows + num_active]) if self.guided else rows
+                group_logits = processor(history[rows], logits[logit_rows])
+                next_tokens[rows] = self._sample(group_logits, do_sample, generators)
+
+        self.tokens[:num_active, self.cursor] = next_tokens
+
+        # Retire finished sequences (one host sync per step for the whole batch)
+        eos_hits = (next_tokens == self.eos_token_id).tolist()
+        finished = []
+        for row, slot in enumerate(self.slots):
+            slot.length += 1
+            if eos_hits[row] or slot.length >= slot.request.max_length:
+                finished.append(row)
+
+        for row in reversed(finished):
+            self._retire(row)
+
+        self._report_progress()
+
+        if not self.slots:
+            self.cursor = 0
+            self.cache.seq_length = 0
+
+    def _cache_rows(self, row: int) -> slice:
+        """Cache rows owned by the sequence in ``row``."""
+        return slice(row * self.rows_per_slot, (row + 1) * self.rows_per_slot)
+
+    def _per_cache_row(self, tensor: torch.Tensor) -> torch.Tensor:
+        """Repeat per-sequence rows for every cache row the sequence owns."""
+        if self.rows_per_slot == 1:
+            return tensor
+        return tensor.repeat_interleave(self.rows_per_slot, dim=0)
+
+    def _batch_view(self, batch_size: int) -> StaticKVCache:
+        """A cache over the first ``batch_size`` rows sharing the scheduler's buffers."""
+        view = StaticKVCache.__new__(StaticKVCache)
+        view.num_layers = self.cache.num_layers
+        view.batch_size = batch_size
+        view.num_heads = self.cache.num_heads
+        view.head_dim = self.cache.head_dim
+        view.max_length = self.cache.max_length
+        view.key_cache = [k[:batch_size] for k in self.cache.key_cache]
+        view.value_cache = [v[:batch_size] for v in self.cache.value_cache]
+        view.cross_key_cache = [
+            k[:batch_size] if k is not None else None for k in self.cache.cross_key_cache
+        ]
+        view.cross_value_cache = [
+            v[:batch_size] if v is not None else None for v in self.cache.cross_value_cache
+        ]
+        view.seq_length = self.cursor
+        return view
+
+    def _processor_for(self, request: DecodeRequest) -> LogitsProcessorList:
+        """Get (or build once) the logits pipeline for a request's sampling parameters."""
+        key = request.sampling_key()
+        if key not in self._processors:
+            self._processors[key] = build_logits_processor(
+                temperature=request.temperature,
+                top_k=request.top_k,
+                top_p=request.top_p,
+                repetition_penalty=request.repetition_penalty,
+                typical_p=request.typical_p,
+                do_sample=request.do_sample,
+                guidance_scale=request.guidance_scale,
+            )
+        return self._processors[key]
+
+    def _sampling_groups(self) -> List[_SamplingGroup]:
+        """
+        Rows grouped by sampling parameters; ``None`` rows means the whole batch.
+
+        Each group also lists its rows (indexed within the group) that sample
+        from their own generator, or ``None`` if there are none.
+        """
+        if self._groups is None:
+            rows_by_key: Dict[Tuple, List[int]] = {}
+            for row, slot in enumerate(self.slots):
+                rows_by_key.setdefault(slot.request.sampling_key(), []).append(row)
+
+            self._groups = []
+            for key, rows in rows_by_key.items():
+                generators = [
+                    (index, self.slots[row].request.generator)
+                    for index, row in enumerate(rows)
+                    if self.slots[row].request.generator is not None
+                ]
+                row_index = None
+                if len(rows_by_key) > 1:
+                    row_index = torch.tensor(rows, dtype=torch.long, device=self.device)
+                self._groups.append((key, row_index, generators or None))
+        return self._groups
+
+    @staticmethod
+    def _sample(
+        logits: torch.Tensor,
+        do_sample: bool,
+        generators: Optional[List[Tuple[int, torch.Generator]]] = None,
+    ) -> torch.Tensor:
+        """Pick one token per row; rows listed in ``generators`` draw from their own."""
+        if not do_sample:
+            return torch.argmax(logits, dim=-1)
+        probs = F.softmax(logits, dim=-1)
+        next_tokens = torch.multinomial(probs, num_samples=1).squeeze(-1)
+        for row, generator in generators or ():
+            next_tokens[row] = torch.multinomial(probs[row], num_samples=1, generator=generator)[0]
+        return next_tokens
+
+    def _report_progress(self):
+        """Report progress of monitored sequences and drop cancelled ones."""
+        failed = []
+        for row, slot in enumerate(self.slots):
+            if slot.monitor is None:
+                continue
+            try:
+                slot.monitor.step(slot.length - 1)
+            except Exception as e:
+                # A cancelled request (or a failing callback) only affects its own row
+                failed.append((row, e))
+
+        for row, error in reversed(failed):
+            self._retire(row, error)
+
+    def _retire(self, row: int, error: Optional[Exception] = None):
+        """Resolve a finished sequence and move the last active row into its slot."""
+        slot = self.slots[row]
+        if not slot.future.done():
+            if error is not None:
+                slot.future.set_exception(error)
+            else:
+                slot.future.set_result(
+                    self.tokens[row : row + 1, slot.start : self.cursor + 1].clone()
+                )
+
+        last = len(self.slots) - 1
+        if row != last:
+            self._move_row(last, row)
+            self.slots[row] = self.slots[last]
+        self.slots.pop()
+        self._groups = None
+
+    def _move_row(self, source: int, target: int):
+        """Copy all per-row state from ``source`` to ``target``."""
+        end = self.cursor
+        source_rows = self._cache_rows(source)
+        target_rows = self._cache_rows(target)
+        for layer_idx in range(self.cache.num_layers):
+            for buffers in (self.cache.key_cache, self.cache.value_cache):
+                buffers[layer_idx][target_rows, :, :end] = buffers[layer_idx][source_rows, :, :end]
+            for buffers in (self.cache.cross_key_cache, self.cache.cross_value_cache):
+                if buffers[layer_idx] is not None:
+                    buffers[layer_idx][target_rows] = buffers[layer_idx][source_rows]
+
+        self.tokens[target] = self.tokens[source]
+        self.key_mask[target] = self.key_mask[source]
+        if self.encoder_bias is not None:
+            self.encoder_bias[target_rows] = self.encoder_bias[source_rows]
+
+    def _compact(self):
+        """Shift all rows left so the oldest running sequence starts at column 0."""
+        shift = min(slot.start for slot in self.slots)
+        if shift == 0:
+            raise RuntimeError("KV cache is full; increase the scheduler max_length")
+
+        num_active = len(self.slots)
+        num_rows = num_active * self.rows_per_slot
+        end = self.cursor
+        for layer_idx in range(self.cache.num_layers):
+            for buffers in (self.cache.key_cache, self.cache.value_cache):
+                buffer = buffers[layer_idx]
+                buffer[:num_rows, :, : end - shift] = buffer[:num_rows, :, shift:end].clone()
+
+        self.tokens[:num_active, : end + 1 - shift] = self.tokens[
+            :num_active, shift : end + 1
+        ].clone()
+        self.key_mask[:num_active, : end + 1 - shift] = self.key_mask[
+            :num_active, shift : end + 1
+        ].clone()
+
+        for slot in self.slots:
+            slot.start -= shift
+        self.cursor -= shift
+        self.cache.seq_length = self.cursor
@@ -0,0 +1,269 @@
+"""
+Speculative decoding: a small draft model proposes tokens that the target model verifies.
+"""
+
+import logging
+from typing import Dict, Optional, Tuple
+
+import torch
+import torch.nn.functional as F
+
+from ..models.transformer.cache import StaticKVCache
+from .logits_process import LogitsProcessorList
+from .progress import ProgressMonitor
+from .token_buffer import TokenBuffer
+
+logger = logging.getLogger(__name__)
+
+
+class SpeculativeDecoder:
+    """
+    Speculative sampling with a draft and a target transformer.
+
+    Each round the draft model proposes ``num_speculative_tokens`` tokens one
+    at a time, and the target model scores all of them in a single forward
+    pass. Draft token ``x`` is accepted with probability ``min(1, p(x) / q(x))``
+    (``p``/``q`` = target/draft distributions after the logits processors); the
+    first rejected position is resampled from ``max(p - q, 0)``, and a bonus
+    token is drawn from ``p`` when every proposal is accepted. This leaves the
+    output distribution identical to sampling from the target model alone.
+
+    Rows of a batch advance in lockstep: every row commits the prefix length
+    accepted by all rows plus one exactly-distributed token (its own accepted
+    draft token, a resample or the bonus token), and both KV caches are
+    rolled back to the committed length.
+    """
+
+    def __init__(
+        self,
+        model,
+        draft_model,
+        num_speculative_tokens: int = 4,
+        eos_token_id: int = 2,
+        pad_token_id: int = 0,
+    ):
+        if num_speculative_tokens < 1:
+            raise ValueError("num_speculative_tokens must be at least 1")
+        if model.config.vocab_size != draft_model.config.vocab_size:
+            raise ValueError(
+                f"Draft model vocabulary ({draft_model.config.vocab_size}) must match the "
+                f"target model vocabulary ({model.config.vocab_size})"
+            )
+
+        self.model = model
+        self.draft_model = draft_model
+        self.num_speculative_tokens = num_speculative_tokens
+        self.eos_token_id = eos_token_id
+        self.pad_token_id = pad_token_id
+
+        # Acceptance statistics of the last call, for tuning num_speculative_tokens
+        self.stats = {"rounds": 0, "proposed": 0, "accepted": 0}
+
+    @torch.no_grad()
+    def generate(
+        self,
+        input_ids: torch.Tensor,
+        model_inputs: Dict[str, Optional[torch.Tensor]],
+        draft_inputs: Dict[str, Optional[torch.Tensor]],
+        logits_processor: LogitsProcessorList,
+        max_length: int = 1024,
+        do_sample: bool = True,
+        dtype: torch.dtype = torch.float32,
+        draft_dtype: torch.dtype = torch.float32,
+        monitor: Optional[ProgressMonitor] = None,
+    ) -> torch.Tensor:
+        """
+        Generate sequences, padding rows that stop at EOS.
+
+        Args:
+            input_ids: Initial tokens, usually BOS (batch, prompt_len)
+            model_inputs: Encoder outputs for the target model (``encoder_hidden_states``,
+                ``encoder_attention_mask``, ``conditioning_embeddings``)
+            draft_inputs: Encoder outputs for the draft model
+            logits_processor: Penalties/filtering applied to both models' logits
+            max_length: Maximum sequence length including the prompt
+            do_sample: Sample, or decode greedily (proposals accepted on argmax match)
+            dtype: KV cache dtype of the target model
+            draft_dtype: KV cache dtype of the draft model
+            monitor: Progress reporting and cancellation check run after every round
+
+        Returns:
+            Generated token sequences (batch, length)
+        """
+        batch_size = input_ids.shape[0]
+        device = input_ids.device
+        self.stats = {"rounds": 0, "proposed": 0, "accepted": 0}
+
+        tokens = TokenBuffer.from_tokens(input_ids, max_length, fill_value=self.pad_token_id)
+        cache = StaticKVCache.from_config(
+            self.model.config, batch_size, max_length, device=device, dtype=dtype
+        )
+        draft_cache = StaticKVCache.from_config(
+            self.draft_model.config, batch_size, max_length, device=device, dtype=draft_dtype
+        )
+
+        row_indices = torch.arange(batch_size, device=device)
+        output = torch.full(
+            (batch_size, max_length), self.pad_token_id, dtype=torch.long, device=device
+        )
+
+        # Both caches hold every committed token except the newest one
+        while len(tokens) < max_length:
+            num_draft = min(self.num_speculative_tokens, max_length - len(tokens) - 1)
+            committed = self._speculate(
+                tokens,
+                cache,
+                draft_cache,
+                model_inputs,
+                draft_inputs,
+                logits_processor,
+                num_draft,
+                do_sample,
+            )
+            model_inputs = self._decode_inputs(model_inputs)
+            draft_inputs = self._decode_inputs(draft_inputs)
+            if monitor is not None:
+                monitor.step(len(tokens) - input_ids.shape[1])
+
+            # Rows that produced EOS leave the batch
+            finished = (committed == self.eos_token_id).any(dim=-1)
+            if finished.any():
+                finished_rows = finished.nonzero().squeeze(-1)
+                for row in finished_rows.tolist():
+                    sequence = tokens.view()[row]
+                    start = len(tokens) - committed.shape[1]
+                    end = start + int((committed[row] == self.eos_token_id).nonzero()[0]) + 1
+                    output[row_indices[row], :end] = sequence[:end]
+
+                keep = (~finished).nonzero().squeeze(-1)
+                if keep.numel() == 0:
+                    return output[:, : len(tokens)]
+
+                row_indices = row_indices[keep]
+                tokens.select_batch(keep)
+                cache.select_batch(keep)
+                draft_cache.select_batch(keep)
+                model_inputs = {name: value[keep] for name, value in model_inputs.items()}
+                draft_inputs = {name: value[keep] for name, value in draft_inputs.items()}
+
+        output[row_indices, : len(tokens)] = tokens.view()
+        return output[:, : len(tokens)]
+
+    def _speculate(
+        self,
+        tokens: TokenBuffer,
+        cache: StaticKVCache,
+        draft_cache: StaticKVCache,
+        model_inputs: Dict[str, Optional[torch.Tensor]],
+        draft_inputs: Dict[str, Optional[torch.Tensor]],
+        logits_processor: LogitsProcessorList,
+        num_draft: int,
+        do_sample: bool,
+    ) -> torch.Tensor:
+        """Run one draft/verify round and return the committed tokens (batch, n)."""
+        length = len(tokens)
+
+        # Draft: propose num_draft tokens autoregressively
+        draft_probs = []
+        for step in range(num_draft):
+            outputs = self.draft_model(
+                input_ids=tokens.view()[:, draft_cache.get_seq_length() :],
+                past_key_values=draft_cache,
+                use_cache=True,
+                **(draft_inputs if step == 0 else self._decode_inputs(draft_inputs)),
+            )
+            probs = self._probs(logits_processor, tokens, outputs["logits"][:, -1], do_sample)
+            tokens.append(torch.multinomial(probs, num_samples=1))
+            draft_probs.append(probs)
+
+        # Verify: one target pass over the newest committed token and all proposals
+        outputs = self.model(
+            input_ids=tokens.view()[:, length - 1 :],
+            past_key_values=cache,
+            use_cache=True,
+            **model_inputs,
+        )
+        proposals = tokens.view()[:, length:]
+        target_probs = []
+        for step in range(num_draft + 1):
+            tokens.length = length + step
+            target_probs.append(
+                self._probs(logits_processor, tokens, outputs["logits"][:, step], do_sample)
+            )
+
+        num_accepted, accepted = self._accept(proposals, draft_probs, target_probs)
+
+        # Every row commits the commonly accepted prefix plus one exact token
+        if num_accepted < num_draft:
+            residual = (target_probs[num_accepted] - draft_probs[num_accepted]).clamp_(min=0)
+            empty = residual.sum(-1, keepdim=True) == 0
+            residual = torch.where(empty, target_probs[num_accepted], residual)
+            resampled = torch.multinomial(residual, num_samples=1).squeeze(-1)
+            next_token = torch.where(
+                accepted[:, num_accepted], proposals[:, num_accepted], resampled
+            )
+        else:
+            next_token = torch.multinomial(target_probs[num_draft], num_samples=1).squeeze(-1)
+
+        tokens.length = length + num_accepted
+        tokens.append(next_token)
+
+        # Roll both caches back to everything but the newest committed token
+        cache.crop(len(tokens) - 1)
+        draft_cache.crop(min(draft_cache.get_seq_length(), len(tokens) - 1))
+
+        self.stats["rounds"] += 1
+        self.stats["proposed"] += num_draft
+        self.stats["accepted"] += num_accepted
+        return tokens.view()[:, length:]
+
+    @staticmethod
+    def _decode_inputs(
+        inputs: Dict[str, Optional[torch.Tensor]],
+    ) -> Dict[str, torch.Tensor]:
+        """
+        Inputs still needed once the first round has run.
+
+        Encoder states and conditioning are consumed by the first forward
+        pass (cross-attention keys/values are cached from then on), but an
+        encoder padding mask must be passed on every step.
+        """
+        mask = inputs.get("encoder_attention_mask")
+        return {} if mask is None else {"encoder_attention_mask": mask}
+
+    @staticmethod
+    def _probs(
+        logits_processor: LogitsProcessorList,
+        tokens: TokenBuffer,
+        logits: torch.Tensor,
+        do_sample: bool,
+    ) -> torch.Tensor:
+        """Processed next-token distribution given the tokens currently in the buffer."""
+        scores = logits_processor(tokens.view(), logits.float())
+        if do_sample:
+            return F.softmax(scores, dim=-1)
+        return F.one_hot(scores.argmax(-1), scores.shape[-1]).to(scores.dtype)
+
+    @staticmethod
+    def _accept(
+        proposals: torch.Tensor,
+        draft_probs: list,
+        target_probs: list,
+    ) -> Tuple[int, Optional[torch.Tensor]]:
+        """
+        Decide which proposals are accepted.
+
+        Returns the number of leading proposals accepted by every row, and the
+        per-row acceptance mask (batch, num_draft).
+        """
+        if not draft_probs:
+            return 0, None
+
+        index = proposals.unsqueeze(-1)
+        q = torch.stack(draft_probs, dim=1).gather(-1, index).squeeze(-1)
+        p = torch.stack(target_probs[:-1], dim=1).gather(-1, index).squeeze(-1)
+
+        # Accept x with probability min(1, p(x) / q(x))
+        accepted = torch.rand_like(q) * q < p
+        leading = accepted.long().cumprod(dim=-1).sum(dim=-1)
+        return int(leading.min()), accepted
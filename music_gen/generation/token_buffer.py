@@ -0,0 +1,82 @@
+"""
+Preallocated token storage for autoregressive decoding loops.
+"""
+
+from typing import Optional
+
+import torch
+
+
+class TokenBuffer:
+    """
+    Fixed-capacity ``(batch, max_length)`` token buffer with a write cursor.
+
+    Decoding loops append one column per step instead of concatenating a new
+    ``input_ids`` tensor, so the history is never reallocated or copied.
+    :meth:`view` returns a zero-copy view of the valid prefix for the logits
+    processors that need the full history.
+    """
+
+    def __init__(
+        self,
+        batch_size: int,
+        max_length: int,
+        device: Optional[torch.device] = None,
+        fill_value: int = 0,
+    ):
+        self.max_length = max_length
+        self.fill_value = fill_value
+        self.buffer = torch.full(
+            (batch_size, max_length), fill_value, dtype=torch.long, device=device
+        )
+        self.length = 0
+
+    @classmethod
+    def from_tokens(
+        cls, input_ids: torch.Tensor, max_length: int, fill_value: int = 0
+    ) -> "TokenBuffer":
+        """Create a buffer holding ``input_ids`` with room for ``max_length`` tokens."""
+        buffer = cls(input_ids.shape[0], max_length, device=input_ids.device, fill_value=fill_value)
+        buffer.append(input_ids)
+        return buffer
+
+    @property
+    def batch_size(self) -> int:
+        return self.buffer.shape[0]
+
+    def __len__(self) -> int:
+        return self.length
+
+    def view(self) -> torch.Tensor:
+        """Valid tokens, shape ``(batch, length)``. Shares storage with the buffer."""
+        return self.buffer[:, : self.length]
+
+    def last(self) -> torch.Tensor:
+        """Most recent token of every row, shape ``(batch, 1)``."""
+        return self.buffer[:, self.length - 1 : self.length]
+
+    def append(self, tokens: torch.Tensor):
+        """Write ``tokens`` of shape ``(batch,)`` or ``(batch, n)`` at the cursor."""
+        if tokens.dim() == 1:
+            tokens = tokens.unsqueeze(-1)
+        end = self.length + tokens.shape[-1]
+        if end > self.max_length:
+            raise ValueError(
+                f"TokenBuffer overflow: need {end} positions but capacity is {self.max_length}"
+            )
+        self.buffer[:, self.length : end] = tokens
+        self.length = end
+
+    def crop(self, length: int):
+        """Drop tokens past the first ``length`` (e.g. ones sampled after EOS)."""
+        if length > self.length:
+            raise ValueError(f"Cannot crop TokenBuffer to {length} tokens; it holds {self.length}")
+        self.length = length
+
+    def reorder(self, indices: torch.Tensor):
+        """Reorder rows in place (e.g. to follow the surviving beams)."""
+        self.buffer[:, : self.length] = self.buffer.index_select(0, indices)[:, : self.length]
+
+    def select_batch(self, indices: torch.Tensor):
+        """Keep only the given rows, releasing the others."""
+        self.buffer = self.buffer.index_select(0, indices)
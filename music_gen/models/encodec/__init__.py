@@ -3,6 +3,7 @@ EnCodec audio tokenization module.
 """
 
 from .audio_tokenizer import (
+    EnCodecStreamingDecoder,
     EnCodecTokenizer,
     MultiResolutionTokenizer,
     create_audio_tokenizer,
@@ -12,6 +13,7 @@ from .audio_tokenizer import (
 
 __all__ = [
     "EnCodecTokenizer",
+    "EnCodecStreamingDecoder",
     "MultiResolutionTokenizer",
     "create_audio_tokenizer",
     "load_audio_file",
@@ -3,7 +3,7 @@ EnCodec integration for audio tokenization and reconstruction.
 """
 
 import logging
-from typing import List, Optional, Tuple, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 import torch
 import torch.nn as nn
@@ -11,6 +11,8 @@ import torchaudio
 
 try:
     from encodec import EncodecModel
+    from encodec.modules import SLSTM, SConv1d, SConvTranspose1d, pad1d
+    from encodec.modules.seanet import SEANetResnetBlock
     from encodec.utils import convert_audio
 
     ENCODEC_AVAILABLE = True
@@ -18,6 +20,7 @@ except ImportError:
     ENCODEC_AVAILABLE = False
     EncodecModel = None
     convert_audio = None
+    SLSTM = SConv1d = SConvTranspose1d = SEANetResnetBlock = pad1d = None
 
 logger = logging.getLogger(__name__)
 
@@ -214,6 +217,7 @@ class EnCodecTokenizer(nn.Module):
         self,
         audio: torch.Tensor,
         sample_rate: Optional[int] = None,
+        delay_pattern: bool = False,
     ) -> torch.Tensor:
         """
         Tokenize audio into discrete tokens for language modeling.
@@ -221,13 +225,19 @@ class EnCodecTokenizer(nn.Module):
         Args:
             audio: Input audio tensor
             sample_rate: Original sample rate
+            delay_pattern: Interleave codebooks with the delay pattern (see
+                :meth:`apply_delay_pattern`) instead of flattening them
 
         Returns:
-            tokens: Flattened tokens of shape (batch, sequence_length)
+            tokens: Flattened tokens of shape (batch, sequence_length), or delayed
+                codes of shape (batch, num_quantizers, time_frames + num_quantizers - 1)
         """
 
         codes, _ = self.encode(audio, sample_rate)
 
+        if delay_pattern:
+            return self.apply_delay_pattern(codes, self.codebook_size)
+
         # Flatten codes for language modeling
         # Shape: (batch, num_quantizers, time_frames) -> (batch, num_quantizers * time_frames)
         batch_size, num_quantizers, time_frames = codes.shape
@@ -235,23 +245,68 @@ class EnCodecTokenizer(nn.Module):
 
         return tokens
 
+    @staticmethod
+    def apply_delay_pattern(codes: torch.Tensor, special_token_id: int) -> torch.Tensor:
+        """
+        Interleave codebooks with the delay pattern.
+
+        Codebook ``k`` is shifted right by ``k`` steps, so step ``t`` holds
+        codebook 0 of frame ``t``, codebook 1 of frame ``t - 1`` and so on. A
+        model can then predict all codebooks of a step at once while every
+        codebook still sees the coarser codebooks of its own frame. Positions
+        outside the shifted codes are filled with ``special_token_id``.
+
+        Args:
+            codes: Codes of shape (batch, num_quantizers, time_frames)
+            special_token_id: Token for the delayed (empty) positions
+
+        Returns:
+            Delayed codes of shape (batch, num_quantizers, time_frames + num_quantizers - 1)
+        """
+        batch_size, num_quantizers, time_frames = codes.shape
+        delayed = codes.new_full(
+            (batch_size, num_quantizers, time_frames + num_quantizers - 1), special_token_id
+        )
+        for codebook in range(num_quantizers):
+            delayed[:, codebook, codebook : codebook + time_frames] = codes[:, codebook]
+        return delayed
+
+    @staticmethod
+    def revert_delay_pattern(delayed: torch.Tensor) -> torch.Tensor:
+        """Undo :meth:`apply_delay_pattern`, returning codes (batch, num_quantizers, time_frames)."""
+        num_quantizers = delayed.shape[1]
+        time_frames = delayed.shape[2] - num_quantizers + 1
+        return torch.stack(
+            [
+                delayed[:, codebook, codebook : codebook + time_frames]
+                for codebook in range(num_quantizers)
+            ],
+            dim=1,
+        )
+
     def detokenize(
         self,
         tokens: torch.Tensor,
-        time_frames: int,
+        time_frames: Optional[int] = None,
     ) -> torch.Tensor:
         """
         Convert flattened tokens back to audio.
 
         Args:
-            tokens: Flattened tokens of shape (batch, sequence_length)
-            time_frames: Number of time frames to reshape to
+            tokens: Flattened tokens of shape (batch, sequence_length), or codes
+                of shape (batch, num_quantizers, time_frames)
+            time_frames: Number of time frames to reshape flattened tokens to
 
         Returns:
             audio: Reconstructed audio tensor
         """
 
+        if tokens.dim() == 3:
+            return self.decode(tokens)
+
         batch_size = tokens.shape[0]
+        if time_frames is None:
+            time_frames = tokens.shape[-1] // self.num_quantizers
 
         # Reshape tokens back to codes format
         codes = tokens.view(batch_size, self.num_quantizers, time_frames)
@@ -261,6 +316,17 @@ class EnCodecTokenizer(nn.Module):
 
         return audio
 
+    def streaming_decoder(self) -> Optional["EnCodecStreamingDecoder"]:
+        """
+        Create a stateful decoder for consecutive chunks of one stream.
+
+        Returns None when chunks can't be decoded incrementally (mock
+        tokenizer or a non-causal EnCodec model).
+        """
+        if self.encodec is None or not EnCodecStreamingDecoder.supports(self.encodec):
+            return None
+        return EnCodecStreamingDecoder(self.encodec, self.num_quantizers)
+
     def get_sequence_length(self, audio_duration: float) -> int:
         """Calculate the sequence length for a given audio duration."""
         num_frames = int(audio_duration * self.frame_rate)
@@ -306,6 +372,133 @@ class EnCodecTokenizer(nn.Module):
             raise ValueError(f"Unknown mode: {mode}")
 
 
+class EnCodecStreamingDecoder:
+    """
+    Incremental EnCodec decoder for streaming token chunks.
+
+    Decoding each chunk on its own restarts every convolution's padding and
+    the LSTM state at the chunk boundary, which produces clicks that then
+    have to be hidden by decoding overlapping context and crossfading. This
+    decoder instead walks the SEANet decoder layer by layer and carries the
+    streaming state between calls: each causal convolution keeps the last
+    ``(kernel_size - 1) * dilation`` samples of its input, each transposed
+    convolution keeps the right tail of its output to overlap-add onto the
+    next chunk, and each LSTM keeps its hidden state. Consecutive chunks
+    therefore concatenate to exactly what one decode of the whole stream
+    would produce, with every frame decoded once.
+
+    Only causal models without segment-wise normalization (e.g. the 24 kHz
+    model) are supported. The first chunk must be longer than the widest
+    convolution padding (7 frames for the 24 kHz model) to match a full
+    decode exactly, since reflect padding is applied to it.
+    """
+
+    def __init__(self, encodec: nn.Module, num_quantizers: int):
+        if not self.supports(encodec):
+            raise ValueError("Streaming decode requires a causal EnCodec model without segments")
+
+        self.encodec = encodec
+        self.num_quantizers = num_quantizers
+        self.state: Dict[nn.Module, object] = {}
+
+    @staticmethod
+    def supports(encodec: nn.Module) -> bool:
+        """Whether the decoder of ``encodec`` can be run incrementally."""
+        if encodec.segment_length is not None:
+            return False
+        for module in encodec.decoder.modules():
+            if isinstance(module, SConv1d):
+                if not module.causal or module.conv.conv.stride[0] != 1:
+                    return False
+                if module.conv.norm_type == "time_group_norm":
+                    return False
+            elif isinstance(module, SConvTranspose1d):
+                if not module.causal or module.trim_right_ratio != 1.0:
+                    return False
+                if module.convtr.norm_type == "time_group_norm":
+                    return False
+        return True
+
+    def reset(self):
+        """Forget the stream so the next chunk starts a new one."""
+        self.state.clear()
+
+    def decode(self, codes: torch.Tensor) -> torch.Tensor:
+        """
+        Decode the next chunk of the stream.
+
+        Args:
+            codes: Codes of shape (batch, num_quantizers, time_frames)
+
+        Returns:
+            audio: Audio of shape (batch, channels, time_frames * hop_length)
+        """
+        with torch.no_grad():
+            emb = self.encodec.quantizer.decode(codes.transpose(0, 1))
+            return self._run(self.encodec.decoder.model, emb)
+
+    def detokenize(self, tokens: torch.Tensor, time_frames: Optional[int] = None) -> torch.Tensor:
+        """Decode the next chunk of flattened tokens, as :meth:`EnCodecTokenizer.detokenize`."""
+        if tokens.dim() == 3:
+            return self.decode(tokens)
+
+        batch_size = tokens.shape[0]
+        if time_frames is None:
+            time_frames = tokens.shape[-1] // self.num_quantizers
+        return self.decode(tokens.view(batch_size, self.num_quantizers, time_frames))
+
+    def _run(self, module: nn.Module, x: torch.Tensor) -> torch.Tensor:
+        """Apply ``module`` to the next chunk of its input, updating its state."""
+        if isinstance(module, nn.Sequential):
+            for layer in module:
+                x = self._run(layer, x)
+            return x
+
+        if isinstance(module, SEANetResnetBlock):
+            return self._run(module.shortcut, x) + self._run(module.block, x)
+
+        if isinstance(module, SConv1d):
+            conv = module.conv.conv
+            padding = (conv.kernel_size[0] - 1) * conv.dilation[0]
+            if padding == 0:
+                return module.conv(x)
+
+            history = self.state.get(module)
+            if history is None:
+                x = pad1d(x, (padding, 0), mode=module.pad_mode)
+            else:
+                x = torch.cat([history, x], dim=-1)
+            self.state[module] = x[..., -padding:]
+            return module.conv(x)
+
+        if isinstance(module, SConvTranspose1d):
+            convtr = module.convtr.convtr
+            overlap = convtr.kernel_size[0] - convtr.stride[0]
+            y = module.convtr(x)
+            if overlap == 0:
+                return y
+
+            tail = self.state.get(module)
+            if tail is not None:
+                y[..., :overlap] += tail
+
+            # The tail holds this chunk's partial sums; the next chunk adds its own bias
+            tail = y[..., -overlap:]
+            if convtr.bias is not None:
+                tail = tail - convtr.bias.view(1, -1, 1)
+            self.state[module] = tail
+            return y[..., :-overlap]
+
+        if isinstance(module, SLSTM):
+            x = x.permute(2, 0, 1)
+            y, self.state[module] = module.lstm(x, self.state.get(module))
+            if module.skip:
+                y = y + x
+            return y.permute(1, 2, 0)
+
+        return module(x)
+
+
 class MultiResolutionTokenizer(nn.Module):
     """Multi-resolution audio tokenizer using multiple EnCodec models."""
 
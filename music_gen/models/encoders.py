@@ -3,7 +3,7 @@ Text and conditioning encoders for MusicGen.
 """
 
 import logging
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Sequence
 
 import torch
 import torch.nn as nn
@@ -22,11 +22,13 @@ class T5TextEncoder(nn.Module):
         freeze_encoder: bool = True,
         max_length: int = 512,
         cache_dir: Optional[str] = None,
+        length_buckets: Optional[Sequence[int]] = (16, 32, 64, 128, 256),
     ):
         super().__init__()
         self.model_name = model_name
         self.freeze_encoder = freeze_encoder
         self.max_length = max_length
+        self.length_buckets = sorted(length_buckets or [])
 
         # Load T5 encoder and tokenizer
         try:
@@ -57,7 +59,14 @@ class T5TextEncoder(nn.Module):
         device: torch.device,
         return_attention_mask: bool = True,
     ) -> Dict[str, torch.Tensor]:
-        """Encode text inputs into embeddings."""
+        """
+        Encode text inputs into embeddings.
+
+        Prompts are grouped by token length (see ``length_buckets``) and each
+        group is encoded in one T5 call padded only to its own longest prompt.
+        The results are scattered back in input order, padded to the longest
+        prompt of the batch; padded positions are masked out by ``attention_mask``.
+        """
 
         # Tokenize texts
         tokenized = self.tokenizer(
@@ -71,15 +80,24 @@ class T5TextEncoder(nn.Module):
         # Move to device
         input_ids = tokenized["input_ids"].to(device)
         attention_mask = tokenized["attention_mask"].to(device)
-
-        # Encode with T5
-        with torch.set_grad_enabled(not self.freeze_encoder):
-            encoder_outputs = self.encoder(
-                input_ids=input_ids,
-                attention_mask=attention_mask,
-            )
-
-        hidden_states = encoder_outputs.last_hidden_state
+        lengths = tokenized["attention_mask"].sum(dim=-1)
+
+        # Encode with T5, one call per length bucket
+        hidden_states = None
+        for rows in self._length_buckets(lengths.tolist()):
+            width = int(lengths[rows].max())
+            rows = torch.tensor(rows, device=device)
+            with torch.set_grad_enabled(not self.freeze_encoder):
+                bucket_states = self.encoder(
+                    input_ids=input_ids[rows, :width],
+                    attention_mask=attention_mask[rows, :width],
+                ).last_hidden_state
+
+            if hidden_states is None:
+                hidden_states = bucket_states.new_zeros(
+                    input_ids.shape[0], input_ids.shape[1], bucket_states.shape[-1]
+                )
+            hidden_states[rows, :width] = bucket_states
 
         output = {
             "hidden_states": hidden_states,
@@ -91,6 +109,14 @@ class T5TextEncoder(nn.Module):
 
         return output
 
+    def _length_buckets(self, lengths: List[int]) -> List[List[int]]:
+        """Group row indices by the smallest bucket boundary that fits their token length."""
+        buckets: Dict[int, List[int]] = {}
+        for row, length in enumerate(lengths):
+            boundary = next((b for b in self.length_buckets if length <= b), self.max_length)
+            buckets.setdefault(boundary, []).append(row)
+        return [buckets[boundary] for boundary in sorted(buckets)]
+
     def forward(
         self,
         texts: List[str],
@@ -284,6 +310,7 @@ class MultiModalEncoder(nn.Module):
         max_text_length: int = 512,
         conditioning_config: Optional[Dict[str, Any]] = None,
         output_projection_dim: Optional[int] = None,
+        t5_length_buckets: Optional[Sequence[int]] = (16, 32, 64, 128, 256),
     ):
         super().__init__()
 
@@ -292,6 +319,7 @@ class MultiModalEncoder(nn.Module):
             model_name=t5_model_name,
             freeze_encoder=freeze_t5,
             max_length=max_text_length,
+            length_buckets=t5_length_buckets,
         )
 
         # Conditioning encoder
@@ -10,13 +10,22 @@ import torch.nn as nn
 import torch.nn.functional as F
 
 from ..generation.beam_search import BeamSearchConfig, beam_search_generate
+from ..generation.logits_process import LogitsProcessorList, build_logits_processor
+from ..generation.prefix_cache import PrefixCache, PrefixCacheEntry
+from ..generation.progress import CancellationToken, ProgressCallback, ProgressMonitor
+from ..generation.speculative import SpeculativeDecoder
+from ..generation.token_buffer import TokenBuffer
 from .encodec.audio_tokenizer import EnCodecTokenizer
 from .encoders import MultiModalEncoder
-from .transformer.config import MusicGenConfig
+from .transformer.cache import PagedKVCache, StaticKVCache
+from .transformer.config import MusicGenConfig, TransformerConfig
 from .transformer.model import MusicGenTransformer
 
 logger = logging.getLogger(__name__)
 
+# Numeric precisions the transformer can run at during inference
+INFERENCE_PRECISIONS = ("fp32", "bf16", "int8")
+
 
 class MusicGenModel(nn.Module):
     """
@@ -46,6 +55,16 @@ class MusicGenModel(nn.Module):
         # Generation parameters
         self.generation_config = config.default_generation_params
 
+        # Numeric precision of the transformer at inference time
+        self.inference_precision = "fp32"
+
+        # Identifies the weights in prefix cache keys (set by from_pretrained)
+        self.model_version: Optional[str] = None
+        self.prefix_cache: Optional[PrefixCache] = None
+
+        # Encoder outputs of the null condition used by classifier-free guidance, per device
+        self._unconditional_inputs: Dict[str, Dict[str, torch.Tensor]] = {}
+
     def _init_encoders(self):
         """Initialize text and conditioning encoders."""
         conditioning_config = {
@@ -72,6 +91,7 @@ class MusicGenModel(nn.Module):
             max_text_length=self.config.t5.max_text_length,
             conditioning_config=conditioning_config,
             output_projection_dim=self.config.transformer.hidden_size,
+            t5_length_buckets=self.config.t5.length_buckets,
         )
 
     def _init_transformer(self):
@@ -203,6 +223,12 @@ class MusicGenModel(nn.Module):
             shift_logits = logits[..., :-1, :].contiguous()
             shift_labels = labels[..., 1:].contiguous()
 
+            # Empty delay-pattern positions carry no target
+            if self.transformer.special_token_id is not None:
+                shift_labels = shift_labels.masked_fill(
+                    shift_labels == self.transformer.special_token_id, self.pad_token_id
+                )
+
             # Calculate cross-entropy loss
             loss_fct = nn.CrossEntropyLoss(ignore_index=self.pad_token_id)
             loss = loss_fct(shift_logits.view(-1, shift_logits.size(-1)), shift_labels.view(-1))
@@ -240,6 +266,14 @@ class MusicGenModel(nn.Module):
         pad_token_id: Optional[int] = None,
         eos_token_id: Optional[int] = None,
         device: Optional[torch.device] = None,
+        use_static_cache: bool = True,
+        typical_p: Optional[float] = None,
+        draft_model: Optional["MusicGenModel"] = None,
+        num_speculative_tokens: int = 4,
+        guidance_scale: Optional[float] = None,
+        cache_unconditional_inputs: bool = True,
+        progress_callback: Optional[ProgressCallback] = None,
+        cancellation_token: Optional[CancellationToken] = None,
     ) -> torch.Tensor:
         """
         Generate music tokens from text prompts.
@@ -261,14 +295,48 @@ class MusicGenModel(nn.Module):
             pad_token_id: Padding token ID
             eos_token_id: End-of-sequence token ID
             device: Device to run generation on
+            use_static_cache: Preallocate the KV cache for ``max_length`` positions
+                instead of growing it with a concatenation on every step (a block-paged
+                cache with beam search)
+            typical_p: Typical sampling mass; None disables typical filtering
+            draft_model: Smaller model sharing this model's vocabulary; when given,
+                tokens are generated by speculative decoding, which leaves the output
+                distribution unchanged
+            num_speculative_tokens: Tokens proposed by ``draft_model`` per target pass
+            guidance_scale: Classifier-free guidance scale; None or 1.0 disables guidance.
+                Conditional and null-prompt rows run through the transformer as one
+                doubled batch and their logits are combined before sampling
+            cache_unconditional_inputs: Encode the null prompt once and reuse it for
+                later calls on the same device (see :meth:`unconditional_inputs`)
+            progress_callback: Called after every decode step with a
+                :class:`GenerationProgress` (tokens done and tokens per second)
+            cancellation_token: Checked between decode steps; once cancelled,
+                generation stops with :class:`GenerationCancelled`
 
         Returns:
-            Generated token sequences
+            Generated token sequences. With the delay codebook pattern, codes of
+            shape (batch, num_quantizers, max_length - num_quantizers) instead
+            (see :meth:`_generate_delayed`)
         """
 
         if device is None:
             device = next(self.parameters()).device
 
+        if cancellation_token is not None:
+            cancellation_token.raise_if_cancelled()
+        monitor = ProgressMonitor.create(max_length - 1, progress_callback, cancellation_token)
+
+        if self.transformer.num_codebooks > 1 and (num_beams > 1 or draft_model is not None):
+            raise ValueError(
+                "Beam search and speculative decoding require codebook_pattern='flatten'"
+            )
+
+        guided = guidance_scale is not None and guidance_scale != 1.0
+        if guided and (num_beams > 1 or draft_model is not None):
+            raise ValueError(
+                "Classifier-free guidance is not supported with beam search or speculative decoding"
+            )
+
         if pad_token_id is None:
             pad_token_id = self.pad_token_id
         if eos_token_id is None:
@@ -276,16 +344,39 @@ class MusicGenModel(nn.Module):
 
         batch_size = len(texts)
 
-        # Prepare encoder inputs
-        encoder_outputs = self.prepare_inputs(
-            texts=texts,
-            device=device,
+        # Repeated prompts reuse their encoder outputs and BOS step from the prefix cache
+        prefix_key = self.prefix_cache_key(
+            texts,
+            device,
             genre_ids=genre_ids,
             mood_ids=mood_ids,
             tempo=tempo,
             duration=duration,
             instrument_ids=instrument_ids,
+            guided=guided,
         )
+        prefix = self.prefix_cache.get(prefix_key) if prefix_key is not None else None
+
+        # Prepare encoder inputs
+        if prefix is not None:
+            encoder_outputs = prefix.encoder_outputs
+        else:
+            encoder_outputs = self.prepare_inputs(
+                texts=texts,
+                device=device,
+                genre_ids=genre_ids,
+                mood_ids=mood_ids,
+                tempo=tempo,
+                duration=duration,
+                instrument_ids=instrument_ids,
+            )
+            if guided:
+                # Rows [batch_size:] of the doubled batch are the unconditional branch
+                encoder_outputs = self._concat_unconditional_inputs(
+                    encoder_outputs,
+                    self.unconditional_inputs(device, use_cache=cache_unconditional_inputs),
+                    batch_size,
+                )
 
         encoder_hidden_states = encoder_outputs["text_hidden_states"]
         encoder_attention_mask = encoder_outputs["text_attention_mask"]
@@ -309,63 +400,114 @@ class MusicGenModel(nn.Module):
                 num_beams=num_beams,
                 pad_token_id=pad_token_id,
                 eos_token_id=eos_token_id,
+                monitor=monitor,
+                use_paged_cache=use_static_cache,
+            )
+
+        logits_processor = build_logits_processor(
+            temperature=temperature,
+            top_k=top_k,
+            top_p=top_p,
+            repetition_penalty=repetition_penalty,
+            typical_p=typical_p,
+            do_sample=do_sample,
+            guidance_scale=guidance_scale if guided else None,
+        )
+
+        if self.transformer.num_codebooks > 1:
+            return self._generate_delayed(
+                encoder_outputs,
+                logits_processor,
+                max_length=max_length,
+                do_sample=do_sample,
+                use_static_cache=use_static_cache,
+                device=device,
+                guided=guided,
+                monitor=monitor,
+            )
+
+        if draft_model is not None:
+            draft_outputs = draft_model.prepare_inputs(
+                texts=texts,
+                device=device,
+                genre_ids=genre_ids,
+                mood_ids=mood_ids,
+                tempo=tempo,
+                duration=duration,
+                instrument_ids=instrument_ids,
+            )
+            decoder = SpeculativeDecoder(
+                self.transformer,
+                draft_model.transformer,
+                num_speculative_tokens=num_speculative_tokens,
+                eos_token_id=eos_token_id,
+                pad_token_id=pad_token_id,
+            )
+            return decoder.generate(
+                input_ids,
+                model_inputs=self._decoder_inputs(encoder_outputs),
+                draft_inputs=self._decoder_inputs(draft_outputs),
+                logits_processor=logits_processor,
+                max_length=max_length,
+                do_sample=do_sample,
+                dtype=self.inference_dtype,
+                draft_dtype=draft_model.inference_dtype,
+                monitor=monitor,
             )
 
         # Generation loop for greedy/sampling
         past_key_values = None
-        finished = torch.zeros(batch_size, dtype=torch.bool, device=device)
-
-        for step in range(max_length - 1):
-            # Forward pass
-            outputs = self.transformer(
-                input_ids=input_ids if past_key_values is None else input_ids[:, -1:],
-                encoder_hidden_states=encoder_hidden_states,
-                encoder_attention_mask=encoder_attention_mask,
-                conditioning_embeddings=conditioning_embeddings if step == 0 else None,
-                past_key_values=past_key_values,
-                use_cache=True,
+        if use_static_cache:
+            past_key_values = StaticKVCache.from_config(
+                self.config.transformer,
+                batch_size=2 * batch_size if guided else batch_size,
+                max_length=max_length,
+                device=device,
+                dtype=self.inference_dtype,
             )
 
-            logits = outputs["logits"][:, -1, :]  # Get last token logits
-            past_key_values = outputs["past_key_values"]
+        # Tokens are written into a preallocated buffer instead of growing
+        # input_ids with torch.cat every step
+        tokens = TokenBuffer.from_tokens(input_ids, max_length, fill_value=pad_token_id)
 
-            # Apply repetition penalty
-            if repetition_penalty != 1.0:
-                for i in range(batch_size):
-                    for previous_token in set(input_ids[i].tolist()):
-                        if logits[i, previous_token] < 0:
-                            logits[i, previous_token] *= repetition_penalty
-                        else:
-                            logits[i, previous_token] /= repetition_penalty
+        # Rows that hit EOS are dropped from the batch; their sequences are copied
+        # into the output (by original row) as they finish
+        row_indices = torch.arange(batch_size, device=device)
+        output = torch.full((batch_size, max_length), pad_token_id, dtype=torch.long, device=device)
 
-            # Apply temperature
-            if temperature != 1.0:
-                logits = logits / temperature
+        for step in range(max_length - 1):
+            if step == 0 and prefix is not None:
+                # BOS step restored from the prefix cache
+                logits = prefix.logits.clone()
+                if isinstance(past_key_values, StaticKVCache):
+                    past_key_values.load_legacy_cache(prefix.past_key_values)
+                else:
+                    past_key_values = prefix.past_key_values
+            else:
+                step_ids = tokens.view() if step == 0 else tokens.last()
+                # Forward pass
+                outputs = self.transformer(
+                    input_ids=step_ids.repeat(2, 1) if guided else step_ids,
+                    encoder_hidden_states=encoder_hidden_states,
+                    encoder_attention_mask=encoder_attention_mask,
+                    conditioning_embeddings=conditioning_embeddings if step == 0 else None,
+                    past_key_values=past_key_values,
+                    use_cache=True,
+                )
+
+                logits = outputs["logits"][:, -1, :]  # Get last token logits
+                past_key_values = outputs["past_key_values"]
+
+                if step == 0 and prefix_key is not None:
+                    self.prefix_cache.put(
+                        prefix_key,
+                        PrefixCacheEntry.from_step(encoder_outputs, past_key_values, logits),
+                    )
+
+            # Penalties and filtering
+            logits = logits_processor(tokens.view(), logits)
 
-            # Sampling
             if do_sample:
-                # Top-k filtering
-                if top_k > 0:
-                    top_k_logits, top_k_indices = torch.topk(logits, top_k, dim=-1)
-                    logits_filtered = torch.full_like(logits, float("-inf"))
-                    logits_filtered.scatter_(-1, top_k_indices, top_k_logits)
-                    logits = logits_filtered
-
-                # Top-p (nucleus) filtering
-                if top_p < 1.0:
-                    sorted_logits, sorted_indices = torch.sort(logits, descending=True, dim=-1)
-                    cumulative_probs = torch.cumsum(F.softmax(sorted_logits, dim=-1), dim=-1)
-
-                    # Remove tokens with cumulative probability above threshold
-                    sorted_indices_to_remove = cumulative_probs > top_p
-                    sorted_indices_to_remove[..., 1:] = sorted_indices_to_remove[..., :-1].clone()
-                    sorted_indices_to_remove[..., 0] = 0
-
-                    for i in range(batch_size):
-                        indices_to_remove = sorted_indices[i][sorted_indices_to_remove[i]]
-                        logits[i][indices_to_remove] = float("-inf")
-
-                # Sample from distribution
                 probs = F.softmax(logits, dim=-1)
                 next_tokens = torch.multinomial(probs, num_samples=1)
             else:
@@ -373,14 +515,273 @@ class MusicGenModel(nn.Module):
                 next_tokens = torch.argmax(logits, dim=-1, keepdim=True)
 
             # Update sequences
-            input_ids = torch.cat([input_ids, next_tokens], dim=-1)
+            tokens.append(next_tokens)
+            if monitor is not None:
+                monitor.step(step + 1)
+
+            # Check for EOS tokens and compact finished rows out of the batch
+            finished = next_tokens.squeeze(-1) == eos_token_id
+            if finished.any():
+                finished_rows = finished.nonzero().squeeze(-1)
+                output[row_indices[finished_rows], : len(tokens)] = tokens.view()[finished_rows]
+
+                keep = (~finished).nonzero().squeeze(-1)
+                if keep.numel() == 0:
+                    break
+
+                # The unconditional twin of each kept row stays in the batch too
+                model_rows = torch.cat([keep, keep + len(row_indices)]) if guided else keep
+
+                row_indices = row_indices[keep]
+                tokens.select_batch(keep)
+                past_key_values = self._select_cache_rows(past_key_values, model_rows)
+                if encoder_hidden_states is not None:
+                    encoder_hidden_states = encoder_hidden_states[model_rows]
+                if encoder_attention_mask is not None:
+                    encoder_attention_mask = encoder_attention_mask[model_rows]
+        else:
+            output[row_indices, : len(tokens)] = tokens.view()
+
+        # Rows that finished early stay padded past their EOS
+        return output[:, : len(tokens)]
+
+    def _generate_delayed(
+        self,
+        encoder_outputs: Dict[str, torch.Tensor],
+        logits_processor: LogitsProcessorList,
+        max_length: int,
+        do_sample: bool,
+        use_static_cache: bool,
+        device: torch.device,
+        guided: bool = False,
+        monitor: Optional[ProgressMonitor] = None,
+    ) -> torch.Tensor:
+        """
+        Sampling/greedy loop for the delay codebook pattern.
+
+        Every step predicts one token per codebook through the per-codebook
+        heads, so ``num_quantizers`` tokens are produced per forward pass.
+        Positions the pattern leaves empty (codebook ``k`` before step ``k + 1``
+        and after its last frame) are forced to the special token. There is no
+        EOS in this mode; generation always runs to ``max_length``. With
+        ``guided``, ``encoder_outputs`` is the doubled classifier-free guidance
+        batch and every step feeds the same frame to both halves.
+
+        Returns:
+            Codes of shape (batch, num_quantizers, max_length - num_quantizers)
+        """
+        num_codebooks = self.transformer.num_codebooks
+        special_token_id = self.transformer.special_token_id
+        num_frames = max_length - num_codebooks
+        if num_frames < 1:
+            raise ValueError(
+                f"max_length ({max_length}) must exceed the number of codebooks ({num_codebooks})"
+            )
+
+        model_batch_size = encoder_outputs["text_hidden_states"].shape[0]
+        batch_size = model_batch_size // 2 if guided else model_batch_size
+        past_key_values = None
+        if use_static_cache:
+            past_key_values = StaticKVCache.from_config(
+                self.config.transformer,
+                batch_size=model_batch_size,
+                max_length=max_length,
+                device=device,
+                dtype=self.inference_dtype,
+            )
+
+        # One buffer row per (sample, codebook), so penalties see each codebook's history
+        tokens = TokenBuffer.from_tokens(
+            torch.full(
+                (batch_size * num_codebooks, 1), self.bos_token_id, dtype=torch.long, device=device
+            ),
+            max_length,
+        )
+        row_codebooks = torch.arange(num_codebooks, device=device).repeat(batch_size)
+
+        for step in range(1, max_length):
+            step_ids = tokens.last().reshape(batch_size, num_codebooks, 1)
+            outputs = self.transformer(
+                input_ids=step_ids.repeat(2, 1, 1) if guided else step_ids,
+                encoder_hidden_states=encoder_outputs["text_hidden_states"],
+                encoder_attention_mask=encoder_outputs["text_attention_mask"],
+                conditioning_embeddings=(
+                    encoder_outputs["conditioning_embeddings"] if step == 1 else None
+                ),
+                past_key_values=past_key_values,
+                use_cache=True,
+            )
+            past_key_values = outputs["past_key_values"]
+            logits = outputs["logits"][:, :, -1].reshape(model_batch_size * num_codebooks, -1)
+
+            # The special token is outside the heads' vocabulary; penalties see it as BOS
+            history = tokens.view()
+            history = history.masked_fill(history == special_token_id, self.bos_token_id)
+            logits = logits_processor(history, logits)
+
+            if do_sample:
+                next_tokens = torch.multinomial(F.softmax(logits, dim=-1), num_samples=1)
+            else:
+                next_tokens = torch.argmax(logits, dim=-1, keepdim=True)
+
+            # At this step codebook k holds frame step - 1 - k
+            frames = step - 1 - row_codebooks
+            empty = (frames < 0) | (frames >= num_frames)
+            tokens.append(next_tokens.masked_fill_(empty.unsqueeze(-1), special_token_id))
+            if monitor is not None:
+                monitor.step(step)
+
+        delayed = tokens.view()[:, 1:].reshape(batch_size, num_codebooks, -1)
+        return EnCodecTokenizer.revert_delay_pattern(delayed)
+
+    def enable_prefix_cache(self, max_bytes: int = 256 * 1024**2) -> PrefixCache:
+        """
+        Cache encoder outputs and the first decode step of repeated prompts.
+
+        Entries are keyed by prompt texts, conditioning inputs, ``model_version``
+        and inference precision. Call ``prefix_cache.clear()`` (or change
+        ``model_version``) after modifying the weights.
+
+        Args:
+            max_bytes: Memory budget of the cached tensors; least recently used
+                entries are evicted beyond it
+
+        Returns:
+            The new :class:`PrefixCache`
+        """
+        self.prefix_cache = PrefixCache(max_bytes=max_bytes)
+        return self.prefix_cache
+
+    def prefix_cache_key(
+        self,
+        texts: List[str],
+        device: torch.device,
+        guided: bool = False,
+        **conditioning: Optional[torch.Tensor],
+    ) -> Optional[tuple]:
+        """
+        Prefix cache key for a batch of prompts, or None when the cache is not in use.
+
+        ``guided`` marks entries holding the doubled classifier-free guidance batch.
+        """
+        if self.prefix_cache is None or self.training:
+            return None
+        if guided:
+            conditioning["classifier_free_guidance"] = True
+
+        model_version = self.model_version if self.model_version is not None else id(self)
+        return PrefixCache.make_key(
+            texts, (model_version, self.inference_precision), device, **conditioning
+        )
+
+    def train(self, mode: bool = True) -> "MusicGenModel":
+        if mode:
+            # The encoders may be updated; the null condition is re-encoded afterwards
+            self._unconditional_inputs.clear()
+        return super().train(mode)
+
+    def unconditional_inputs(
+        self, device: torch.device, use_cache: bool = True
+    ) -> Dict[str, torch.Tensor]:
+        """
+        Encoder outputs of the null condition: an empty prompt without conditioning inputs.
+
+        The null condition does not depend on the request, so with ``use_cache``
+        it is encoded once per device and kept for the lifetime of the model.
+        Nothing is cached in training mode, where the encoder weights change.
+
+        Returns:
+            :meth:`prepare_inputs` outputs with a batch size of 1
+        """
+        key = str(device)
+        use_cache = use_cache and not self.training
+        if use_cache and key in self._unconditional_inputs:
+            return self._unconditional_inputs[key]
+
+        unconditional = self.prepare_inputs(texts=[""], device=device)
+        if use_cache:
+            self._unconditional_inputs[key] = unconditional
+        return unconditional
+
+    @staticmethod
+    def _concat_unconditional_inputs(
+        encoder_outputs: Dict[str, torch.Tensor],
+        unconditional: Dict[str, torch.Tensor],
+        batch_size: int,
+    ) -> Dict[str, torch.Tensor]:
+        """
+        Stack conditional rows and ``batch_size`` copies of the null condition.
+
+        Text states of different lengths are right-padded to a common length,
+        with an attention mask hiding the padding.
+        """
+        states = [
+            encoder_outputs["text_hidden_states"],
+            unconditional["text_hidden_states"].expand(batch_size, -1, -1),
+        ]
+        masks = [encoder_outputs["text_attention_mask"], unconditional["text_attention_mask"]]
+        length = max(state.shape[1] for state in states)
+
+        attention_mask = None
+        if any(mask is not None for mask in masks) or any(
+            state.shape[1] != length for state in states
+        ):
+            attention_mask = torch.cat(
+                [
+                    F.pad(
+                        (
+                            torch.ones(state.shape[:2], dtype=torch.long, device=state.device)
+                            if mask is None
+                            else mask.long().expand(batch_size, -1)
+                        ),
+                        (0, length - state.shape[1]),
+                    )
+                    for state, mask in zip(states, masks)
+                ]
+            )
 
-            # Check for EOS tokens
-            finished = finished | (next_tokens.squeeze(-1) == eos_token_id)
-            if finished.all():
-                break
+        conditioning_embeddings = encoder_outputs["conditioning_embeddings"]
+        if conditioning_embeddings is not None:
+            unconditional_embeddings = unconditional["conditioning_embeddings"]
+            if unconditional_embeddings is None:
+                unconditional_embeddings = torch.zeros_like(conditioning_embeddings[:1])
+            conditioning_embeddings = torch.cat(
+                [
+                    conditioning_embeddings.expand(batch_size, -1),
+                    unconditional_embeddings.expand(batch_size, -1),
+                ]
+            )
 
-        return input_ids
+        return {
+            "text_hidden_states": torch.cat(
+                [F.pad(state, (0, 0, 0, length - state.shape[1])) for state in states]
+            ),
+            "text_attention_mask": attention_mask,
+            "conditioning_embeddings": conditioning_embeddings,
+        }
+
+    @staticmethod
+    def _decoder_inputs(encoder_outputs: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
+        """Map :meth:`prepare_inputs` outputs to transformer keyword arguments."""
+        return {
+            "encoder_hidden_states": encoder_outputs["text_hidden_states"],
+            "encoder_attention_mask": encoder_outputs["text_attention_mask"],
+            "conditioning_embeddings": encoder_outputs["conditioning_embeddings"],
+        }
+
+    @staticmethod
+    def _select_cache_rows(
+        past_key_values: Union[StaticKVCache, Tuple[Tuple[torch.Tensor, ...], ...]],
+        rows: torch.Tensor,
+    ) -> Union[StaticKVCache, Tuple[Tuple[torch.Tensor, ...], ...]]:
+        """Keep only ``rows`` of a KV cache, releasing memory held by the others."""
+        if isinstance(past_key_values, StaticKVCache):
+            past_key_values.select_batch(rows)
+            return past_key_values
+        return tuple(
+            tuple(state.index_select(0, rows) for state in layer_past)
+            for layer_past in past_key_values
+        )
 
     @torch.no_grad()
     def generate_audio(
@@ -400,6 +801,10 @@ class MusicGenModel(nn.Module):
 
         # Calculate target sequence length
         target_length = self.audio_tokenizer.get_sequence_length(duration)
+        if self.transformer.num_codebooks > 1:
+            # One step per frame, plus BOS and the steps the delay pattern adds
+            target_length = target_length // self.transformer.num_codebooks
+            target_length += self.transformer.num_codebooks
         generation_kwargs.setdefault("max_length", target_length)
 
         # Generate tokens
@@ -426,10 +831,20 @@ class MusicGenModel(nn.Module):
         eos_token_id: int = 2,
         length_penalty: float = 1.0,
         diversity_penalty: float = 0.0,
+        num_beam_groups: int = 1,
+        num_return_sequences: int = 1,
         early_stopping: bool = True,
+        monitor: Optional[ProgressMonitor] = None,
+        use_paged_cache: bool = True,
         **kwargs,
     ) -> torch.Tensor:
-        """Generate using beam search."""
+        """
+        Generate using beam search.
+
+        With ``use_paged_cache`` the beams decode into a :class:`PagedKVCache`,
+        so reordering beams moves block references instead of copying every
+        layer's keys and values.
+        """
 
         # Create beam search configuration
         beam_config = BeamSearchConfig(
@@ -441,20 +856,34 @@ class MusicGenModel(nn.Module):
             repetition_penalty=repetition_penalty,
             length_penalty=length_penalty,
             diversity_penalty=diversity_penalty,
+            num_beam_groups=num_beam_groups,
+            num_return_sequences=num_return_sequences,
             early_stopping=early_stopping,
             pad_token_id=pad_token_id,
             eos_token_id=eos_token_id,
             bos_token_id=self.bos_token_id,
         )
 
-        # Perform beam search
+        past_key_values = None
+        if use_paged_cache:
+            past_key_values = PagedKVCache.from_config(
+                self.config.transformer,
+                batch_size=input_ids.shape[0] * num_beams,
+                max_length=max_length,
+                device=input_ids.device,
+                dtype=self.inference_dtype,
+            )
+
+        # Perform beam search directly on the decoder (encoder outputs are precomputed)
         generated_sequences, scores = beam_search_generate(
-            model=self,
+            model=self.transformer,
             input_ids=input_ids,
             config=beam_config,
             encoder_hidden_states=encoder_hidden_states,
             encoder_attention_mask=encoder_attention_mask,
             conditioning_embeddings=conditioning_embeddings,
+            monitor=monitor,
+            past_key_values=past_key_values,
         )
 
         return generated_sequences
@@ -471,6 +900,8 @@ class MusicGenModel(nn.Module):
         repetition_penalty: float = 1.1,
         length_penalty: float = 1.0,
         diversity_penalty: float = 0.0,
+        num_beam_groups: int = 1,
+        num_return_sequences: int = 1,
         early_stopping: bool = True,
         genre_ids: Optional[torch.Tensor] = None,
         mood_ids: Optional[torch.Tensor] = None,
@@ -493,6 +924,10 @@ class MusicGenModel(nn.Module):
             repetition_penalty: Repetition penalty factor
             length_penalty: Length penalty factor for beam search
             diversity_penalty: Diversity penalty for diverse beam search
+            num_beam_groups: Beam groups for diverse beam search; ``num_beams`` must
+                be divisible by it. All groups decode in the same batched forward pass
+            num_return_sequences: Sequences returned per prompt. With beam groups,
+                up to ``num_beam_groups`` of them come from distinct groups
             early_stopping: Whether to stop early when EOS is found
             genre_ids: Genre conditioning
             mood_ids: Mood conditioning
@@ -503,7 +938,8 @@ class MusicGenModel(nn.Module):
             **kwargs: Additional arguments
 
         Returns:
-            Generated token sequences
+            Generated token sequences; the ``num_return_sequences`` sequences of
+            each prompt are consecutive rows
         """
 
         if device is None:
@@ -543,6 +979,8 @@ class MusicGenModel(nn.Module):
             num_beams=num_beams,
             length_penalty=length_penalty,
             diversity_penalty=diversity_penalty,
+            num_beam_groups=num_beam_groups,
+            num_return_sequences=num_return_sequences,
             early_stopping=early_stopping,
             **kwargs,
         )
@@ -580,6 +1018,7 @@ class MusicGenModel(nn.Module):
         """Save model weights and configuration."""
         import json
         import os
+        from dataclasses import asdict
 
         os.makedirs(save_directory, exist_ok=True)
 
@@ -588,11 +1027,58 @@ class MusicGenModel(nn.Module):
 
         # Save configuration
         with open(os.path.join(save_directory, "config.json"), "w") as f:
-            json.dump(self.config.__dict__, f, indent=2)
+            json.dump(asdict(self.config), f, indent=2)
+
+    def set_inference_precision(self, precision: str) -> "MusicGenModel":
+        """
+        Select the numeric precision the transformer runs at during inference.
+
+        Args:
+            precision: One of
+                - ``"fp32"``: full precision (default)
+                - ``"bf16"``: bfloat16 autocast around the transformer layers; weights
+                  stay fp32, KV caches are kept in bf16
+                - ``"int8"``: dynamic int8 quantization of the transformer's
+                  ``nn.Linear`` layers (CPU only). This replaces the layers in
+                  place and cannot be undone. Activation scales are chosen per
+                  call, so results depend slightly on batch composition.
+
+        Returns:
+            The model itself
+        """
+        if precision not in INFERENCE_PRECISIONS:
+            raise ValueError(
+                f"Unknown precision: {precision}. Choose one of {', '.join(INFERENCE_PRECISIONS)}"
+            )
+        if self.inference_precision == "int8" and precision != "int8":
+            raise ValueError("An int8-quantized model cannot be converted back; reload it instead")
+
+        if precision == "int8" and self.inference_precision != "int8":
+            self.eval()
+            torch.ao.quantization.quantize_dynamic(
+                self.transformer, {nn.Linear}, dtype=torch.qint8, inplace=True
+            )
+
+        self.transformer.autocast_dtype = torch.bfloat16 if precision == "bf16" else None
+        self.inference_precision = precision
+        return self
+
+    @property
+    def inference_dtype(self) -> torch.dtype:
+        """dtype of the transformer's attention activations, and so of its KV caches."""
+        if self.inference_precision == "bf16":
+            return torch.bfloat16
+        return next(self.transformer.parameters()).dtype
 
     @classmethod
-    def from_pretrained(cls, model_path: str, **kwargs):
-        """Load model from saved weights and configuration."""
+    def from_pretrained(cls, model_path: str, precision: str = "fp32", **kwargs):
+        """
+        Load model from saved weights and configuration.
+
+        ``precision`` selects the inference precision (see
+        :meth:`set_inference_precision`); it is applied after the fp32 weights
+        are loaded.
+        """
         import json
         import os
 
@@ -602,24 +1088,34 @@ class MusicGenModel(nn.Module):
             config_dict = json.load(f)
 
         config = MusicGenConfig(**config_dict)
+        # __post_init__ derives transformer sizes again; keep the saved, already derived ones
+        config.transformer = TransformerConfig(**config_dict["transformer"])
 
         # Create model
         model = cls(config, **kwargs)
+        model.model_version = model_path
 
         # Load weights
         weights_path = os.path.join(model_path, "pytorch_model.bin")
         state_dict = torch.load(weights_path, map_location="cpu")
         model.load_state_dict(state_dict)
 
+        if precision != "fp32":
+            model.set_inference_precision(precision)
+
         return model
 
 
-def create_musicgen_model(model_size: str = "base", **config_overrides) -> MusicGenModel:
+def create_musicgen_model(
+    model_size: str = "base", precision: str = "fp32", **config_overrides
+) -> MusicGenModel:
     """
     Factory function to create MusicGen model with predefined configurations.
 
     Args:
         model_size: Model size ("small", "base", "large")
+        precision: Inference precision ("fp32", "bf16" or "int8"), see
+            :meth:`MusicGenModel.set_inference_precision`
         **config_overrides: Configuration overrides
 
     Returns:
@@ -660,4 +1156,7 @@ def create_musicgen_model(model_size: str = "base", **config_overrides) -> Music
     config_dict = {**base_config, **config_overrides}
     config = MusicGenConfig(**config_dict)
 
-    return MusicGenModel(config)
+    model = MusicGenModel(config)
+    if precision != "fp32":
+        model.set_inference_precision(precision)
+    return model
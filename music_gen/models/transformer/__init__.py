@@ -2,6 +2,7 @@
 Transformer architecture module for MusicGen.
 """
 
+from .cache import PagedKVCache, RingKVCache, StackedKVCache, StaticKVCache
 from .config import ConditioningConfig, EnCodecConfig, MusicGenConfig, T5Config, TransformerConfig
 from .model import MultiHeadAttention, MusicGenTransformer, TransformerLayer
 
@@ -14,4 +15,8 @@ __all__ = [
     "MusicGenTransformer",
     "MultiHeadAttention",
     "TransformerLayer",
+    "StaticKVCache",
+    "PagedKVCache",
+    "RingKVCache",
+    "StackedKVCache",
 ]
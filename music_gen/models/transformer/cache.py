@@ -0,0 +1,794 @@
+"""
+Key/value caches for incremental decoding with the MusicGen transformer.
+"""
+
+from typing import List, Optional, Tuple
+
+import torch
+
+from .config import TransformerConfig
+
+
+class StaticKVCache:
+    """
+    Preallocated key/value cache.
+
+    Self-attention buffers for every layer are allocated once with room for
+    ``max_length`` positions. Each forward pass writes its new keys/values in
+    place at the current write offset and attention reads a view over the
+    valid prefix, so decoding never reallocates or copies the history.
+
+    Cross-attention keys/values are projected from the encoder states on the
+    first forward pass and held alongside the self-attention entries for the
+    rest of the generation.
+    """
+
+    def __init__(
+        self,
+        num_layers: int,
+        batch_size: int,
+        num_heads: int,
+        head_dim: int,
+        max_length: int,
+        device: Optional[torch.device] = None,
+        dtype: torch.dtype = torch.float32,
+    ):
+        self.num_layers = num_layers
+        self.batch_size = batch_size
+        self.num_heads = num_heads
+        self.head_dim = head_dim
+        self.max_length = max_length
+
+        shape = (batch_size, num_heads, max_length, head_dim)
+        self.key_cache: List[torch.Tensor] = [
+            torch.zeros(shape, device=device, dtype=dtype) for _ in range(num_layers)
+        ]
+        self.value_cache: List[torch.Tensor] = [
+            torch.zeros(shape, device=device, dtype=dtype) for _ in range(num_layers)
+        ]
+
+        # Cross-attention keys/values, filled lazily on the first forward pass
+        self.cross_key_cache: List[Optional[torch.Tensor]] = [None] * num_layers
+        self.cross_value_cache: List[Optional[torch.Tensor]] = [None] * num_layers
+
+        # Number of positions already written (shared by all layers)
+        self.seq_length = 0
+
+    @classmethod
+    def from_config(
+        cls,
+        config: TransformerConfig,
+        batch_size: int,
+        max_length: int,
+        device: Optional[torch.device] = None,
+        dtype: torch.dtype = torch.float32,
+    ) -> "StaticKVCache":
+        """Create a cache sized for the given transformer configuration."""
+        return cls(
+            num_layers=config.num_layers,
+            batch_size=batch_size,
+            num_heads=config.num_heads,
+            head_dim=config.hidden_size // config.num_heads,
+            max_length=max_length,
+            device=device,
+            dtype=dtype,
+        )
+
+    def __len__(self) -> int:
+        return self.num_layers
+
+    def get_seq_length(self) -> int:
+        """Number of valid cached positions."""
+        return self.seq_length
+
+    def update(
+        self,
+        layer_idx: int,
+        key_states: torch.Tensor,
+        value_states: torch.Tensor,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Write new key/value states for a layer and return the valid cache views.
+
+        Args:
+            layer_idx: Index of the transformer layer
+            key_states: New keys of shape (batch, heads, new_len, head_dim)
+            value_states: New values of shape (batch, heads, new_len, head_dim)
+
+        Returns:
+            Tuple of (keys, values) views covering all valid positions
+        """
+        start = self.seq_length
+        end = start + key_states.shape[2]
+        if end > self.max_length:
+            raise ValueError(
+                f"StaticKVCache overflow: need {end} positions but cache was "
+                f"allocated for max_length={self.max_length}"
+            )
+
+        self.key_cache[layer_idx][:, :, start:end].copy_(key_states)
+        self.value_cache[layer_idx][:, :, start:end].copy_(value_states)
+
+        return (
+            self.key_cache[layer_idx][:, :, :end],
+            self.value_cache[layer_idx][:, :, :end],
+        )
+
+    def get_cross_attention(self, layer_idx: int) -> Optional[Tuple[torch.Tensor, torch.Tensor]]:
+        """Get cached cross-attention keys/values for a layer, if computed."""
+        if self.cross_key_cache[layer_idx] is None:
+            return None
+        return self.cross_key_cache[layer_idx], self.cross_value_cache[layer_idx]
+
+    def set_cross_attention(
+        self,
+        layer_idx: int,
+        key_states: torch.Tensor,
+        value_states: torch.Tensor,
+    ):
+        """Store projected encoder keys/values for a layer."""
+        self.cross_key_cache[layer_idx] = key_states
+        self.cross_value_cache[layer_idx] = value_states
+
+    def clear_cross_attention(self):
+        """Drop cached cross-attention keys/values (e.g. after a prompt change)."""
+        self.cross_key_cache = [None] * self.num_layers
+        self.cross_value_cache = [None] * self.num_layers
+
+    def select_batch(self, indices: torch.Tensor):
+        """
+        Keep only the given batch rows, in the given order.
+
+        The buffers are reallocated at the smaller batch size, so memory held
+        by dropped rows is released.
+        """
+        self.key_cache = [k.index_select(0, indices) for k in self.key_cache]
+        self.value_cache = [v.index_select(0, indices) for v in self.value_cache]
+        self.cross_key_cache = [
+            k.index_select(0, indices) if k is not None else None for k in self.cross_key_cache
+        ]
+        self.cross_value_cache = [
+            v.index_select(0, indices) if v is not None else None for v in self.cross_value_cache
+        ]
+        self.batch_size = indices.shape[0]
+
+    def advance(self, num_tokens: int):
+        """Move the write offset forward once all layers have been updated."""
+        self.seq_length += num_tokens
+
+    def crop(self, length: int):
+        """
+        Roll back to the first ``length`` positions (e.g. after rejected speculative tokens).
+
+        Later positions are simply overwritten by the next update.
+        """
+        if length > self.seq_length:
+            raise ValueError(
+                f"Cannot crop StaticKVCache to {length} positions; it only holds {self.seq_length}"
+            )
+        self.seq_length = length
+
+    def reset(self):
+        """Invalidate all cached positions without freeing the buffers."""
+        self.seq_length = 0
+        self.clear_cross_attention()
+
+    def load_legacy_cache(self, past_key_values: Tuple[Tuple[torch.Tensor, ...], ...]):
+        """Fill an empty cache from the tuple format used by ``past_key_values``."""
+        if self.seq_length != 0:
+            raise ValueError("load_legacy_cache requires an empty StaticKVCache")
+
+        for layer_idx, layer_past in enumerate(past_key_values):
+            self.update(layer_idx, layer_past[0], layer_past[1])
+            if len(layer_past) > 2:
+                self.set_cross_attention(layer_idx, layer_past[2], layer_past[3])
+        self.advance(past_key_values[0][0].shape[2])
+
+    def to_legacy_cache(self) -> Tuple[Tuple[torch.Tensor, ...], ...]:
+        """Convert to the tuple format used by ``past_key_values``."""
+        legacy_cache = []
+        for i in range(self.num_layers):
+            layer_cache = (
+                self.key_cache[i][:, :, : self.seq_length],
+                self.value_cache[i][:, :, : self.seq_length],
+            )
+            if self.cross_key_cache[i] is not None:
+                layer_cache = layer_cache + (self.cross_key_cache[i], self.cross_value_cache[i])
+            legacy_cache.append(layer_cache)
+        return tuple(legacy_cache)
+
+
+class PagedKVCache(StaticKVCache):
+    """
+    Block-paged key/value cache for beam search.
+
+    Self-attention keys/values live in a shared pool of fixed-size blocks and
+    every row holds a table of references into that pool. Reordering beams
+    (:meth:`reorder_beams`) permutes the block tables and updates reference
+    counts; no key/value data is copied, and a prefix shared by several beams
+    is stored once. A partially filled block that became shared is copied
+    (at most ``block_size`` positions per row) the next time a row writes to
+    it, and blocks no beam references any more return to the free list.
+
+    Attention reads each row's keys/values through its block table. The
+    cache is a drop-in replacement for :class:`StaticKVCache` in the
+    transformer; cross-attention entries are kept per row as there.
+    """
+
+    def __init__(
+        self,
+        num_layers: int,
+        batch_size: int,
+        num_heads: int,
+        head_dim: int,
+        max_length: int,
+        block_size: int = 16,
+        num_blocks: Optional[int] = None,
+        device: Optional[torch.device] = None,
+        dtype: torch.dtype = torch.float32,
+    ):
+        # The dense per-row buffers of StaticKVCache are replaced by the block
+        # pool, so its constructor is deliberately not called
+        self.num_layers = num_layers
+        self.batch_size = batch_size
+        self.num_heads = num_heads
+        self.head_dim = head_dim
+        self.max_length = max_length
+        self.block_size = block_size
+        self.device = device
+
+        # Enough blocks for every row to diverge completely
+        self.blocks_per_row = -(-max_length // block_size)
+        if num_blocks is None:
+            num_blocks = batch_size * self.blocks_per_row
+        self.num_blocks = num_blocks
+
+        shape = (num_blocks, block_size, num_heads, head_dim)
+        self.key_pool: List[torch.Tensor] = [
+            torch.zeros(shape, device=device, dtype=dtype) for _ in range(num_layers)
+        ]
+        self.value_pool: List[torch.Tensor] = [
+            torch.zeros(shape, device=device, dtype=dtype) for _ in range(num_layers)
+        ]
+
+        # Host-side bookkeeping: block ids of every row, references per block
+        self.block_tables: List[List[int]] = [[] for _ in range(batch_size)]
+        self.ref_counts: List[int] = [0] * num_blocks
+        self._free_blocks: List[int] = list(range(num_blocks - 1, -1, -1))
+
+        # Device-side indices shared by all layers of one forward pass
+        self._write_blocks: Optional[torch.Tensor] = None
+        self._write_offsets: Optional[torch.Tensor] = None
+        self._read_blocks: Optional[torch.Tensor] = None
+
+        self.cross_key_cache: List[Optional[torch.Tensor]] = [None] * num_layers
+        self.cross_value_cache: List[Optional[torch.Tensor]] = [None] * num_layers
+
+        self.seq_length = 0
+
+    @classmethod
+    def from_config(
+        cls,
+        config: TransformerConfig,
+        batch_size: int,
+        max_length: int,
+        device: Optional[torch.device] = None,
+        dtype: torch.dtype = torch.float32,
+        block_size: int = 16,
+    ) -> "PagedKVCache":
+        """Create a cache sized for the given transformer configuration."""
+        return cls(
+            num_layers=config.num_layers,
+            batch_size=batch_size,
+            num_heads=config.num_heads,
+            head_dim=config.hidden_size // config.num_heads,
+            max_length=max_length,
+            block_size=block_size,
+            device=device,
+            dtype=dtype,
+        )
+
+    @property
+    def num_free_blocks(self) -> int:
+        """Blocks not referenced by any row."""
+        return len(self._free_blocks)
+
+    def _allocate_block(self) -> int:
+        if not self._free_blocks:
+            raise ValueError(
+                f"PagedKVCache out of blocks: all {self.num_blocks} blocks of "
+                f"{self.block_size} positions are in use"
+            )
+        block = self._free_blocks.pop()
+        self.ref_counts[block] = 1
+        return block
+
+    def _release_block(self, block: int):
+        self.ref_counts[block] -= 1
+        if self.ref_counts[block] == 0:
+            self._free_blocks.append(block)
+
+    def _prepare_write(self, start: int, end: int):
+        """
+        Make the blocks covering positions ``[start, end)`` writable for every row.
+
+        New blocks are allocated past the end of a row's table; a shared block
+        about to be written is copied first so the other rows keep their data.
+        """
+        first_block = start // self.block_size
+        last_block = (end - 1) // self.block_size
+        copy_src, copy_dst = [], []
+
+        for table in self.block_tables:
+            for block_idx in range(first_block, last_block + 1):
+                if block_idx == len(table):
+                    table.append(self._allocate_block())
+                elif self.ref_counts[table[block_idx]] > 1:
+                    block = self._allocate_block()
+                    copy_src.append(table[block_idx])
+                    copy_dst.append(block)
+                    self._release_block(table[block_idx])
+                    table[block_idx] = block
+
+        if copy_src:
+            src = torch.tensor(copy_src, device=self.device)
+            dst = torch.tensor(copy_dst, device=self.device)
+            for pool in self.key_pool + self.value_pool:
+                pool[dst] = pool[src]
+
+        positions = torch.arange(start, end)
+        blocks = torch.tensor([table[first_block : last_block + 1] for table in self.block_tables])
+        self._write_blocks = blocks[:, positions // self.block_size - first_block].to(self.device)
+        self._write_offsets = (positions % self.block_size).to(self.device)
+        self._read_blocks = torch.tensor(
+            [table[: last_block + 1] for table in self.block_tables], device=self.device
+        )
+
+    def update(
+        self,
+        layer_idx: int,
+        key_states: torch.Tensor,
+        value_states: torch.Tensor,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Write new key/value states for a layer and return every row's keys/values.
+
+        Block bookkeeping for the step runs on the first layer's update and is
+        shared by the remaining layers.
+        """
+        start = self.seq_length
+        end = start + key_states.shape[2]
+        if end > self.max_length:
+            raise ValueError(
+                f"PagedKVCache overflow: need {end} positions but cache was "
+                f"allocated for max_length={self.max_length}"
+            )
+        if layer_idx == 0:
+            self._prepare_write(start, end)
+
+        # Pool layout is (block, offset, heads, head_dim)
+        self.key_pool[layer_idx][self._write_blocks, self._write_offsets] = key_states.transpose(
+            1, 2
+        )
+        self.value_pool[layer_idx][self._write_blocks, self._write_offsets] = (
+            value_states.transpose(1, 2)
+        )
+        return self._gather(layer_idx, end)
+
+    def _gather(self, layer_idx: int, length: int) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Keys/values of every row through its block table, as (batch, heads, length, dim)."""
+        batch_size = len(self.block_tables)
+        states = []
+        for pool in (self.key_pool[layer_idx], self.value_pool[layer_idx]):
+            rows = pool[self._read_blocks].view(batch_size, -1, self.num_heads, self.head_dim)
+            states.append(rows[:, :length].transpose(1, 2))
+        return states[0], states[1]
+
+    def reorder_beams(self, indices: torch.Tensor):
+        """
+        Make row ``i`` continue the sequence of row ``indices[i]``.
+
+        Only block references move. Cross-attention entries are left in place:
+        beams never move between batch items and every beam of an item attends
+        to the same text.
+        """
+        old_tables = self.block_tables
+        self.block_tables = [list(old_tables[row]) for row in indices.tolist()]
+        for table in self.block_tables:
+            for block in table:
+                self.ref_counts[block] += 1
+        for table in old_tables:
+            for block in table:
+                self._release_block(block)
+
+    def select_batch(self, indices: torch.Tensor):
+        """Keep only the given batch rows, in the given order, releasing unused blocks."""
+        self.reorder_beams(indices)
+        self.cross_key_cache = [
+            k.index_select(0, indices) if k is not None else None for k in self.cross_key_cache
+        ]
+        self.cross_value_cache = [
+            v.index_select(0, indices) if v is not None else None for v in self.cross_value_cache
+        ]
+        self.batch_size = indices.shape[0]
+
+    def reset(self):
+        """Release every block and invalidate all cached positions."""
+        for table in self.block_tables:
+            for block in table:
+                self._release_block(block)
+        self.block_tables = [[] for _ in range(self.batch_size)]
+        self.seq_length = 0
+        self.clear_cross_attention()
+
+    def to_legacy_cache(self) -> Tuple[Tuple[torch.Tensor, ...], ...]:
+        """Convert to the tuple format used by ``past_key_values``."""
+        num_blocks = -(-self.seq_length // self.block_size)
+        self._read_blocks = torch.tensor(
+            [table[:num_blocks] for table in self.block_tables],
+            dtype=torch.long,
+            device=self.device,
+        )
+        legacy_cache = []
+        for i in range(self.num_layers):
+            layer_cache = self._gather(i, self.seq_length)
+            if self.cross_key_cache[i] is not None:
+                layer_cache = layer_cache + (self.cross_key_cache[i], self.cross_value_cache[i])
+            legacy_cache.append(tuple(layer_cache))
+        return tuple(legacy_cache)
+
+
+def _rotate_half(x: torch.Tensor) -> torch.Tensor:
+    """Rotate half the hidden dims (the 90 degree turn used by rotary embeddings)."""
+    x1 = x[..., : x.shape[-1] // 2]
+    x2 = x[..., x.shape[-1] // 2 :]
+    return torch.cat((-x2, x1), dim=-1)
+
+
+class RingKVCache(StaticKVCache):
+    """
+    Fixed-size rolling cache for endless decoding with attention sinks.
+
+    The first ``num_sink_tokens`` positions are kept for the whole session
+    and the remaining ``window_length`` slots form a ring buffer over the
+    most recent positions: once the cache is full, each new token
+    overwrites the oldest window entry (StreamingLLM). Memory and per-token
+    attention cost are therefore constant however long decoding runs.
+
+    Positions are assigned by order within the cache rather than since the
+    start of the session, so the position tables never grow: once full,
+    every new token sits at position ``capacity - 1``. With rotary
+    embeddings keys are stored unrotated and rotated by their current
+    position in the cache whenever they are read, so relative distances
+    stay exact as the window slides. Learned positional embeddings are
+    baked into the cached keys and cannot be shifted.
+
+    Once the cache is full it accepts one token per forward pass.
+    """
+
+    def __init__(
+        self,
+        num_layers: int,
+        batch_size: int,
+        num_heads: int,
+        head_dim: int,
+        window_length: int,
+        num_sink_tokens: int = 4,
+        rotary_base: Optional[float] = None,
+        device: Optional[torch.device] = None,
+        dtype: torch.dtype = torch.float32,
+    ):
+        if window_length <= 0:
+            raise ValueError(f"window_length must be positive, got {window_length}")
+        super().__init__(
+            num_layers=num_layers,
+            batch_size=batch_size,
+            num_heads=num_heads,
+            head_dim=head_dim,
+            max_length=num_sink_tokens + window_length,
+            device=device,
+            dtype=dtype,
+        )
+        self.num_sink_tokens = num_sink_tokens
+        self.window_length = window_length
+        self.capacity = num_sink_tokens + window_length
+
+        # Slot (within the window) of the oldest window entry, and tokens seen so far
+        self.window_start = 0
+        self.total_length = 0
+
+        # Rotary frequencies when keys are stored unrotated
+        self.inv_freq = None
+        if rotary_base is not None:
+            self.inv_freq = 1.0 / (
+                rotary_base ** (torch.arange(0, head_dim, 2, device=device).float() / head_dim)
+            )
+
+        # Per-step layout shared by all layers of one forward pass
+        self._write_slots: Optional[torch.Tensor] = None
+        self._read_length = 0
+        self._rotation: Optional[Tuple[torch.Tensor, ...]] = None
+
+    @classmethod
+    def from_config(
+        cls,
+        config: TransformerConfig,
+        batch_size: int,
+        window_length: int,
+        num_sink_tokens: int = 4,
+        device: Optional[torch.device] = None,
+        dtype: torch.dtype = torch.float32,
+    ) -> "RingKVCache":
+        """Create a cache for the given transformer configuration."""
+        return cls(
+            num_layers=config.num_layers,
+            batch_size=batch_size,
+            num_heads=config.num_heads,
+            head_dim=config.hidden_size // config.num_heads,
+            window_length=window_length,
+            num_sink_tokens=num_sink_tokens,
+            # Base used by the transformer's RotaryPositionalEncoding
+            rotary_base=10000.0 if config.use_rotary_positional_encoding else None,
+            device=device,
+            dtype=dtype,
+        )
+
+    def get_seq_length(self) -> int:
+        """
+        Position of the next token.
+
+        Equal to the number of cached positions until the cache is full; from
+        then on the oldest window entry makes room for every new token.
+        """
+        return min(self.seq_length, self.capacity - 1)
+
+    def _slot_positions(self, length: int) -> torch.Tensor:
+        """Position within the cache of each of the first ``length`` slots."""
+        slots = torch.arange(length, device=self.key_cache[0].device)
+        window = slots[self.num_sink_tokens :] - self.num_sink_tokens
+        positions = slots.clone()
+        positions[self.num_sink_tokens :] = self.num_sink_tokens + (
+            (window - self.window_start) % self.window_length
+        )
+        return positions
+
+    def _rotary_tables(self, positions: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        freqs = torch.outer(positions.to(self.inv_freq.dtype), self.inv_freq)
+        emb = torch.cat((freqs, freqs), dim=-1)
+        return emb.cos(), emb.sin()
+
+    def _prepare_write(self, num_tokens: int):
+        """Choose the slots for ``num_tokens`` new positions, evicting the oldest if full."""
+        # Slots are built on the device: copying host indices would sync every step
+        device = self.key_cache[0].device
+        valid = self.seq_length
+        if valid + num_tokens <= self.capacity:
+            slots = torch.arange(valid, valid + num_tokens, device=device)
+            position = valid
+        elif num_tokens == 1 and valid == self.capacity:
+            first = self.num_sink_tokens + self.window_start
+            slots = torch.arange(first, first + 1, device=device)
+            self.window_start = (self.window_start + 1) % self.window_length
+            position = valid - 1
+        else:
+            raise ValueError(
+                f"RingKVCache cannot take {num_tokens} positions with {valid} of "
+                f"{self.capacity} slots used; a full cache accepts one token per step"
+            )
+
+        self._write_slots = slots
+        self._read_length = min(valid + num_tokens, self.capacity)
+        self._rotation = None
+        if self.inv_freq is not None:
+            cos, sin = self._rotary_tables(self._slot_positions(self._read_length))
+            # New keys arrive rotated at their positions; undo that before storing
+            new_positions = torch.arange(position, position + num_tokens, device=device)
+            new_cos, new_sin = self._rotary_tables(new_positions)
+            self._rotation = (cos, sin, new_cos, new_sin)
+
+    def update(
+        self,
+        layer_idx: int,
+        key_states: torch.Tensor,
+        value_states: torch.Tensor,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Write new key/value states for a layer and return all cached keys/values.
+
+        Keys/values are returned in slot order rather than sequence order; with
+        a single query (or before the window wraps, when the two agree)
+        attention does not depend on the order of its keys.
+        """
+        if layer_idx == 0:
+            self._prepare_write(key_states.shape[2])
+
+        if self._rotation is not None:
+            cos, sin, new_cos, new_sin = (t.to(key_states.dtype) for t in self._rotation)
+            key_states = key_states * new_cos - _rotate_half(key_states) * new_sin
+
+        self.key_cache[layer_idx].index_copy_(2, self._write_slots, key_states)
+        self.value_cache[layer_idx].index_copy_(2, self._write_slots, value_states)
+
+        keys = self.key_cache[layer_idx][:, :, : self._read_length]
+        if self._rotation is not None:
+            keys = keys * cos + _rotate_half(keys) * sin
+        return keys, self.value_cache[layer_idx][:, :, : self._read_length]
+
+    def advance(self, num_tokens: int):
+        """Move past the positions written by the last forward pass."""
+        self.seq_length = min(self.seq_length + num_tokens, self.capacity)
+        self.total_length += num_tokens
+
+    def crop(self, length: int):
+        """Roll back to the first ``length`` positions; only possible before the window slides."""
+        if self.total_length > self.capacity:
+            raise ValueError("Cannot crop a RingKVCache after its window started sliding")
+        super().crop(length)
+        self.total_length = length
+
+    def reset(self):
+        """Invalidate all cached positions without freeing the buffers."""
+        super().reset()
+        self.window_start = 0
+        self.total_length = 0
+
+    def to_legacy_cache(self) -> Tuple[Tuple[torch.Tensor, ...], ...]:
+        """
+        Convert to the tuple format used by ``past_key_values``.
+
+        Entries are in sequence order (sinks, then the window from oldest to
+        newest) with keys rotated at their positions in the cache.
+        """
+        length = self.seq_length
+        positions = self._slot_positions(length)
+        order = torch.argsort(positions)
+        if self.inv_freq is not None:
+            cos, sin = self._rotary_tables(torch.arange(length, device=order.device))
+
+        legacy_cache = []
+        for i in range(self.num_layers):
+            keys = self.key_cache[i].index_select(2, order)
+            if self.inv_freq is not None:
+                keys = keys * cos.to(keys.dtype) + _rotate_half(keys) * sin.to(keys.dtype)
+            layer_cache = (keys, self.value_cache[i].index_select(2, order))
+            if self.cross_key_cache[i] is not None:
+                layer_cache = layer_cache + (self.cross_key_cache[i], self.cross_value_cache[i])
+            legacy_cache.append(layer_cache)
+        return tuple(legacy_cache)
+
+
+class StackedKVCache(StaticKVCache):
+    """
+    Batch view over independent single-row caches for one decoding step.
+
+    Lets sequences that own separate caches (e.g. concurrent streaming
+    sessions) share a single batched forward pass. Every row must decode
+    exactly one token and already hold its cross-attention keys/values. Each
+    row's cache is updated in place and the rows' keys/values are padded to
+    the longest one; :meth:`attention_mask` and :meth:`encoder_attention_mask`
+    exclude the padding and :meth:`position_ids` gives each row its own
+    position. Only the operations of a forward pass are supported; reorder,
+    crop or reset the row caches themselves.
+
+    Cross-attention entries don't change between steps, so a caller stepping
+    the same rows repeatedly can pass the previous view's
+    :attr:`cross_attention` instead of stacking them again.
+    """
+
+    def __init__(
+        self,
+        caches: List[StaticKVCache],
+        cross_attention: Optional[List[Tuple[torch.Tensor, torch.Tensor]]] = None,
+    ):
+        # Storage stays in the row caches, so the StaticKVCache buffers are
+        # deliberately not allocated
+        if not caches:
+            raise ValueError("StackedKVCache needs at least one cache")
+        first = caches[0]
+        self.caches = caches
+        self.num_layers = first.num_layers
+        self.batch_size = len(caches)
+        self.num_heads = first.num_heads
+        self.head_dim = first.head_dim
+
+        # Attended length of each row once the next token has been written
+        self._read_lengths = [cache.get_seq_length() + 1 for cache in caches]
+        self.seq_length = max(self._read_lengths) - 1
+
+        self._cross_lengths = [
+            0 if cache.cross_key_cache[0] is None else cache.cross_key_cache[0].shape[2]
+            for cache in caches
+        ]
+        if cross_attention is None:
+            cross_attention = self.stack_cross_attention(caches)
+        self.cross_attention = cross_attention
+
+    @classmethod
+    def stack_cross_attention(
+        cls, caches: List[StaticKVCache]
+    ) -> Optional[List[Tuple[torch.Tensor, torch.Tensor]]]:
+        """Padded cross-attention keys/values of all rows per layer; None if a row has none."""
+        if any(cache.cross_key_cache[0] is None for cache in caches):
+            return None
+        stacked = []
+        for layer_idx in range(caches[0].num_layers):
+            rows = [cache.get_cross_attention(layer_idx) for cache in caches]
+            stacked.append(
+                (cls._pad_cat([row[0] for row in rows]), cls._pad_cat([row[1] for row in rows]))
+            )
+        return stacked
+
+    def get_seq_length(self) -> int:
+        """Longest cached length across the rows."""
+        return self.seq_length
+
+    def position_ids(self) -> torch.Tensor:
+        """Position of each row's next token, shaped ``(batch, 1)``."""
+        device = self.caches[0].key_cache[0].device
+        positions = torch.tensor([cache.get_seq_length() for cache in self.caches])
+        return positions.to(device, non_blocking=True).unsqueeze(1)
+
+    def attention_mask(self) -> torch.Tensor:
+        """Key-padding mask ``(batch, kv_len)`` over the padded self-attention keys."""
+        return self._padding_mask(self._read_lengths)
+
+    def encoder_attention_mask(self) -> torch.Tensor:
+        """Key-padding mask ``(batch, enc_len)`` over the padded cross-attention keys."""
+        return self._padding_mask(self._cross_lengths)
+
+    def _padding_mask(self, lengths: List[int]) -> torch.Tensor:
+        device = self.caches[0].key_cache[0].device
+        columns = torch.arange(max(lengths), device=device)
+        lengths = torch.tensor(lengths).to(device, non_blocking=True)
+        return (columns < lengths[:, None]).long()
+
+    @staticmethod
+    def _pad_cat(states: List[torch.Tensor]) -> torch.Tensor:
+        """Concatenate ``(1, heads, len, head_dim)`` rows, zero-padding the lengths."""
+        length = max(state.shape[2] for state in states)
+        return torch.cat(
+            [
+                (
+                    state
+                    if state.shape[2] == length
+                    else torch.nn.functional.pad(state, (0, 0, 0, length - state.shape[2]))
+                )
+                for state in states
+            ]
+        )
+
+    def update(
+        self,
+        layer_idx: int,
+        key_states: torch.Tensor,
+        value_states: torch.Tensor,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Write each row into its own cache and return the padded keys/values."""
+        if key_states.shape[2] != 1:
+            raise ValueError("StackedKVCache decodes one token per row")
+
+        keys, values = [], []
+        for row, cache in enumerate(self.caches):
+            row_keys, row_values = cache.update(
+                layer_idx, key_states[row : row + 1], value_states[row : row + 1]
+            )
+            keys.append(row_keys)
+            values.append(row_values)
+        return self._pad_cat(keys), self._pad_cat(values)
+
+    def advance(self, num_tokens: int):
+        """Advance every row cache past the token just written."""
+        for cache in self.caches:
+            cache.advance(num_tokens)
+        self.seq_length += num_tokens
+
+    def get_cross_attention(self, layer_idx: int) -> Optional[Tuple[torch.Tensor, torch.Tensor]]:
+        """Padded cross-attention keys/values of all rows."""
+        if self.cross_attention is None:
+            return None
+        return self.cross_attention[layer_idx]
+
+    def set_cross_attention(
+        self, layer_idx: int, key_states: torch.Tensor, value_states: torch.Tensor
+    ):
+        raise ValueError("StackedKVCache rows must already hold their cross-attention entries")
@@ -31,6 +31,9 @@ class TransformerConfig:
     # Audio tokenization
     audio_vocab_size: int = 2048
     num_quantizers: int = 8
+    # "flatten": one token per step, codebooks laid out one after another;
+    # "delay": one frame of num_quantizers codebooks per step, codebook k delayed by k steps
+    codebook_pattern: str = "flatten"
 
     # Positional encoding
     max_position_embeddings: int = 8192
@@ -68,6 +71,11 @@ class TransformerConfig:
         if self.intermediate_size is None:
             self.intermediate_size = 4 * self.hidden_size
 
+        if self.codebook_pattern not in ("flatten", "delay"):
+            raise ValueError(
+                f"codebook_pattern must be 'flatten' or 'delay', got {self.codebook_pattern!r}"
+            )
+
 
 @dataclass
 class EnCodecConfig:
@@ -107,6 +115,10 @@ class T5Config:
     freeze_encoder: bool = True
     dropout: float = 0.1
 
+    # Prompts are encoded in groups padded to the smallest of these token
+    # lengths that fits them (empty: one call padded to the longest prompt)
+    length_buckets: List[int] = field(default_factory=lambda: [16, 32, 64, 128, 256])
+
     # Caching
     use_cache: bool = True
     cache_dir: Optional[str] = None
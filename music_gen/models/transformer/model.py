@@ -2,13 +2,14 @@
 Core transformer model for MusicGen with cross-attention to text.
 """
 
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Dict, Optional, Tuple, Union
 
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 from torch.utils.checkpoint import checkpoint
 
+from .cache import StaticKVCache
 from .config import TransformerConfig
 
 
@@ -25,14 +26,48 @@ class RotaryPositionalEncoding(nn.Module):
         inv_freq = 1.0 / (base ** (torch.arange(0, dim, 2).float() / dim))
         self.register_buffer("inv_freq", inv_freq)
 
-    def forward(self, x: torch.Tensor, seq_len: int) -> Tuple[torch.Tensor, torch.Tensor]:
-        """Apply rotary positional encoding."""
-        t = torch.arange(seq_len, device=x.device).type_as(self.inv_freq)
+        # cos/sin tables indexed by position; grown on demand so that layers do
+        # not each hold max_seq_len rows they never use
+        self.register_buffer("cos_cached", torch.empty(0, dim), persistent=False)
+        self.register_buffer("sin_cached", torch.empty(0, dim), persistent=False)
+
+    def _extend_tables(self, seq_len: int):
+        """Grow the cos/sin tables to cover at least ``seq_len`` positions."""
+        length = max(seq_len, min(2 * self.cos_cached.shape[0], self.max_seq_len), 256)
+        t = torch.arange(length, device=self.inv_freq.device).type_as(self.inv_freq)
         freqs = torch.outer(t, self.inv_freq)
         emb = torch.cat((freqs, freqs), dim=-1)
-        cos = emb.cos()
-        sin = emb.sin()
-        return cos, sin
+        self.cos_cached = emb.cos()
+        self.sin_cached = emb.sin()
+
+    def forward(
+        self,
+        x: torch.Tensor,
+        seq_len: int,
+        offset: int = 0,
+        position_ids: Optional[torch.Tensor] = None,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Get cos/sin for positions ``offset .. seq_len - 1``, or for ``position_ids``.
+
+        ``seq_len`` bounds the positions looked up, so the tables are only
+        rebuilt when a sequence outgrows them. ``position_ids`` of shape
+        ``(batch, length)`` gives per-row tables of shape ``(batch, 1, length, dim)``
+        that broadcast over attention heads.
+        """
+        if seq_len > self.cos_cached.shape[0] or self.cos_cached.device != x.device:
+            self._extend_tables(seq_len)
+
+        if position_ids is None:
+            cos = self.cos_cached[offset:seq_len]
+            sin = self.sin_cached[offset:seq_len]
+        else:
+            cos = self.cos_cached[position_ids]
+            sin = self.sin_cached[position_ids]
+            if position_ids.dim() == 2:
+                cos = cos.unsqueeze(1)
+                sin = sin.unsqueeze(1)
+        return cos.to(x.dtype), sin.to(x.dtype)
 
 
 def rotate_half(x: torch.Tensor) -> torch.Tensor:
@@ -51,13 +86,31 @@ def apply_rotary_pos_emb(
     return q_embed, k_embed
 
 
+def _past_length(
+    past_key_values: Optional[
+        Union[StaticKVCache, Tuple[torch.Tensor, ...], Tuple[Tuple[torch.Tensor, ...], ...]]
+    ],
+) -> int:
+    """Number of positions already held by a KV cache (a whole cache or one layer's entry)."""
+    if past_key_values is None:
+        return 0
+    if isinstance(past_key_values, StaticKVCache):
+        return past_key_values.get_seq_length()
+    if isinstance(past_key_values[0], torch.Tensor):
+        return past_key_values[0].shape[2]
+    return past_key_values[0][0].shape[2]
+
+
 class MultiHeadAttention(nn.Module):
     """Multi-head attention with optional cross-attention and RoPE."""
 
-    def __init__(self, config: TransformerConfig, is_cross_attention: bool = False):
+    def __init__(
+        self, config: TransformerConfig, is_cross_attention: bool = False, layer_idx: int = 0
+    ):
         super().__init__()
         self.config = config
         self.is_cross_attention = is_cross_attention
+        self.layer_idx = layer_idx
         self.hidden_size = config.hidden_size
         self.num_heads = config.num_heads
         self.head_dim = self.hidden_size // self.num_heads
@@ -97,10 +150,21 @@ class MultiHeadAttention(nn.Module):
         hidden_states: torch.Tensor,
         key_value_states: Optional[torch.Tensor] = None,
         attention_mask: Optional[torch.Tensor] = None,
-        past_key_value: Optional[Tuple[torch.Tensor, torch.Tensor]] = None,
+        past_key_value: Optional[Union[Tuple[torch.Tensor, torch.Tensor], StaticKVCache]] = None,
         use_cache: bool = False,
-    ) -> Tuple[torch.Tensor, Optional[Tuple[torch.Tensor, torch.Tensor]]]:
-        """Forward pass of multi-head attention."""
+        position_ids: Optional[torch.Tensor] = None,
+        is_causal: bool = False,
+    ) -> Tuple[torch.Tensor, Optional[Union[Tuple[torch.Tensor, torch.Tensor], StaticKVCache]]]:
+        """
+        Forward pass of multi-head attention.
+
+        Rotary embeddings are applied to the new queries/keys before they are
+        cached, at positions offset by the cached length (or ``position_ids``),
+        so cached keys never need to be rotated again.
+
+        ``is_causal`` requests causal masking without a materialized mask and
+        is only valid when there is no ``attention_mask`` and no cached prefix.
+        """
         batch_size, seq_len, _ = hidden_states.shape
 
         # Query projection
@@ -110,35 +174,36 @@ class MultiHeadAttention(nn.Module):
 
         # Key and value projections
         if self.is_cross_attention:
-            # Cross-attention: use provided key_value_states
-            if key_value_states is None:
-                raise ValueError("key_value_states must be provided for cross-attention")
-
-            key_states = self.k_proj(key_value_states)
-            value_states = self.v_proj(key_value_states)
-            kv_seq_len = key_value_states.shape[1]
+            key_states, value_states = self._cross_attention_key_values(
+                key_value_states, past_key_value
+            )
+            kv_seq_len = key_states.shape[2]
         else:
             # Self-attention: use hidden_states
-            key_states = self.k_proj(hidden_states)
-            value_states = self.v_proj(hidden_states)
+            key_states = self._shape(self.k_proj(hidden_states), batch_size, seq_len)
+            value_states = self._shape(self.v_proj(hidden_states), batch_size, seq_len)
             kv_seq_len = seq_len
 
-        key_states = key_states.view(batch_size, kv_seq_len, self.num_heads, self.head_dim)
-        value_states = value_states.view(batch_size, kv_seq_len, self.num_heads, self.head_dim)
-        key_states = key_states.transpose(1, 2)
-        value_states = value_states.transpose(1, 2)
-
-        # Handle past key values for generation
-        if past_key_value is not None:
-            past_key, past_value = past_key_value
-            key_states = torch.cat([past_key, key_states], dim=2)
-            value_states = torch.cat([past_value, value_states], dim=2)
-            kv_seq_len = key_states.shape[2]
+            # Apply rotary positional encoding (self-attention only)
+            if self.rotary_emb is not None:
+                past_length = _past_length(past_key_value)
+                cos, sin = self.rotary_emb(
+                    query_states, past_length + seq_len, past_length, position_ids
+                )
+                query_states, key_states = apply_rotary_pos_emb(query_states, key_states, cos, sin)
 
-        # Apply rotary positional encoding (self-attention only)
-        if self.rotary_emb is not None:
-            cos, sin = self.rotary_emb(query_states, max(seq_len, kv_seq_len))
-            query_states, key_states = apply_rotary_pos_emb(query_states, key_states, cos, sin)
+            # Handle past key values for generation
+            if isinstance(past_key_value, StaticKVCache):
+                # Write into the preallocated buffers and attend over the valid prefix
+                key_states, value_states = past_key_value.update(
+                    self.layer_idx, key_states, value_states
+                )
+                kv_seq_len = key_states.shape[2]
+            elif past_key_value is not None:
+                past_key, past_value = past_key_value
+                key_states = torch.cat([past_key, key_states], dim=2)
+                value_states = torch.cat([past_value, value_states], dim=2)
+                kv_seq_len = key_states.shape[2]
 
         # Compute attention
         if self.config.use_scaled_dot_product_attention and hasattr(
@@ -151,6 +216,7 @@ class MultiHeadAttention(nn.Module):
                 value_states,
                 attn_mask=attention_mask,
                 dropout_p=self.config.attention_dropout if self.training else 0.0,
+                is_causal=is_causal,
                 scale=self.scale,
             )
         else:
@@ -159,6 +225,13 @@ class MultiHeadAttention(nn.Module):
 
             if attention_mask is not None:
                 attn_weights = attn_weights + attention_mask
+            elif is_causal:
+                causal = torch.ones(
+                    seq_len, kv_seq_len, dtype=torch.bool, device=attn_weights.device
+                ).tril()
+                attn_weights = attn_weights.masked_fill(
+                    ~causal, torch.finfo(attn_weights.dtype).min
+                )
 
             attn_weights = F.softmax(attn_weights, dim=-1)
             attn_weights = self.dropout(attn_weights)
@@ -173,10 +246,48 @@ class MultiHeadAttention(nn.Module):
         # Prepare key-value cache for next step
         present_key_value = None
         if use_cache:
-            present_key_value = (key_states, value_states)
+            if isinstance(past_key_value, StaticKVCache):
+                present_key_value = past_key_value
+            else:
+                present_key_value = (key_states, value_states)
 
         return attn_output, present_key_value
 
+    def _shape(self, tensor: torch.Tensor, batch_size: int, seq_len: int) -> torch.Tensor:
+        """Reshape projected states to (batch, heads, seq_len, head_dim)."""
+        return tensor.view(batch_size, seq_len, self.num_heads, self.head_dim).transpose(1, 2)
+
+    def _cross_attention_key_values(
+        self,
+        key_value_states: Optional[torch.Tensor],
+        past_key_value: Optional[Union[Tuple[torch.Tensor, torch.Tensor], StaticKVCache]],
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Get cross-attention keys/values, projecting the encoder states only once.
+
+        The text encoder output is fixed for a whole generation, so its
+        projections are reused from the cache whenever they are available.
+        """
+        if isinstance(past_key_value, StaticKVCache):
+            cached = past_key_value.get_cross_attention(self.layer_idx)
+            if cached is not None:
+                return cached
+        elif past_key_value is not None:
+            return past_key_value
+
+        # Cross-attention: use provided key_value_states
+        if key_value_states is None:
+            raise ValueError("key_value_states must be provided for cross-attention")
+
+        batch_size, kv_seq_len, _ = key_value_states.shape
+        key_states = self._shape(self.k_proj(key_value_states), batch_size, kv_seq_len)
+        value_states = self._shape(self.v_proj(key_value_states), batch_size, kv_seq_len)
+
+        if isinstance(past_key_value, StaticKVCache):
+            past_key_value.set_cross_attention(self.layer_idx, key_states, value_states)
+
+        return key_states, value_states
+
 
 class FeedForward(nn.Module):
     """Position-wise feed-forward network."""
@@ -208,13 +319,15 @@ class TransformerLayer(nn.Module):
         self.config = config
 
         # Self-attention
-        self.self_attn = MultiHeadAttention(config, is_cross_attention=False)
+        self.self_attn = MultiHeadAttention(config, is_cross_attention=False, layer_idx=layer_idx)
         self.self_attn_layer_norm = nn.LayerNorm(config.hidden_size, eps=config.layer_norm_eps)
 
         # Cross-attention (if this layer supports it)
         self.has_cross_attention = layer_idx in config.cross_attention_layers
         if self.has_cross_attention:
-            self.cross_attn = MultiHeadAttention(config, is_cross_attention=True)
+            self.cross_attn = MultiHeadAttention(
+                config, is_cross_attention=True, layer_idx=layer_idx
+            )
             self.cross_attn_layer_norm = nn.LayerNorm(config.hidden_size, eps=config.layer_norm_eps)
 
         # Feed-forward
@@ -227,10 +340,24 @@ class TransformerLayer(nn.Module):
         attention_mask: Optional[torch.Tensor] = None,
         encoder_hidden_states: Optional[torch.Tensor] = None,
         encoder_attention_mask: Optional[torch.Tensor] = None,
-        past_key_value: Optional[Tuple[torch.Tensor, torch.Tensor]] = None,
+        past_key_value: Optional[Union[Tuple[torch.Tensor, torch.Tensor], StaticKVCache]] = None,
         use_cache: bool = False,
-    ) -> Tuple[torch.Tensor, Optional[Tuple[torch.Tensor, torch.Tensor]]]:
-        """Forward pass of transformer layer."""
+        position_ids: Optional[torch.Tensor] = None,
+        is_causal: bool = False,
+    ) -> Tuple[torch.Tensor, Optional[Union[Tuple[torch.Tensor, torch.Tensor], StaticKVCache]]]:
+        """
+        Forward pass of transformer layer.
+
+        With a tuple cache, each layer entry is ``(self_key, self_value)`` or
+        ``(self_key, self_value, cross_key, cross_value)`` once cross-attention
+        keys/values have been computed.
+        """
+
+        if isinstance(past_key_value, StaticKVCache) or past_key_value is None:
+            self_attn_past = cross_attn_past = past_key_value
+        else:
+            self_attn_past = past_key_value[:2]
+            cross_attn_past = past_key_value[2:] if len(past_key_value) > 2 else None
 
         # Self-attention
         residual = hidden_states
@@ -238,23 +365,33 @@ class TransformerLayer(nn.Module):
         hidden_states, present_key_value = self.self_attn(
             hidden_states=hidden_states,
             attention_mask=attention_mask,
-            past_key_value=past_key_value,
+            past_key_value=self_attn_past,
             use_cache=use_cache,
+            position_ids=position_ids,
+            is_causal=is_causal,
         )
         hidden_states = residual + hidden_states
 
-        # Cross-attention
-        if self.has_cross_attention and encoder_hidden_states is not None:
+        # Cross-attention (cached keys/values stand in for the encoder states)
+        has_cross_cache = cross_attn_past is not None and (
+            not isinstance(cross_attn_past, StaticKVCache)
+            or cross_attn_past.get_cross_attention(self.layer_idx) is not None
+        )
+        if self.has_cross_attention and (encoder_hidden_states is not None or has_cross_cache):
             residual = hidden_states
             hidden_states = self.cross_attn_layer_norm(hidden_states)
-            hidden_states, _ = self.cross_attn(
+            hidden_states, cross_key_value = self.cross_attn(
                 hidden_states=hidden_states,
                 key_value_states=encoder_hidden_states,
                 attention_mask=encoder_attention_mask,
-                use_cache=False,  # Don't cache cross-attention
+                past_key_value=cross_attn_past,
+                use_cache=use_cache,
             )
             hidden_states = residual + hidden_states
 
+            if use_cache and not isinstance(present_key_value, StaticKVCache):
+                present_key_value = present_key_value + cross_key_value
+
         # Feed-forward
         residual = hidden_states
         hidden_states = self.final_layer_norm(hidden_states)
@@ -271,8 +408,20 @@ class MusicGenTransformer(nn.Module):
         super().__init__()
         self.config = config
 
-        # Embeddings
-        self.embed_tokens = nn.Embedding(config.vocab_size, config.hidden_size)
+        # Embeddings. With the delay pattern every codebook has its own table,
+        # with one extra entry for the special token filling delayed positions
+        self.num_codebooks = config.num_quantizers if config.codebook_pattern == "delay" else 1
+        if self.num_codebooks > 1:
+            self.special_token_id = config.vocab_size
+            self.embed_tokens = nn.ModuleList(
+                [
+                    nn.Embedding(config.vocab_size + 1, config.hidden_size)
+                    for _ in range(self.num_codebooks)
+                ]
+            )
+        else:
+            self.special_token_id = None
+            self.embed_tokens = nn.Embedding(config.vocab_size, config.hidden_size)
 
         # Positional encoding
         if config.use_learned_positional_encoding and not config.use_rotary_positional_encoding:
@@ -294,12 +443,24 @@ class MusicGenTransformer(nn.Module):
         # Final layer norm
         self.layer_norm = nn.LayerNorm(config.hidden_size, eps=config.layer_norm_eps)
 
-        # Output projection
-        self.lm_head = nn.Linear(config.hidden_size, config.vocab_size, bias=False)
+        # Output projection, one head per codebook with the delay pattern
+        if self.num_codebooks > 1:
+            self.lm_head = nn.ModuleList(
+                [
+                    nn.Linear(config.hidden_size, config.vocab_size, bias=False)
+                    for _ in range(self.num_codebooks)
+                ]
+            )
+        else:
+            self.lm_head = nn.Linear(config.hidden_size, config.vocab_size, bias=False)
 
         # Dropout
         self.dropout = nn.Dropout(config.hidden_dropout)
 
+        # Reduced-precision inference: layers run under autocast to this dtype
+        # while the residual stream and logits stay in full precision
+        self.autocast_dtype: Optional[torch.dtype] = None
+
         # Initialize weights
         self.apply(self._init_weights)
 
@@ -323,6 +484,66 @@ class MusicGenTransformer(nn.Module):
         """Set input embedding layer."""
         self.embed_tokens = value
 
+    def _autocast(self, device: torch.device) -> torch.autocast:
+        """Autocast context for reduced-precision inference (disabled by default)."""
+        return torch.autocast(
+            device_type=device.type,
+            dtype=self.autocast_dtype or torch.bfloat16,
+            enabled=self.autocast_dtype is not None,
+        )
+
+    @staticmethod
+    def _prepare_attention_mask(
+        attention_mask: Optional[torch.Tensor],
+        seq_len: int,
+        past_length: int,
+        dtype: torch.dtype,
+        device: torch.device,
+    ) -> Tuple[Optional[torch.Tensor], bool]:
+        """
+        Turn a decoder mask into an additive bias, or ``None`` plus an ``is_causal`` flag.
+
+        A 2D ``attention_mask`` is a key-padding mask of shape ``(batch, kv_len)``
+        (1 = attend) and becomes a ``(batch, 1, 1, kv_len)`` bias, combined with
+        causality only when several queries are processed at once. A 4D mask is
+        taken as already broadcastable to ``(batch, heads, seq_len, kv_len)``.
+        """
+        if attention_mask is not None and attention_mask.dim() == 4:
+            return (1.0 - attention_mask.to(dtype)) * -10000.0, False
+
+        if attention_mask is None and (seq_len == 1 or past_length == 0):
+            return None, seq_len > 1
+
+        kv_len = past_length + seq_len
+        keep = None
+        if seq_len > 1:
+            keep = torch.ones(seq_len, kv_len, dtype=torch.bool, device=device).tril(past_length)
+        if attention_mask is not None:
+            padding = attention_mask[:, None, None, -kv_len:].bool()
+            keep = padding if keep is None else keep & padding
+
+        bias = torch.zeros(keep.shape, dtype=dtype, device=device)
+        return bias.masked_fill_(~keep, -10000.0), False
+
+    @staticmethod
+    def _prepare_encoder_attention_mask(
+        encoder_attention_mask: Optional[torch.Tensor],
+        dtype: torch.dtype,
+    ) -> Optional[torch.Tensor]:
+        """
+        Turn an encoder key-padding mask into a compact cross-attention bias.
+
+        A 2D mask of shape ``(batch, enc_len)`` (1 = attend) becomes a
+        ``(batch, 1, 1, enc_len)`` additive bias that broadcasts over heads and
+        queries. A 4D mask is taken as a ready-made additive bias.
+        """
+        if encoder_attention_mask is None or encoder_attention_mask.dim() == 4:
+            return encoder_attention_mask
+
+        keep = encoder_attention_mask[:, None, None, :].bool()
+        bias = torch.zeros(keep.shape, dtype=dtype, device=keep.device)
+        return bias.masked_fill_(~keep, -10000.0)
+
     def forward(
         self,
         input_ids: torch.Tensor,
@@ -330,20 +551,51 @@ class MusicGenTransformer(nn.Module):
         encoder_hidden_states: Optional[torch.Tensor] = None,
         encoder_attention_mask: Optional[torch.Tensor] = None,
         conditioning_embeddings: Optional[torch.Tensor] = None,
-        past_key_values: Optional[Tuple[Tuple[torch.Tensor, torch.Tensor], ...]] = None,
+        past_key_values: Optional[
+            Union[Tuple[Tuple[torch.Tensor, torch.Tensor], ...], StaticKVCache]
+        ] = None,
         use_cache: bool = False,
         output_hidden_states: bool = False,
+        position_ids: Optional[torch.Tensor] = None,
     ) -> Dict[str, Any]:
-        """Forward pass of the transformer."""
-
-        batch_size, seq_len = input_ids.shape
+        """
+        Forward pass of the transformer.
+
+        ``past_key_values`` may be either the legacy tuple of per-layer
+        ``(key, value)`` tensors or a :class:`StaticKVCache`. A static cache is
+        updated in place and returned as-is under ``past_key_values``.
+
+        Positions continue from the length already held by the cache unless
+        ``position_ids`` of shape ``(batch, seq_len)`` is given, e.g. for batched
+        sequences that started at different cache columns.
+
+        ``encoder_attention_mask`` is the text encoder's ``(batch, enc_len)``
+        padding mask; padded encoder positions are excluded from cross-attention.
+
+        With ``codebook_pattern="delay"`` each step is a frame of codebooks:
+        ``input_ids`` is ``(batch, num_codebooks, seq_len)`` and the logits are
+        ``(batch, num_codebooks, seq_len, vocab_size)``.
+        """
+
+        # Token embeddings; delay-pattern inputs are (batch, num_codebooks, seq_len)
+        # and the codebook embeddings of a frame are summed
+        if self.num_codebooks > 1:
+            batch_size, _, seq_len = input_ids.shape
+            inputs_embeds = sum(
+                embed(input_ids[:, codebook]) for codebook, embed in enumerate(self.embed_tokens)
+            )
+        else:
+            batch_size, seq_len = input_ids.shape
+            inputs_embeds = self.embed_tokens(input_ids)
 
-        # Token embeddings
-        inputs_embeds = self.embed_tokens(input_ids)
+        past_length = _past_length(past_key_values)
+        if position_ids is None:
+            position_ids = torch.arange(
+                past_length, past_length + seq_len, device=input_ids.device
+            ).unsqueeze(0)
 
         # Positional embeddings
         if self.embed_positions is not None:
-            position_ids = torch.arange(seq_len, device=input_ids.device).unsqueeze(0)
             position_embeddings = self.embed_positions(position_ids)
             inputs_embeds = inputs_embeds + position_embeddings
 
@@ -355,14 +607,15 @@ class MusicGenTransformer(nn.Module):
 
         hidden_states = self.dropout(inputs_embeds)
 
-        # Create causal attention mask if not provided
-        if attention_mask is None:
-            attention_mask = torch.tril(torch.ones(seq_len, seq_len, device=input_ids.device))
-
-        # Convert attention mask to bias format
-        if attention_mask.dim() == 2:
-            attention_mask = attention_mask.unsqueeze(0).unsqueeze(0)
-        attention_mask = (1.0 - attention_mask) * -10000.0
+        # Prefill uses SDPA's causal kernel and single-token decoding needs no
+        # mask; a bias is only built for padded batches or multi-token steps
+        # on top of a cache
+        attention_mask, is_causal = self._prepare_attention_mask(
+            attention_mask, seq_len, past_length, hidden_states.dtype, input_ids.device
+        )
+        encoder_attention_mask = self._prepare_encoder_attention_mask(
+            encoder_attention_mask, hidden_states.dtype
+        )
 
         # Process through transformer layers
         all_hidden_states = []
@@ -372,8 +625,11 @@ class MusicGenTransformer(nn.Module):
             if output_hidden_states:
                 all_hidden_states.append(hidden_states)
 
-            # Get past key value for this layer
-            past_key_value = past_key_values[i] if past_key_values is not None else None
+            # Get past key value for this layer (a static cache is shared by all layers)
+            if isinstance(past_key_values, StaticKVCache):
+                past_key_value = past_key_values
+            else:
+                past_key_value = past_key_values[i] if past_key_values is not None else None
 
             if self.config.gradient_checkpointing and self.training:
                 hidden_states, present_key_value = checkpoint(
@@ -384,20 +640,28 @@ class MusicGenTransformer(nn.Module):
                     encoder_attention_mask,
                     past_key_value,
                     use_cache,
+                    position_ids,
+                    is_causal,
                 )
             else:
-                hidden_states, present_key_value = layer(
-                    hidden_states=hidden_states,
-                    attention_mask=attention_mask,
-                    encoder_hidden_states=encoder_hidden_states,
-                    encoder_attention_mask=encoder_attention_mask,
-                    past_key_value=past_key_value,
-                    use_cache=use_cache,
-                )
+                with self._autocast(hidden_states.device):
+                    hidden_states, present_key_value = layer(
+                        hidden_states=hidden_states,
+                        attention_mask=attention_mask,
+                        encoder_hidden_states=encoder_hidden_states,
+                        encoder_attention_mask=encoder_attention_mask,
+                        past_key_value=past_key_value,
+                        use_cache=use_cache,
+                        position_ids=position_ids,
+                        is_causal=is_causal,
+                    )
 
             if use_cache:
                 present_key_values.append(present_key_value)
 
+        if isinstance(past_key_values, StaticKVCache):
+            past_key_values.advance(seq_len)
+
         # Final layer norm
         hidden_states = self.layer_norm(hidden_states)
 
@@ -405,7 +669,12 @@ class MusicGenTransformer(nn.Module):
             all_hidden_states.append(hidden_states)
 
         # Language modeling head
-        logits = self.lm_head(hidden_states)
+        with self._autocast(hidden_states.device):
+            if self.num_codebooks > 1:
+                logits = torch.stack([head(hidden_states) for head in self.lm_head], dim=1)
+            else:
+                logits = self.lm_head(hidden_states)
+        logits = logits.float() if self.autocast_dtype is not None else logits
 
         # Prepare output
         output = {
@@ -417,6 +686,9 @@ class MusicGenTransformer(nn.Module):
             output["all_hidden_states"] = all_hidden_states
 
         if use_cache:
-            output["past_key_values"] = tuple(present_key_values)
+            if isinstance(past_key_values, StaticKVCache):
+                output["past_key_values"] = past_key_values
+            else:
+                output["past_key_values"] = tuple(present_key_values)
 
         return output
@@ -5,13 +5,18 @@ Optimized MusicGen generator with caching, batching, and performance improvement
 import logging
 import threading
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 import torch
+from transformers import StoppingCriteria, StoppingCriteriaList
 
+from ..generation.progress import CancellationToken, ProgressCallback, ProgressMonitor
+from ..generation.scheduler import ContinuousBatchingScheduler, DecodeRequest
+from ..models.musicgen import MusicGenModel
+from ..utils.exceptions import GenerationCancelled
 from .model_cache import get_cache_stats, get_cached_model
 
 logger = logging.getLogger(__name__)
@@ -28,6 +33,20 @@ class GenerationRequest:
     top_k: int = 250
     top_p: float = 0.0
     request_id: str = None
+    seed: Optional[int] = None
+
+
+class _ProgressStoppingCriteria(StoppingCriteria):
+    """Runs a :class:`ProgressMonitor` after every step of a transformers ``generate`` call."""
+
+    def __init__(self, monitor: ProgressMonitor, prompt_length: int):
+        self.monitor = monitor
+        self.prompt_length = prompt_length
+
+    def __call__(self, input_ids: torch.Tensor, scores: torch.Tensor, **kwargs) -> torch.Tensor:
+        # Raising GenerationCancelled aborts generate() at this step
+        self.monitor.step(input_ids.shape[-1] - self.prompt_length)
+        return torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
 
 
 @dataclass
@@ -53,6 +72,8 @@ class FastMusicGenerator:
         device: str = None,
         max_concurrent: int = 3,
         warmup: bool = True,
+        max_batch_size: int = 8,
+        max_duration: float = 60.0,
     ):
         """
         Initialize the fast generator.
@@ -62,10 +83,22 @@ class FastMusicGenerator:
             device: Device to run on (auto-detect if None)
             max_concurrent: Maximum concurrent generations
             warmup: Whether to warmup the model cache
+            max_batch_size: Maximum sequences decoded together by the
+                continuous batching scheduler (native MusicGen checkpoints only,
+                see :func:`~music_gen.optimization.model_cache.is_native_checkpoint`)
+            max_duration: Longest clip a native model is asked for, in seconds;
+                sizes the scheduler's preallocated KV cache
         """
         self.model_name = model_name
         self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
         self.max_concurrent = max_concurrent
+        self.max_batch_size = max_batch_size
+        self.max_duration = max_duration
+
+        # Shared decode batches for native models, keyed by whether they run
+        # classifier-free guidance; each is created on first use
+        self._schedulers: Dict[bool, ContinuousBatchingScheduler] = {}
+        self._scheduler_lock = threading.Lock()
 
         # Thread safety
         self._generation_lock = threading.Semaphore(max_concurrent)
@@ -111,6 +144,9 @@ class FastMusicGenerator:
         guidance_scale: float = 3.0,
         top_k: int = 250,
         top_p: float = 0.0,
+        progress_callback: Optional[ProgressCallback] = None,
+        cancellation_token: Optional[CancellationToken] = None,
+        seed: Optional[int] = None,
     ) -> GenerationResult:
         """
         Generate a single audio clip with optimizations.
@@ -122,13 +158,32 @@ class FastMusicGenerator:
             guidance_scale: Classifier-free guidance scale
             top_k: Top-k sampling
             top_p: Top-p sampling
+            progress_callback: Called after every decode step with a
+                :class:`GenerationProgress`; for native models it runs on the
+                scheduler's decode thread
+            cancellation_token: Checked between decode steps
+            seed: Random seed; for native models it seeds this request's own
+                sampling generator, so concurrent requests do not affect it
 
         Returns:
             GenerationResult with audio and metadata
+
+        Raises:
+            GenerationCancelled: If ``cancellation_token`` was cancelled
         """
         with self._generation_lock:
+            if cancellation_token is not None:
+                cancellation_token.raise_if_cancelled()
             return self._generate_single_thread_safe(
-                prompt, duration, temperature, guidance_scale, top_k, top_p
+                prompt,
+                duration,
+                temperature,
+                guidance_scale,
+                top_k,
+                top_p,
+                progress_callback=progress_callback,
+                cancellation_token=cancellation_token,
+                seed=seed,
             )
 
     def _generate_single_thread_safe(
@@ -139,6 +194,9 @@ class FastMusicGenerator:
         guidance_scale: float,
         top_k: int,
         top_p: float,
+        progress_callback: Optional[ProgressCallback] = None,
+        cancellation_token: Optional[CancellationToken] = None,
+        seed: Optional[int] = None,
     ) -> GenerationResult:
         """Thread-safe single generation."""
         start_time = time.time()
@@ -159,7 +217,16 @@ class FastMusicGenerator:
 
         # Generate audio
         audio_np, sample_rate = self._generate_single_optimized(
-            model, prompt, duration, temperature, guidance_scale, top_k, top_p
+            model,
+            prompt,
+            duration,
+            temperature,
+            guidance_scale,
+            top_k,
+            top_p,
+            progress_callback=progress_callback,
+            cancellation_token=cancellation_token,
+            seed=seed,
         )
 
         generation_time = time.time() - start_time
@@ -199,8 +266,45 @@ class FastMusicGenerator:
         guidance_scale: float = 3.0,
         top_k: int = 250,
         top_p: float = 0.0,
+        progress_callback: Optional[ProgressCallback] = None,
+        cancellation_token: Optional[CancellationToken] = None,
+        seed: Optional[int] = None,
     ) -> Tuple[np.ndarray, int]:
         """Optimized single generation with memory management."""
+        # The scheduler samples seeded requests from their own generator instead
+        if seed is not None and not (
+            isinstance(model, MusicGenModel) and model.transformer.num_codebooks == 1
+        ):
+            torch.manual_seed(seed)
+
+        if isinstance(model, MusicGenModel) and model.transformer.num_codebooks > 1:
+            audio = self._generate_delayed(
+                model,
+                prompt,
+                duration,
+                temperature,
+                guidance_scale,
+                top_k,
+                top_p,
+                progress_callback=progress_callback,
+                cancellation_token=cancellation_token,
+            )
+            return audio, model.audio_tokenizer.sample_rate
+
+        # Native models join the shared decode batch alongside concurrent requests
+        if isinstance(model, MusicGenModel):
+            request = self._to_decode_request(
+                model, prompt, duration, temperature, guidance_scale, top_k, top_p, seed=seed
+            )
+            request.progress_callback = progress_callback
+            request.cancellation_token = cancellation_token
+            future = self._get_scheduler(model, request.guidance_scale is not None).submit(request)
+            try:
+                tokens = future.result()
+            except CancelledError:
+                # Cancelled while still waiting for a free slot
+                raise GenerationCancelled("Generation was cancelled") from None
+            return self._decode_tokens(model, tokens), model.audio_tokenizer.sample_rate
 
         # Clear GPU memory before generation
         if self.device == "cuda":
@@ -214,6 +318,12 @@ class FastMusicGenerator:
         # Calculate tokens needed
         max_new_tokens = int(duration * 50)  # 50Hz frame rate
 
+        stopping_criteria = None
+        monitor = ProgressMonitor.create(max_new_tokens, progress_callback, cancellation_token)
+        if monitor is not None:
+            # The decoder starts from a single start token
+            stopping_criteria = StoppingCriteriaList([_ProgressStoppingCriteria(monitor, 1)])
+
         # Optimized generation with memory management
         with torch.no_grad():
             # Use torch.compile if available (PyTorch 2.0+)
@@ -237,6 +347,7 @@ class FastMusicGenerator:
                 top_p=top_p if top_p > 0 else None,
                 pad_token_id=model.model.config.pad_token_id,
                 use_cache=True,  # Enable KV caching
+                stopping_criteria=stopping_criteria,
             )
 
         # Efficient post-processing
@@ -265,6 +376,13 @@ class FastMusicGenerator:
         logger.info(f"Generating batch of {len(requests)} requests")
         start_time = time.time()
 
+        # Native models decode every request in one running batch
+        model = get_cached_model(self.model_name, self.device)
+        if isinstance(model, MusicGenModel) and model.transformer.num_codebooks == 1:
+            results = self._generate_batch_continuous(model, requests)
+            logger.info(f"Batch generation complete in {time.time() - start_time:.2f}s")
+            return results
+
         results = []
 
         # Use ThreadPoolExecutor for concurrent generation
@@ -280,6 +398,7 @@ class FastMusicGenerator:
                     req.guidance_scale,
                     req.top_k,
                     req.top_p,
+                    seed=req.seed,
                 )
                 future_to_request[future] = req
 
@@ -314,6 +433,172 @@ class FastMusicGenerator:
 
         return results
 
+    def _get_scheduler(
+        self, model: MusicGenModel, guided: bool = False
+    ) -> ContinuousBatchingScheduler:
+        """Get the running decode scheduler for a native model, starting it if needed."""
+        with self._scheduler_lock:
+            scheduler = self._schedulers.get(guided)
+            if scheduler is None or scheduler.model is not model:
+                if scheduler is not None:
+                    scheduler.stop()
+                # Size the cache for the longest request, not the model's context
+                max_length = min(
+                    model.audio_tokenizer.get_sequence_length(self.max_duration) + 1,
+                    model.config.transformer.max_sequence_length,
+                )
+                scheduler = ContinuousBatchingScheduler(
+                    model, max_batch_size=self.max_batch_size, max_length=max_length, guided=guided
+                )
+                scheduler.start()
+                self._schedulers[guided] = scheduler
+            return scheduler
+
+    @staticmethod
+    def _to_decode_request(
+        model: MusicGenModel,
+        prompt: str,
+        duration: float,
+        temperature: float,
+        guidance_scale: float,
+        top_k: int,
+        top_p: float,
+        request_id: str = None,
+        seed: Optional[int] = None,
+    ) -> DecodeRequest:
+        """Translate generation parameters into a scheduler request."""
+        generator = None
+        if seed is not None:
+            generator = torch.Generator(next(model.parameters()).device).manual_seed(seed)
+        return DecodeRequest(
+            prompt=prompt,
+            max_length=model.audio_tokenizer.get_sequence_length(duration) + 1,  # BOS
+            temperature=temperature,
+            top_k=top_k,
+            top_p=top_p if top_p > 0 else 1.0,  # 0 disables nucleus filtering here
+            # A scale of 1 is the conditional model alone
+            guidance_scale=guidance_scale if guidance_scale > 1 else None,
+            request_id=request_id,
+            generator=generator,
+        )
+
+    @staticmethod
+    def _decode_tokens(model: MusicGenModel, tokens: torch.Tensor) -> np.ndarray:
+        """Decode a ``(1, seq_len)`` scheduler result to a mono waveform.
+
+        The sequence starts with BOS and may stop early on EOS, so the codes
+        between them are trimmed to whole frames before decoding.
+        """
+        codes = tokens[0, 1:]
+        eos = (codes == model.eos_token_id).nonzero()
+        if len(eos) > 0:
+            codes = codes[: int(eos[0])]
+        num_quantizers = model.audio_tokenizer.num_quantizers
+        codes = codes[: len(codes) - len(codes) % num_quantizers]
+        if len(codes) == 0:
+            return np.zeros(0, dtype=np.float32)
+        return model.decode_audio(codes.unsqueeze(0))[0, 0].cpu().numpy()
+
+    @staticmethod
+    def _generate_delayed(
+        model: MusicGenModel,
+        prompt: str,
+        duration: float,
+        temperature: float,
+        guidance_scale: float,
+        top_k: int,
+        top_p: float,
+        progress_callback: Optional[ProgressCallback] = None,
+        cancellation_token: Optional[CancellationToken] = None,
+    ) -> np.ndarray:
+        """Generate with a delay-pattern model, which the scheduler cannot batch."""
+        num_frames = model.audio_tokenizer.get_sequence_length(duration) // (
+            model.audio_tokenizer.num_quantizers
+        )
+        codes = model.generate(
+            [prompt],
+            max_length=num_frames + model.transformer.num_codebooks,
+            temperature=temperature,
+            top_k=top_k,
+            top_p=top_p if top_p > 0 else 1.0,  # 0 disables nucleus filtering here
+            guidance_scale=guidance_scale if guidance_scale > 1 else None,
+            progress_callback=progress_callback,
+            cancellation_token=cancellation_token,
+        )
+        return model.decode_audio(codes)[0, 0].cpu().numpy()
+
+    def _generate_batch_continuous(
+        self, model: MusicGenModel, requests: List[GenerationRequest]
+    ) -> List[GenerationResult]:
+        """Decode requests through the shared continuous batching schedulers."""
+        sample_rate = model.audio_tokenizer.sample_rate
+
+        submitted = []
+        for req in requests:
+            submit_time = time.time()
+            try:
+                request = self._to_decode_request(
+                    model,
+                    req.prompt,
+                    req.duration,
+                    req.temperature,
+                    req.guidance_scale,
+                    req.top_k,
+                    req.top_p,
+                    request_id=req.request_id,
+                    seed=req.seed,
+                )
+                scheduler = self._get_scheduler(model, request.guidance_scale is not None)
+                future = scheduler.submit(request)
+            except Exception as e:
+                future = Future()
+                future.set_exception(e)
+            submitted.append((req, future, submit_time))
+
+        results = []
+        for req, future, submit_time in submitted:
+            try:
+                audio = self._decode_tokens(model, future.result())
+                generation_time = time.time() - submit_time
+
+                self._stats["total_generations"] += 1
+                self._stats["total_generation_time"] += generation_time
+
+                results.append(
+                    GenerationResult(
+                        audio=audio,
+                        sample_rate=sample_rate,
+                        duration=len(audio) / sample_rate,
+                        generation_time=generation_time,
+                        request_id=req.request_id,
+                        metadata={
+                            "prompt": req.prompt,
+                            "model": self.model_name,
+                            "device": self.device,
+                            "parameters": {
+                                "temperature": req.temperature,
+                                "guidance_scale": req.guidance_scale,
+                                "top_k": req.top_k,
+                                "top_p": req.top_p,
+                            },
+                        },
+                    )
+                )
+            except Exception as e:
+                logger.error(f"Generation failed for request {req.request_id}: {e}")
+                results.append(
+                    GenerationResult(
+                        audio=np.zeros(int(req.duration * sample_rate)),
+                        sample_rate=sample_rate,
+                        duration=req.duration,
+                        generation_time=0,
+                        request_id=req.request_id,
+                        metadata={"error": str(e)},
+                    )
+                )
+
+        return results
+
     def get_performance_stats(self) -> Dict:
         """Get performance statistics."""
         avg_generation_time = (
@@ -339,6 +624,11 @@ class FastMusicGenerator:
         """Clear the model cache."""
         from .model_cache import clear_cache
 
+        with self._scheduler_lock:
+            for scheduler in self._schedulers.values():
+                scheduler.stop()
+            self._schedulers.clear()
+
         clear_cache()
         logger.info("Model cache cleared")
 
@@ -2,7 +2,9 @@
 Model caching system for MusicGen to avoid reloading models.
 """
 
+import json
 import logging
+import os
 import threading
 import time
 from typing import Dict
@@ -12,6 +14,21 @@ import torch
 logger = logging.getLogger(__name__)
 
 
+def is_native_checkpoint(model_name: str) -> bool:
+    """Whether ``model_name`` is a directory saved by ``MusicGenModel.save_pretrained``."""
+    config_path = os.path.join(model_name, "config.json")
+    weights_path = os.path.join(model_name, "pytorch_model.bin")
+    if not (os.path.isfile(config_path) and os.path.isfile(weights_path)):
+        return False
+    try:
+        with open(config_path, "r") as f:
+            config = json.load(f)
+    except (OSError, ValueError):
+        return False
+    # Hugging Face MusicGen configs describe a "decoder" instead
+    return isinstance(config, dict) and "transformer" in config
+
+
 class ModelCache:
     """
     Singleton model cache to store loaded MusicGen models and avoid reloading.
@@ -63,10 +80,16 @@ class ModelCache:
         logger.info(f"Loading model: {cache_key}")
         start_time = time.time()
 
-        # Import here to avoid circular imports
-        from ..inference.real_multi_instrument import RealMultiInstrumentGenerator
+        if is_native_checkpoint(model_name):
+            # Native models decode through the continuous batching scheduler
+            from ..models.musicgen import MusicGenModel
+
+            model = MusicGenModel.from_pretrained(model_name, **kwargs).to(device).eval()
+        else:
+            # Import here to avoid circular imports
+            from ..inference.real_multi_instrument import RealMultiInstrumentGenerator
 
-        model = RealMultiInstrumentGenerator(model_name=model_name, device=device, **kwargs)
+            model = RealMultiInstrumentGenerator(model_name=model_name, device=device, **kwargs)
 
         load_time = time.time() - start_time
 
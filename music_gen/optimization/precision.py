@@ -0,0 +1,102 @@
+"""
+Accuracy checks for reduced-precision (bf16 / int8) inference.
+"""
+
+import copy
+import logging
+from typing import Dict, List, Optional
+
+import torch
+import torch.nn.functional as F
+
+from ..models.musicgen import MusicGenModel
+
+logger = logging.getLogger(__name__)
+
+# Fixed prompt set used to compare precisions
+DEFAULT_ACCURACY_PROMPTS = [
+    "upbeat electronic dance music with heavy bass",
+    "calm acoustic guitar melody",
+    "jazz piano trio, slow tempo",
+    "orchestral film score with strings and brass",
+    "lo-fi hip hop beat",
+    "rock song with distorted guitars and drums",
+]
+
+
+@torch.no_grad()
+def compare_token_distributions(
+    reference: MusicGenModel,
+    candidate: MusicGenModel,
+    prompts: Optional[List[str]] = None,
+    num_tokens: int = 64,
+) -> Dict[str, float]:
+    """
+    Compare next-token distributions of two models on a fixed prompt set.
+
+    The reference model greedily decodes ``num_tokens`` tokens per prompt;
+    both models then score the same sequences (teacher forcing), so the
+    metrics isolate numeric differences from sampling drift.
+
+    Args:
+        reference: Full-precision model
+        candidate: Model under test, e.g. a copy with a reduced precision
+        prompts: Text prompts (defaults to ``DEFAULT_ACCURACY_PROMPTS``)
+        num_tokens: Number of decoded positions compared per prompt
+
+    Returns:
+        Dictionary with the mean KL divergence ``KL(reference || candidate)``,
+        the mean total variation distance and the top-1 token agreement
+    """
+    prompts = prompts or DEFAULT_ACCURACY_PROMPTS
+    device = next(reference.parameters()).device
+
+    sequences = reference.generate(prompts, max_length=num_tokens + 1, do_sample=False)
+
+    log_probs = []
+    for model in (reference, candidate):
+        encoder_outputs = model.prepare_inputs(texts=prompts, device=device)
+        outputs = model.transformer(
+            input_ids=sequences[:, :-1],
+            encoder_hidden_states=encoder_outputs["text_hidden_states"],
+            encoder_attention_mask=encoder_outputs["text_attention_mask"],
+            conditioning_embeddings=encoder_outputs["conditioning_embeddings"],
+        )
+        log_probs.append(F.log_softmax(outputs["logits"].float(), dim=-1))
+
+    reference_log_probs, candidate_log_probs = log_probs
+    kl_divergence = F.kl_div(
+        candidate_log_probs, reference_log_probs, log_target=True, reduction="none"
+    ).sum(-1)
+    total_variation = 0.5 * (reference_log_probs.exp() - candidate_log_probs.exp()).abs().sum(-1)
+    top1_agreement = (reference_log_probs.argmax(-1) == candidate_log_probs.argmax(-1)).float()
+
+    return {
+        "kl_divergence": kl_divergence.mean().item(),
+        "total_variation": total_variation.mean().item(),
+        "top1_agreement": top1_agreement.mean().item(),
+    }
+
+
+def check_inference_precision(
+    model: MusicGenModel,
+    precision: str,
+    prompts: Optional[List[str]] = None,
+    num_tokens: int = 64,
+) -> Dict[str, float]:
+    """
+    Measure how far ``precision`` moves a full-precision model's token distributions.
+
+    The model is left untouched; a copy is converted to ``precision`` and
+    compared against it with :func:`compare_token_distributions`.
+    """
+    if model.inference_precision != "fp32":
+        raise ValueError("The reference model must run in fp32")
+
+    candidate = copy.deepcopy(model).set_inference_precision(precision)
+    metrics = compare_token_distributions(model, candidate, prompts, num_tokens)
+    logger.info(
+        f"{precision} vs fp32: KL={metrics['kl_divergence']:.4g}, "
+        f"TV={metrics['total_variation']:.4g}, top-1 agreement={metrics['top1_agreement']:.2%}"
+    )
+    return metrics
@@ -3,12 +3,14 @@ Real-time streaming generation for MusicGen.
 """
 
 from .audio_streamer import AudioChunk, AudioStreamer, CrossfadeProcessor, StreamingBuffer
+from .engine import StreamingEngine
 from .generator import StreamingConfig, StreamingGenerator
 from .session import SessionManager, StreamingSession
 
 __all__ = [
     "StreamingGenerator",
     "StreamingConfig",
+    "StreamingEngine",
     "StreamingSession",
     "SessionManager",
     "AudioStreamer",
@@ -498,9 +498,11 @@ class AdaptiveStreamer(AudioStreamer):
             new_min_buffer = min(self.buffer.min_buffer_size + 1, self.buffer.buffer_size)
             self.adjust_buffer_size(self.buffer.buffer_size, new_min_buffer)
 
-            # Reduce crossfade duration for lower latency
-            new_crossfade = max(0.05, self.crossfade_processor.fade_duration * 0.9)
-            self.set_crossfade_duration(new_crossfade)
+            # Reduce crossfade duration for lower latency (a disabled crossfade stays off)
+            new_crossfade = self.crossfade_processor.fade_duration
+            if new_crossfade > 0:
+                new_crossfade = max(0.05, new_crossfade * 0.9)
+                self.set_crossfade_duration(new_crossfade)
 
             logger.info(
                 f"Adapted for high latency ({avg_latency:.3f}s): "
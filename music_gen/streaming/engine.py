@@ -0,0 +1,186 @@
+"""
+Shared batched decode loop for concurrent streaming sessions.
+"""
+
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import torch
+import torch.nn.functional as F
+
+from ..models.transformer.cache import RingKVCache, StackedKVCache
+from .generator import ChunkProgress, StreamingGenerator
+
+logger = logging.getLogger(__name__)
+
+
+class StreamingEngine:
+    """
+    Steps every active streaming session together in batched forward passes.
+
+    Without an engine each :class:`StreamingGenerator` runs its own worker
+    thread of batch-size-1 transformer calls, so concurrent listeners
+    compete for the same cores. The engine instead runs a single decode
+    loop: each step, every session that is mid-chunk contributes one row to
+    one transformer call over a :class:`StackedKVCache` of the sessions' own
+    ring caches. Sampling stays per session (each generator's logits
+    processors run on its row) and finished token chunks are handed to each
+    generator's decode stage exactly as its own worker would.
+
+    A session whose decode queue is full sits out until its decoder and
+    listener catch up.
+    Steps that project encoder states (a session's first forward pass and
+    the first step after a prompt change) run for that session alone.
+    """
+
+    def __init__(self, model, idle_timeout: float = 0.01):
+        self.model = model
+        self.idle_timeout = idle_timeout  # Seconds to wait when no session can step
+
+        self.generators: List[StreamingGenerator] = []
+        self.chunks: Dict[StreamingGenerator, ChunkProgress] = {}
+
+        # Stacked cross-attention of the last batched rows, reused while they are unchanged
+        self._cross_rows: List[Tuple[RingKVCache, Optional[torch.Tensor]]] = []
+        self._cross_attention = None
+
+        self._lock = threading.RLock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, generator: StreamingGenerator):
+        """Start decoding a prepared generator, starting the decode loop if needed."""
+        with self._lock:
+            if generator not in self.generators:
+                self.generators.append(generator)
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        logger.info(f"Streaming engine stepping {len(self.generators)} sessions")
+
+    def remove(self, generator: StreamingGenerator):
+        """Stop decoding a generator; waits for the current step to finish."""
+        with self._lock:
+            if generator in self.generators:
+                self.generators.remove(generator)
+            self.chunks.pop(generator, None)
+            self._cross_rows, self._cross_attention = [], None
+
+    def shutdown(self):
+        """Stop the decode loop and end every remaining session."""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout=2.0)
+        with self._lock:
+            for generator in list(self.generators):
+                self._retire(generator)
+
+    def _run(self):
+        """Decode loop: step all sessions until shut down."""
+        while not self._stop.is_set():
+            try:
+                stepped = self.step()
+            except Exception as e:
+                logger.error(f"Streaming engine error: {e}")
+                with self._lock:
+                    for generator in list(self.generators):
+                        self._retire(generator, str(e))
+                stepped = 0
+
+            if stepped == 0:
+                self._wakeup.wait(self.idle_timeout)
+                self._wakeup.clear()
+
+    def step(self) -> int:
+        """Sample one token for every session that can make progress; returns how many did."""
+        with self._lock:
+            ready = self._ready_generators()
+            if not ready:
+                return 0
+
+            # One batched call for plain decode steps, single-row calls for the rest
+            batched = [g for g in ready if not g._needs_own_forward(self.chunks[g])]
+            logits = {g: g._step_logits(self.chunks[g]) for g in ready if g not in batched}
+            if batched:
+                for generator, row_logits in zip(batched, self._batched_logits(batched)):
+                    logits[generator] = row_logits.unsqueeze(0)
+
+            # Per-session penalties and filtering, then one sampling call
+            processed = torch.cat([g._process_logits(self.chunks[g], logits[g]) for g in ready])
+            next_tokens = torch.multinomial(F.softmax(processed, dim=-1), num_samples=1)
+
+            for row, generator in enumerate(ready):
+                chunk = self.chunks[generator]
+                if generator._append_token(chunk, next_tokens[row : row + 1]):
+                    del self.chunks[generator]
+                    chunk_tokens = generator._finish_chunk(chunk)
+                    if chunk_tokens is None:
+                        self._retire(generator)
+                    else:
+                        # Room is reserved: the chunk only started with the queue not full
+                        generation_time = time.time() - chunk.start_time
+                        generator._submit_chunk(chunk_tokens, generation_time, block=False)
+
+            return len(ready)
+
+    def _ready_generators(self) -> List[StreamingGenerator]:
+        """Sessions mid-chunk or with room on their decode queue for another chunk."""
+        ready = []
+        for generator in list(self.generators):
+            if generator.stop_generation.is_set() or not generator.current_state.is_active:
+                self._retire(generator)
+                continue
+
+            if generator not in self.chunks:
+                if generator.decode_queue.full():
+                    continue
+                chunk = generator._begin_chunk()
+                if chunk is None:
+                    self._retire(generator)
+                    continue
+                self.chunks[generator] = chunk
+            ready.append(generator)
+        return ready
+
+    def _batched_logits(self, generators: List[StreamingGenerator]) -> torch.Tensor:
+        """Next-token logits of several sessions from one forward pass over their caches."""
+        caches = [g.current_state.past_key_values for g in generators]
+        cache = StackedKVCache(caches, cross_attention=self._reusable_cross_attention(caches))
+        self._cross_attention = cache.cross_attention
+        model_inputs = {
+            "input_ids": torch.cat([self.chunks[g].tokens.last() for g in generators]),
+            "attention_mask": cache.attention_mask(),
+            "position_ids": cache.position_ids(),
+            "past_key_values": cache,
+            "use_cache": True,
+        }
+        if cache.get_cross_attention(0) is not None:
+            model_inputs["encoder_attention_mask"] = cache.encoder_attention_mask()
+
+        with torch.no_grad():
+            outputs = self.model.transformer(**model_inputs)
+
+        return outputs["logits"][:, -1, :]
+
+    def _reusable_cross_attention(self, caches: List[RingKVCache]):
+        """The stacked cross-attention of the last step if it covered the same rows."""
+        # A prompt refresh stores new cross-attention tensors, so identity tracks changes
+        rows = [(cache, cache.cross_key_cache[0]) for cache in caches]
+        reusable = len(rows) == len(self._cross_rows) and all(
+            cache is last_cache and keys is last_keys
+            for (cache, keys), (last_cache, last_keys) in zip(rows, self._cross_rows)
+        )
+        self._cross_rows = rows
+        return self._cross_attention if reusable else None
+
+    def _retire(self, generator: StreamingGenerator, error: Optional[str] = None):
+        """Drop a generator; its decode stage ends the stream once it has caught up."""
+        self.remove(generator)
+        generator.current_state.is_active = False
+        generator._end_token_stage(error)
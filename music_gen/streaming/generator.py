@@ -7,11 +7,27 @@ import threading
 import time
 from dataclasses import dataclass
 from queue import Empty, Queue
-from typing import Any, Dict, Iterator, List, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
 
 import torch
 import torch.nn.functional as F
 
+from ..generation.logits_process import (
+    LogitsProcessorList,
+    RepetitionPenaltyLogitsProcessor,
+    TemperatureLogitsWarper,
+    TopKLogitsWarper,
+    TopPLogitsWarper,
+    TypicalLogitsWarper,
+)
+from ..generation.prefix_cache import PrefixCacheEntry
+from ..generation.token_buffer import TokenBuffer
+from ..models.transformer.cache import RingKVCache
+
+if TYPE_CHECKING:
+    # Imported lazily: the engine module imports this one
+    from .engine import StreamingEngine
+
 logger = logging.getLogger(__name__)
 
 
@@ -29,14 +45,17 @@ class StreamingConfig:
     top_k: int = 40
     top_p: float = 0.9
     repetition_penalty: float = 1.15
+    typical_p: Optional[float] = None  # Typical sampling mass (None disables)
+    eos_check_interval: int = 16  # Tokens sampled between EOS checks (each syncs the device)
 
     # Quality vs latency trade-offs
     max_latency_ms: int = 500  # Maximum acceptable latency
     quality_mode: str = "balanced"  # "fast", "balanced", "quality"
 
     # Memory management
-    max_context_length: int = 2048  # Maximum tokens to keep in context
+    max_context_length: int = 2048  # Maximum tokens to keep in context (and KV cache slots)
     context_window_overlap: int = 256  # Overlap when sliding context window
+    num_sink_tokens: int = 4  # Earliest positions the KV cache keeps as attention sinks
 
     # Streaming controls
     enable_interruption: bool = True  # Allow real-time interruption/modification
@@ -44,6 +63,7 @@ class StreamingConfig:
 
     # Buffer management
     buffer_size: int = 8  # Number of chunks to buffer
+    decode_queue_size: int = 2  # Token chunks waiting for audio decoding
     min_buffer_size: int = 2  # Minimum buffer before starting playback
 
 
@@ -64,11 +84,19 @@ class StreamingState:
         self.last_chunk_time = None
         self.encoder_outputs = None
         self.conditioning_embeddings = None
+        self.next_logits = None  # BOS-step logits restored from the prefix cache
+        self.prefix_key = None  # Prefix cache key to fill on the first forward pass
         self.is_active = False
         self.interrupt_requested = False
 
-    def update_context(self, new_tokens: torch.Tensor, new_past_key_values: Optional[Tuple]):
-        """Update generation context with new tokens and cache."""
+    def update_context(self, new_tokens: torch.Tensor, new_past_key_values: Optional[RingKVCache]):
+        """
+        Update generation context with new tokens and cache.
+
+        The token history only feeds the repetition penalty, so it is trimmed
+        independently; the KV cache slides its own window of
+        ``max_context_length`` positions.
+        """
 
         # Add new tokens
         if isinstance(new_tokens, torch.Tensor):
@@ -91,9 +119,6 @@ class StreamingState:
                 + self.config.context_window_overlap
             )
             self.generated_tokens = self.generated_tokens[tokens_to_remove:]
-
-            # Note: In practice, you'd also need to adjust past_key_values accordingly
-            # This is a simplified implementation
             logger.debug(f"Sliding context window, removed {tokens_to_remove} tokens")
 
     def get_current_tokens(self) -> torch.Tensor:
@@ -103,18 +128,49 @@ class StreamingState:
         return torch.tensor(self.generated_tokens, dtype=torch.long)
 
 
-class StreamingGenerator:
-    """Real-time streaming generator for music generation."""
+@dataclass
+class ChunkProgress:
+    """Tokens of the chunk being generated for one session."""
+
+    tokens: TokenBuffer  # Context followed by the chunk's tokens so far
+    context_length: int  # Where the chunk starts in ``tokens``
+    refresh_cross_attention: bool  # Prompt changed since the last chunk
+    start_time: float
+    step: int = 0  # Tokens sampled so far
+    eos_checked: int = 0  # Tokens already searched for EOS
+
 
-    def __init__(self, model, config: StreamingConfig):
+class StreamingGenerator:
+    """
+    Real-time streaming generator for music generation.
+
+    Streaming is a two-stage pipeline. The token stage samples a chunk of
+    tokens and hands it to a decode thread through a bounded queue of
+    ``decode_queue_size`` chunks; the decode thread turns it into audio and
+    publishes it on ``chunk_queue``. Decoding chunk ``k`` therefore overlaps
+    generating chunk ``k + 1``, and either stage blocks once it gets too
+    far ahead of the other.
+
+    By default the token stage runs on the generator's own worker thread.
+    Given a shared :class:`~music_gen.streaming.engine.StreamingEngine`, it
+    is instead stepped together with the engine's other sessions in batched
+    forward passes; chunks arrive on the same queue either way.
+    """
+
+    def __init__(self, model, config: StreamingConfig, engine: Optional["StreamingEngine"] = None):
         self.model = model
         self.config = config
+        self.engine = engine
         self.device = next(model.parameters()).device
 
         # Calculate token parameters based on audio tokenizer
         self.frame_rate = model.audio_tokenizer.frame_rate
         self.num_quantizers = model.audio_tokenizer.num_quantizers
 
+        # Stateful decoder so consecutive chunks join without crossfading, if supported
+        create_decoder = getattr(model.audio_tokenizer, "streaming_decoder", None)
+        self.audio_decoder = create_decoder() if create_decoder is not None else None
+
         # Calculate chunk sizes in tokens
         self.chunk_frames = int(config.chunk_duration * self.frame_rate)
         self.chunk_tokens = self.chunk_frames * self.num_quantizers
@@ -126,16 +182,26 @@ class StreamingGenerator:
             f"overlap = {self.overlap_tokens} tokens"
         )
 
+        # Penalties and filtering, rebuilt whenever streaming is prepared
+        self.logits_processor = self._build_logits_processor()
+
         # State management
         self.current_state = StreamingState(config)
         self.generation_thread = None
+        self.decode_thread = None
         self.stop_generation = threading.Event()
         self.chunk_queue = Queue(maxsize=config.buffer_size)
 
+        # Token chunks handed from the token stage to the decode thread
+        self.decode_queue = Queue(maxsize=config.decode_queue_size)
+        self.tokens_done = threading.Event()
+        self.token_error: Optional[str] = None
+
         # Performance tracking
         self.generation_stats = {
             "chunks_generated": 0,
             "total_generation_time": 0.0,
+            "total_decode_time": 0.0,
             "average_chunk_time": 0.0,
             "buffer_underruns": 0,
         }
@@ -156,17 +222,41 @@ class StreamingGenerator:
         # Reset state
         self.current_state.reset()
         self.stop_generation.clear()
+        self.tokens_done.clear()
+        self.token_error = None
+        self.logits_processor = self._build_logits_processor()
+        if self.audio_decoder is not None:
+            self.audio_decoder.reset()
+
+        # Repeated prompts reuse their encoder outputs and BOS step from the prefix cache
+        prefix_key = None
+        prefix = None
+        if getattr(self.model, "prefix_cache", None) is not None:
+            prefix_key = self.model.prefix_cache_key(
+                texts,
+                self.device,
+                genre_ids=genre_ids,
+                mood_ids=mood_ids,
+                tempo=tempo,
+                duration=duration,
+                instrument_ids=instrument_ids,
+            )
+            if prefix_key is not None:
+                prefix = self.model.prefix_cache.get(prefix_key)
 
         # Prepare encoder inputs
-        encoder_outputs = self.model.prepare_inputs(
-            texts=texts,
-            device=self.device,
-            genre_ids=genre_ids,
-            mood_ids=mood_ids,
-            tempo=tempo,
-            duration=duration,
-            instrument_ids=instrument_ids,
-        )
+        if prefix is not None:
+            encoder_outputs = prefix.encoder_outputs
+        else:
+            encoder_outputs = self.model.prepare_inputs(
+                texts=texts,
+                device=self.device,
+                genre_ids=genre_ids,
+                mood_ids=mood_ids,
+                tempo=tempo,
+                duration=duration,
+                instrument_ids=instrument_ids,
+            )
 
         # Store encoder outputs in state
         self.current_state.encoder_outputs = encoder_outputs
@@ -178,7 +268,15 @@ class StreamingGenerator:
             (1, 1), self.model.bos_token_id, dtype=torch.long, device=self.device
         )
 
-        self.current_state.update_context(initial_tokens[0], None)
+        # Constant-size cache: attention sinks plus a sliding window of recent positions
+        past_key_values = self._create_cache()
+        if prefix is not None:
+            past_key_values.load_legacy_cache(prefix.past_key_values)
+            self.current_state.update_context(initial_tokens[0], past_key_values)
+            self.current_state.next_logits = prefix.logits
+        else:
+            self.current_state.update_context(initial_tokens[0], past_key_values)
+            self.current_state.prefix_key = prefix_key
 
         return {
             "status": "prepared",
@@ -187,6 +285,17 @@ class StreamingGenerator:
             "expected_latency_ms": self._estimate_latency(),
         }
 
+    def _create_cache(self) -> RingKVCache:
+        """Rolling KV cache holding ``max_context_length`` positions."""
+        return RingKVCache.from_config(
+            self.model.config.transformer,
+            batch_size=1,
+            window_length=self.config.max_context_length - self.config.num_sink_tokens,
+            num_sink_tokens=self.config.num_sink_tokens,
+            device=self.device,
+            dtype=self.model.inference_dtype,
+        )
+
     def _estimate_latency(self) -> float:
         """Estimate generation latency based on configuration."""
         # Rough estimation based on token generation speed
@@ -203,12 +312,17 @@ class StreamingGenerator:
 
         logger.info("Starting streaming generation")
 
-        # Start generation in background thread
-        self.generation_thread = threading.Thread(target=self._generation_worker, daemon=True)
-        self.generation_thread.start()
-
-        # Yield chunks as they become available
-        while self.current_state.is_active:
+        # Decode stage, then the token stage in the shared engine or a background thread
+        self.decode_thread = threading.Thread(target=self._decode_worker, daemon=True)
+        self.decode_thread.start()
+        if self.engine is not None:
+            self.engine.add(self)
+        else:
+            self.generation_thread = threading.Thread(target=self._generation_worker, daemon=True)
+            self.generation_thread.start()
+
+        # Yield chunks as they become available, until the decode stage signals the end
+        while not self.stop_generation.is_set():
             try:
                 # Wait for next chunk with timeout
                 chunk_data = self.chunk_queue.get(timeout=self.config.max_latency_ms / 1000.0)
@@ -240,191 +354,319 @@ class StreamingGenerator:
                 break
 
     def _generation_worker(self):
-        """Background worker for chunk generation."""
+        """Token stage: generate chunks of tokens and hand them to the decode stage."""
 
+        error = None
         try:
-            chunk_idx = 0
-
             while not self.stop_generation.is_set() and self.current_state.is_active:
                 start_time = time.time()
 
                 # Generate next chunk
-                chunk_tokens, audio_chunk = self._generate_next_chunk()
+                chunk_tokens = self._generate_chunk_tokens()
 
                 if chunk_tokens is None:
                     # End of generation
                     break
 
-                generation_time = time.time() - start_time
-                self.generation_stats["total_generation_time"] += generation_time
-                self.generation_stats["chunks_generated"] += 1
-                self.generation_stats["average_chunk_time"] = (
-                    self.generation_stats["total_generation_time"]
-                    / self.generation_stats["chunks_generated"]
-                )
+                # Blocks while the decode stage is decode_queue_size chunks behind
+                self._submit_chunk(chunk_tokens, time.time() - start_time)
 
-                # Create chunk data
-                chunk_data = {
-                    "type": "chunk",
-                    "chunk_idx": chunk_idx,
-                    "tokens": chunk_tokens,
-                    "audio": audio_chunk,
-                    "duration": self.config.chunk_duration,
-                    "timestamp": time.time(),
-                    "generation_time_ms": generation_time * 1000,
-                    "total_duration": self.current_state.total_generated_duration,
-                    "stats": self.generation_stats.copy(),
-                }
+        except Exception as e:
+            logger.error(f"Generation worker error: {e}")
+            error = str(e)
+        finally:
+            self._end_token_stage(error)
 
-                # Add to queue (this may block if buffer is full)
-                if not self.stop_generation.is_set():
-                    self.chunk_queue.put(chunk_data)
+    def _submit_chunk(self, chunk_tokens: torch.Tensor, generation_time: float, block: bool = True):
+        """Queue a chunk of tokens for decoding."""
+        self.decode_queue.put((chunk_tokens, generation_time), block=block)
 
-                chunk_idx += 1
-                self.current_state.current_chunk_idx = chunk_idx
-                self.current_state.total_generated_duration += self.config.chunk_duration
-                self.current_state.last_chunk_time = time.time()
+    def _end_token_stage(self, error: Optional[str] = None):
+        """Tell the decode stage no more chunks are coming."""
+        self.token_error = error
+        self.tokens_done.set()
+
+    def _decode_worker(self):
+        """Decode stage: turn token chunks into audio and publish them in order."""
+
+        error = None
+        try:
+            while not self.stop_generation.is_set():
+                try:
+                    chunk_tokens, generation_time = self.decode_queue.get(timeout=0.05)
+                except Empty:
+                    # Finished once the token stage is done and every chunk is decoded
+                    if self.tokens_done.is_set() and self.decode_queue.empty():
+                        error = self.token_error
+                        break
+                    continue
+
+                start_time = time.time()
+                audio_chunk = self._decode_chunk(chunk_tokens)
+                self._publish_chunk(
+                    chunk_tokens, audio_chunk, generation_time, time.time() - start_time
+                )
 
         except Exception as e:
-            logger.error(f"Generation worker error: {e}")
-            error_data = {
-                "type": "error",
-                "error": str(e),
-                "timestamp": time.time(),
-            }
-            try:
-                self.chunk_queue.put(error_data)
-            except:
-                pass
+            logger.error(f"Decode worker error: {e}")
+            error = str(e)
         finally:
-            # Signal end of generation
+            self._finish_streaming(error)
+
+    def _publish_chunk(
+        self,
+        chunk_tokens: torch.Tensor,
+        audio_chunk: Optional[torch.Tensor],
+        generation_time: float,
+        decode_time: float = 0.0,
+    ):
+        """Record a finished chunk and put it on the queue for the consumer."""
+        self.generation_stats["total_decode_time"] += decode_time
+        self.generation_stats["total_generation_time"] += generation_time
+        self.generation_stats["chunks_generated"] += 1
+        self.generation_stats["average_chunk_time"] = (
+            self.generation_stats["total_generation_time"]
+            / self.generation_stats["chunks_generated"]
+        )
+
+        # Create chunk data
+        chunk_data = {
+            "type": "chunk",
+            "chunk_idx": self.current_state.current_chunk_idx,
+            "tokens": chunk_tokens,
+            "audio": audio_chunk,
+            "duration": self.config.chunk_duration,
+            "timestamp": time.time(),
+            "generation_time_ms": generation_time * 1000,
+            "decode_time_ms": decode_time * 1000,
+            "total_duration": self.current_state.total_generated_duration,
+            "stats": self.generation_stats.copy(),
+        }
+
+        # Add to queue (this may block if buffer is full)
+        if not self.stop_generation.is_set():
+            self.chunk_queue.put(chunk_data)
+
+        self.current_state.current_chunk_idx += 1
+        self.current_state.total_generated_duration += self.config.chunk_duration
+        self.current_state.last_chunk_time = time.time()
+
+    def _finish_streaming(self, error: Optional[str] = None):
+        """Signal the consumer that generation ended, after an error if given."""
+        if error is not None:
             try:
-                self.chunk_queue.put({"type": "end", "timestamp": time.time()})
+                self.chunk_queue.put({"type": "error", "error": error, "timestamp": time.time()})
             except:
                 pass
+        # Signal end of generation
+        try:
+            self.chunk_queue.put({"type": "end", "timestamp": time.time()})
+        except:
+            pass
 
     def _generate_next_chunk(self) -> Tuple[Optional[torch.Tensor], Optional[torch.Tensor]]:
         """Generate the next chunk of tokens and audio."""
+        chunk_tokens = self._generate_chunk_tokens()
+        if chunk_tokens is None:
+            return None, None
+        return chunk_tokens, self._decode_chunk(chunk_tokens)
+
+    def _generate_chunk_tokens(self) -> Optional[torch.Tensor]:
+        """Generate the next chunk of tokens; ``None`` once generation has ended."""
+
+        chunk = self._begin_chunk()
+        if chunk is None:
+            return None
+
+        while chunk.step < self.chunk_tokens and not self.stop_generation.is_set():
+            logits = self._process_logits(chunk, self._step_logits(chunk))
+
+            # Sample next token
+            probs = F.softmax(logits, dim=-1)
+            next_token = torch.multinomial(probs, num_samples=1)
+
+            if self._append_token(chunk, next_token):
+                break
+
+        return self._finish_chunk(chunk)
+
+    def _begin_chunk(self) -> Optional[ChunkProgress]:
+        """Set up the token buffer for the next chunk from the current context."""
 
         # Get current context
         current_tokens = self.current_state.get_current_tokens()
 
         if len(current_tokens) == 0:
             logger.error("No tokens in context for generation")
-            return None, None
+            return None
 
-        # Prepare input for generation
-        input_ids = current_tokens.unsqueeze(0).to(self.device)  # Add batch dimension
+        # Context plus room for this chunk, written in place as tokens are sampled
+        context_length = len(current_tokens)
+        tokens = TokenBuffer.from_tokens(
+            current_tokens.unsqueeze(0).to(self.device),  # Add batch dimension
+            context_length + self.chunk_tokens,
+        )
 
-        # Generate tokens for this chunk
-        chunk_tokens = []
-        past_key_values = self.current_state.past_key_values
+        # A prompt change invalidates the cached cross-attention keys/values
+        refresh_cross_attention = self.current_state.interrupt_requested
+        if refresh_cross_attention:
+            self.current_state.past_key_values.clear_cross_attention()
+        self.current_state.interrupt_requested = False
 
-        for step in range(self.chunk_tokens):
-            if self.stop_generation.is_set():
-                break
+        return ChunkProgress(tokens, context_length, refresh_cross_attention, time.time())
 
-            # Forward pass
-            model_inputs = {
-                "input_ids": input_ids if past_key_values is None else input_ids[:, -1:],
-                "past_key_values": past_key_values,
-                "use_cache": True,
-            }
+    def _needs_own_forward(self, chunk: ChunkProgress) -> bool:
+        """
+        Whether the next step must run on its own rather than in a shared batch.
 
-            # Add encoder outputs on first step
-            if past_key_values is None and self.current_state.encoder_outputs:
-                model_inputs.update(
-                    {
-                        "encoder_hidden_states": self.current_state.encoder_outputs[
-                            "text_hidden_states"
-                        ],
-                        "encoder_attention_mask": self.current_state.encoder_outputs[
-                            "text_attention_mask"
-                        ],
-                        "conditioning_embeddings": self.current_state.encoder_outputs[
-                            "conditioning_embeddings"
-                        ],
-                    }
-                )
+        Steps that project encoder states (the first forward pass and the first
+        step after a prompt change) or reuse logits from the prefix cache
+        cannot join a batched decode step.
+        """
+        if self.current_state.past_key_values.get_seq_length() == 0:
+            return True
+        return chunk.step == 0 and (
+            chunk.refresh_cross_attention or self.current_state.next_logits is not None
+        )
 
-            with torch.no_grad():
-                outputs = self.model.transformer(**model_inputs)
+    def _step_logits(self, chunk: ChunkProgress) -> torch.Tensor:
+        """Logits for the next token of this session alone."""
+        if chunk.step == 0 and self.current_state.next_logits is not None:
+            # BOS step restored from the prefix cache
+            logits = self.current_state.next_logits.clone()
+            self.current_state.next_logits = None
+            return logits
+
+        logits, self.current_state.past_key_values = self._forward(
+            chunk.tokens,
+            self.current_state.past_key_values,
+            chunk.refresh_cross_attention and chunk.step == 0,
+        )
+        return logits
 
-            logits = outputs["logits"][:, -1, :]  # Get last token logits
-            past_key_values = outputs["past_key_values"]
+    def _process_logits(self, chunk: ChunkProgress, logits: torch.Tensor) -> torch.Tensor:
+        """Apply this session's penalties and filtering to next-token logits."""
+        if self.current_state.prefix_key is not None:
+            # First forward pass from BOS: remember it for repeated prompts
+            self.model.prefix_cache.put(
+                self.current_state.prefix_key,
+                PrefixCacheEntry.from_step(
+                    self.current_state.encoder_outputs, self.current_state.past_key_values, logits
+                ),
+            )
+            self.current_state.prefix_key = None
 
-            # Apply generation parameters
-            logits = self._apply_generation_params(logits, input_ids)
+        # Apply generation parameters
+        return self._apply_generation_params(logits, chunk.tokens.view())
 
-            # Sample next token
-            probs = F.softmax(logits, dim=-1)
-            next_token = torch.multinomial(probs, num_samples=1)
+    def _append_token(self, chunk: ChunkProgress, next_token: torch.Tensor) -> bool:
+        """
+        Append a sampled token; returns whether the chunk is complete.
 
-            chunk_tokens.append(next_token.item())
+        The token stays on the device. EOS is looked for only every
+        ``eos_check_interval`` tokens, since reading a sampled token back to
+        the host waits for the device to finish every queued step.
+        """
+        chunk.tokens.append(next_token)
+        chunk.step += 1
 
-            # Update input for next step
-            input_ids = torch.cat([input_ids, next_token], dim=-1)
+        if chunk.step % self.config.eos_check_interval == 0 and self._check_eos(chunk):
+            return True
+        return chunk.step >= self.chunk_tokens
+
+    def _check_eos(self, chunk: ChunkProgress) -> bool:
+        """Search the tokens sampled since the last check for EOS, ending the chunk there."""
+        start = chunk.context_length + chunk.eos_checked
+        is_eos = chunk.tokens.view()[0, start:] == self.model.eos_token_id
+        chunk.eos_checked = chunk.step
+        if not is_eos.any():
+            return False
 
-            # Check for EOS
-            if next_token.item() == self.model.eos_token_id:
-                logger.info("Generated EOS token, ending streaming")
-                self.current_state.is_active = False
-                break
+        # Tokens sampled after EOS are dropped; the chunk ends with EOS
+        chunk.tokens.crop(start + int(is_eos.int().argmax()) + 1)
+        chunk.step = len(chunk.tokens) - chunk.context_length
+        logger.info("Generated EOS token, ending streaming")
+        self.current_state.is_active = False
+        return True
 
-        if not chunk_tokens:
-            return None, None
+    def _finish_chunk(self, chunk: ChunkProgress) -> Optional[torch.Tensor]:
+        """Fold a chunk's tokens into the context and return them; ``None`` if it is empty."""
+        if chunk.eos_checked < chunk.step:
+            self._check_eos(chunk)
+        if len(chunk.tokens) == chunk.context_length:
+            return None
 
         # Update state with new tokens
-        chunk_tensor = torch.tensor(chunk_tokens, dtype=torch.long, device=self.device)
-        self.current_state.update_context(chunk_tensor, past_key_values)
+        chunk_tensor = chunk.tokens.view()[0, chunk.context_length :].clone()
+        self.current_state.update_context(chunk_tensor, self.current_state.past_key_values)
+        return chunk_tensor
 
-        # Convert tokens to audio
+    def _decode_chunk(self, chunk_tokens: torch.Tensor) -> Optional[torch.Tensor]:
+        """Convert a chunk of tokens to audio; ``None`` if decoding fails."""
         try:
-            audio_chunk = self._tokens_to_audio_chunk(chunk_tensor)
+            return self._tokens_to_audio_chunk(chunk_tokens)
         except Exception as e:
             logger.error(f"Failed to convert tokens to audio: {e}")
-            audio_chunk = None
+            return None
 
-        return chunk_tensor, audio_chunk
+    def _forward(
+        self,
+        tokens: TokenBuffer,
+        past_key_values: RingKVCache,
+        refresh_cross_attention: bool,
+    ) -> Tuple[torch.Tensor, RingKVCache]:
+        """Run the transformer on the newest token; returns last-position logits and the cache."""
+        prefill = past_key_values.get_seq_length() == 0
+        model_inputs = {
+            "input_ids": tokens.view() if prefill else tokens.last(),
+            "past_key_values": past_key_values,
+            "use_cache": True,
+        }
 
-    def _apply_generation_params(
-        self, logits: torch.Tensor, input_ids: torch.Tensor
-    ) -> torch.Tensor:
-        """Apply generation parameters to logits."""
+        # Add encoder outputs only when cross-attention keys/values are not cached
+        # yet; afterwards every layer reuses its projections from the cache
+        needs_encoder_outputs = prefill or refresh_cross_attention
+        if needs_encoder_outputs and self.current_state.encoder_outputs:
+            model_inputs.update(
+                {
+                    "encoder_hidden_states": self.current_state.encoder_outputs[
+                        "text_hidden_states"
+                    ],
+                    "encoder_attention_mask": self.current_state.encoder_outputs[
+                        "text_attention_mask"
+                    ],
+                }
+            )
+            if prefill:
+                model_inputs["conditioning_embeddings"] = self.current_state.encoder_outputs[
+                    "conditioning_embeddings"
+                ]
 
-        # Apply temperature
-        if self.config.temperature != 1.0:
-            logits = logits / self.config.temperature
+        with torch.no_grad():
+            outputs = self.model.transformer(**model_inputs)
 
-        # Apply repetition penalty
-        if self.config.repetition_penalty != 1.0:
-            for previous_token in set(input_ids[0].tolist()):
-                if logits[0, previous_token] < 0:
-                    logits[0, previous_token] *= self.config.repetition_penalty
-                else:
-                    logits[0, previous_token] /= self.config.repetition_penalty
+        return outputs["logits"][:, -1, :], outputs["past_key_values"]
 
-        # Apply top-k filtering
+    def _build_logits_processor(self) -> LogitsProcessorList:
+        """Build the penalty/filtering pipeline from the streaming config."""
+        processors = LogitsProcessorList()
+        if self.config.temperature != 1.0:
+            processors.append(TemperatureLogitsWarper(self.config.temperature))
+        if self.config.repetition_penalty != 1.0:
+            processors.append(RepetitionPenaltyLogitsProcessor(self.config.repetition_penalty))
         if self.config.top_k > 0:
-            top_k_logits, top_k_indices = torch.topk(logits, self.config.top_k, dim=-1)
-            logits_filtered = torch.full_like(logits, float("-inf"))
-            logits_filtered.scatter_(-1, top_k_indices, top_k_logits)
-            logits = logits_filtered
-
-        # Apply top-p filtering
+            processors.append(TopKLogitsWarper(self.config.top_k))
         if self.config.top_p < 1.0:
-            sorted_logits, sorted_indices = torch.sort(logits, descending=True, dim=-1)
-            cumulative_probs = torch.cumsum(F.softmax(sorted_logits, dim=-1), dim=-1)
+            processors.append(TopPLogitsWarper(self.config.top_p))
+        if self.config.typical_p is not None and self.config.typical_p < 1.0:
+            processors.append(TypicalLogitsWarper(self.config.typical_p))
+        return processors
 
-            # Remove tokens with cumulative probability above threshold
-            sorted_indices_to_remove = cumulative_probs > self.config.top_p
-            sorted_indices_to_remove[..., 1:] = sorted_indices_to_remove[..., :-1].clone()
-            sorted_indices_to_remove[..., 0] = 0
-
-            indices_to_remove = sorted_indices[0][sorted_indices_to_remove[0]]
-            logits[0][indices_to_remove] = float("-inf")
-
-        return logits
+    def _apply_generation_params(
+        self, logits: torch.Tensor, input_ids: torch.Tensor
+    ) -> torch.Tensor:
+        """Apply generation parameters to logits."""
+        return self.logits_processor(input_ids, logits)
 
     def _tokens_to_audio_chunk(self, tokens: torch.Tensor) -> torch.Tensor:
         """Convert tokens to audio chunk."""
@@ -442,8 +684,11 @@ class StreamingGenerator:
         tokens_reshaped = tokens[: chunk_frames * self.num_quantizers]
         tokens_batch = tokens_reshaped.unsqueeze(0)  # Add batch dimension
 
-        # Convert to audio using the model's audio tokenizer
-        audio = self.model.audio_tokenizer.detokenize(tokens_batch, chunk_frames)
+        # Chunks arrive in stream order, so the stateful decoder continues the last one
+        if self.audio_decoder is not None:
+            audio = self.audio_decoder.detokenize(tokens_batch, chunk_frames)
+        else:
+            audio = self.model.audio_tokenizer.detokenize(tokens_batch, chunk_frames)
 
         return audio
 
@@ -454,13 +699,24 @@ class StreamingGenerator:
         self.current_state.is_active = False
         self.stop_generation.set()
 
-        if self.generation_thread and self.generation_thread.is_alive():
-            self.generation_thread.join(timeout=2.0)
-
-        # Clear remaining chunks
-        while not self.chunk_queue.empty():
+        if self.engine is not None:
+            self.engine.remove(self)
+
+        # Clear remaining chunks, which also frees a stage blocked on a full queue
+        for thread in (self.generation_thread, self.decode_thread):
+            self._drain(self.decode_queue)
+            self._drain(self.chunk_queue)
+            if thread and thread.is_alive():
+                thread.join(timeout=2.0)
+        self._drain(self.decode_queue)
+        self._drain(self.chunk_queue)
+
+    @staticmethod
+    def _drain(queue: Queue):
+        """Discard everything waiting on a queue."""
+        while not queue.empty():
             try:
-                self.chunk_queue.get_nowait()
+                queue.get_nowait()
             except Empty:
                 break
 
@@ -492,6 +748,12 @@ class StreamingGenerator:
             self.current_state.encoder_outputs = new_encoder_outputs
             self.current_state.interrupt_requested = True
 
+            # A BOS step restored or pending for the old prompt no longer applies
+            self.current_state.prefix_key = None
+            if self.current_state.next_logits is not None:
+                self.current_state.next_logits = None
+                self.current_state.past_key_values = self._create_cache()
+
             return True
 
         except Exception as e:
@@ -521,7 +783,11 @@ class StreamingGenerator:
 
 
 def create_streaming_generator(
-    model, chunk_duration: float = 1.0, quality_mode: str = "balanced", **config_kwargs
+    model,
+    chunk_duration: float = 1.0,
+    quality_mode: str = "balanced",
+    engine: Optional["StreamingEngine"] = None,
+    **config_kwargs,
 ) -> StreamingGenerator:
     """Factory function to create a streaming generator with sensible defaults."""
 
@@ -555,4 +821,4 @@ def create_streaming_generator(
     preset["chunk_duration"] = chunk_duration  # Override with user preference
 
     config = StreamingConfig(**preset)
-    return StreamingGenerator(model, config)
+    return StreamingGenerator(model, config, engine=engine)
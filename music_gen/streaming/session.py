@@ -12,6 +12,7 @@ from enum import Enum
 from typing import Any, AsyncIterator, Callable, Dict, List, Optional
 
 from .audio_streamer import AdaptiveStreamer, AudioStreamer
+from .engine import StreamingEngine
 from .generator import StreamingGenerator, create_streaming_generator
 
 logger = logging.getLogger(__name__)
@@ -113,11 +114,13 @@ class StreamingSession:
         model,
         request: StreamingRequest,
         event_callback: Optional[Callable] = None,
+        engine: Optional[StreamingEngine] = None,
     ):
         self.session_id = session_id
         self.model = model
         self.request = request
         self.event_callback = event_callback
+        self.engine = engine  # Shared batched decode loop (None: own worker thread)
 
         # Session state
         self.info = SessionInfo(
@@ -162,18 +165,24 @@ class StreamingSession:
                 repetition_penalty=self.request.repetition_penalty,
                 enable_interruption=self.request.enable_interruption,
                 adaptive_quality=self.request.adaptive_quality,
+                engine=self.engine,
             )
 
+            # Statefully decoded chunks already join seamlessly; crossfading would smear them
+            crossfade_duration = self.request.crossfade_duration
+            if self.generator.audio_decoder is not None:
+                crossfade_duration = 0.0
+
             # Create audio streamer
             if self.request.adaptive_quality:
                 self.audio_streamer = AdaptiveStreamer(
                     sample_rate=self.model.audio_tokenizer.sample_rate,
-                    crossfade_duration=self.request.crossfade_duration,
+                    crossfade_duration=crossfade_duration,
                 )
             else:
                 self.audio_streamer = AudioStreamer(
                     sample_rate=self.model.audio_tokenizer.sample_rate,
-                    crossfade_duration=self.request.crossfade_duration,
+                    crossfade_duration=crossfade_duration,
                 )
 
             # Prepare generation
@@ -499,11 +508,18 @@ class StreamingSession:
 
 
 class SessionManager:
-    """Manages multiple streaming sessions."""
+    """
+    Manages multiple streaming sessions.
+
+    With ``batch_sessions`` (the default) all sessions decode through one
+    shared :class:`StreamingEngine`, which steps them together in batched
+    forward passes instead of one single-row worker thread per session.
+    """
 
-    def __init__(self, model, max_concurrent_sessions: int = 10):
+    def __init__(self, model, max_concurrent_sessions: int = 10, batch_sessions: bool = True):
         self.model = model
         self.max_concurrent_sessions = max_concurrent_sessions
+        self.engine = StreamingEngine(model) if batch_sessions else None
 
         self.sessions: Dict[str, StreamingSession] = {}
         self.session_lock = asyncio.Lock()
@@ -541,7 +557,9 @@ class SessionManager:
                 raise ValueError(f"Session {session_id} already exists")
 
             # Create session
-            session = StreamingSession(session_id, self.model, request, event_callback)
+            session = StreamingSession(
+                session_id, self.model, request, event_callback, engine=self.engine
+            )
             self.sessions[session_id] = session
 
             logger.info(f"Created session {session_id} ({len(self.sessions)} total)")
@@ -639,4 +657,7 @@ class SessionManager:
         for session_id in list(self.sessions.keys()):
             await self.remove_session(session_id)
 
+        if self.engine is not None:
+            self.engine.shutdown()
+
         logger.info("Session manager shutdown complete")
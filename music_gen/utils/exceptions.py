@@ -50,6 +50,10 @@ class GenerationError(MusicGenError):
     """Errors during music generation."""
 
 
+class GenerationCancelled(GenerationError):
+    """Generation was stopped because the client cancelled the request."""
+
+
 class ValidationError(MusicGenError):
     """Errors related to input validation."""
 
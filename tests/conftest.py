@@ -181,6 +181,70 @@ def mock_model_config():
     }
 
 
+class FakeTextEncoder(torch.nn.Module):
+    """Deterministic stand-in for the T5-based multimodal encoder."""
+
+    def __init__(self, hidden_size: int, conditioning_dim: int):
+        super().__init__()
+        self.proj = torch.nn.Linear(4, hidden_size)
+        self.conditioning_dim = conditioning_dim
+
+    def forward(self, texts, device, **kwargs):
+        # Prompt-dependent lengths and states, unpadded per prompt
+        max_len = max(2 + len(text.split()) for text in texts)
+        generator = torch.Generator().manual_seed(sum(len(text) for text in texts))
+        hidden_states = self.proj(torch.randn(len(texts), max_len, 4, generator=generator))
+        return {
+            "text_hidden_states": hidden_states.to(device),
+            "text_attention_mask": None,
+            "conditioning_embeddings": torch.zeros(
+                len(texts), self.conditioning_dim, device=device
+            ),
+        }
+
+
+def _build_tiny_musicgen_model(config):
+    """Small MusicGenModel with a mocked audio tokenizer and text encoder."""
+    if not MUSICGEN_AVAILABLE:
+        pytest.skip("MusicGenModel not available (dependencies missing)")
+
+    from unittest.mock import MagicMock, patch
+
+    tokenizer = MagicMock()
+    tokenizer.codebook_size = config.transformer.vocab_size
+    tokenizer.num_quantizers = 4
+
+    torch.manual_seed(0)
+    with patch("music_gen.models.musicgen.EnCodecTokenizer", return_value=tokenizer), patch(
+        "music_gen.models.musicgen.MultiModalEncoder",
+        lambda **kwargs: FakeTextEncoder(
+            config.transformer.text_hidden_size, config.transformer.conditioning_dim
+        ),
+    ):
+        from music_gen.models.musicgen import MusicGenModel
+
+        model = MusicGenModel(config)
+    model.eval()
+    return model
+
+
+@pytest.fixture
+def tiny_musicgen_model(test_config):
+    """Small MusicGenModel with a mocked audio tokenizer and text encoder."""
+    return _build_tiny_musicgen_model(test_config)
+
+
+@pytest.fixture
+def tiny_delay_musicgen_model(test_config):
+    """Small MusicGenModel predicting 4 codebooks per step with the delay pattern."""
+    import copy
+
+    config = copy.deepcopy(test_config)
+    config.transformer.codebook_pattern = "delay"
+    config.transformer.num_quantizers = 4
+    return _build_tiny_musicgen_model(config)
+
+
 @pytest.fixture
 def dataset_metadata():
     """Sample dataset metadata for testing."""
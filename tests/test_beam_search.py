@@ -292,6 +292,155 @@ class TestBeamSearcher:
             # The important thing is that the structure is correct
             pytest.skip(f"Beam search failed with mock model: {e}")
 
+    def test_reorder_cache_keeps_cross_attention(self, beam_config):
+        """Test cache reordering only moves self-attention entries."""
+        searcher = BeamSearcher(beam_config)
+
+        self_key = torch.arange(4).float().view(4, 1, 1, 1)
+        cross_key = torch.randn(4, 1, 3, 1)
+        past_key_values = ((self_key, self_key.clone(), cross_key, cross_key.clone()),)
+        beam_indices = torch.tensor([1, 1, 3, 2])
+
+        reordered = searcher._reorder_cache(past_key_values, beam_indices)
+
+        assert torch.equal(reordered[0][0].flatten(), torch.tensor([1.0, 1.0, 3.0, 2.0]))
+        assert reordered[0][2] is cross_key
+        assert len(reordered[0]) == 4
+
+    def test_vectorized_step_matches_legacy(self, beam_config):
+        """Test on-device beam selection picks the same beams as the Python loop."""
+        torch.manual_seed(0)
+        batch_size, vocab_size = 3, 50
+        searcher = BeamSearcher(beam_config)
+        legacy = BeamSearcher(
+            BeamSearchConfig(**{**vars(beam_config), "legacy_beam_selection": True})
+        )
+
+        for _ in range(5):
+            scores = torch.randn(batch_size * 4, vocab_size).log_softmax(dim=-1)
+            scores[::3, beam_config.eos_token_id] = 10.0  # EOS is the best candidate of some beams
+            beam_scores = torch.randn(batch_size * 4)
+
+            expected = legacy._beam_search_step(scores, beam_scores, batch_size)
+            result = searcher._beam_search_step(scores, beam_scores, batch_size)
+
+            for actual, reference in zip(result, expected):
+                assert torch.equal(actual, reference)
+            assert not torch.any(result[1] == beam_config.eos_token_id)
+
+    def test_vectorized_step_keeps_beam_count(self, beam_config):
+        """Test every batch item keeps num_beams beams when few candidates are finite."""
+        searcher = BeamSearcher(beam_config)
+        scores = torch.full((2 * 4, 10), -float("inf"))
+        scores[0, 5] = 0.0
+        scores[4, 7] = 0.0
+
+        beam_scores, beam_tokens, beam_indices = searcher._beam_search_step(
+            scores, torch.zeros(2 * 4), batch_size=2
+        )
+
+        assert beam_scores.shape == beam_tokens.shape == beam_indices.shape == (8,)
+        assert beam_tokens[0] == 5 and beam_indices[0] == 0
+        assert beam_tokens[4] == 7 and beam_indices[4] == 4
+        assert torch.all(beam_indices[:4] < 4) and torch.all(beam_indices[4:] >= 4)
+
+    def test_search_matches_legacy(self, mock_model, beam_config):
+        """Test a full search gives the same sequences with either selection."""
+        input_ids = torch.ones(2, 1, dtype=torch.long)
+        outputs = []
+        for legacy in (False, True):
+            config = BeamSearchConfig(**{**vars(beam_config), "legacy_beam_selection": legacy})
+            torch.manual_seed(0)
+            outputs.append(BeamSearcher(config).search(mock_model, input_ids))
+
+        assert torch.equal(outputs[0][0], outputs[1][0])
+        assert torch.allclose(outputs[0][1], outputs[1][1])
+
+    def test_search_without_repeated_ngrams(self, mock_model, beam_config):
+        """Test no returned sequence repeats an n-gram when no_repeat_ngram_size is set."""
+        config = BeamSearchConfig(**{**vars(beam_config), "no_repeat_ngram_size": 2})
+        torch.manual_seed(0)
+        sequences, _ = BeamSearcher(config).search(mock_model, torch.ones(2, 1, dtype=torch.long))
+
+        for sequence in sequences.tolist():
+            bigrams = [tuple(sequence[i : i + 2]) for i in range(len(sequence) - 1)]
+            bigrams = [bigram for bigram in bigrams if config.pad_token_id not in bigram]
+            assert len(bigrams) == len(set(bigrams))
+
+    def test_diverse_step_single_group_matches_standard(self, beam_config):
+        """Test one beam group selects exactly like standard beam search."""
+        torch.manual_seed(0)
+        searcher = BeamSearcher(BeamSearchConfig(**{**vars(beam_config), "diversity_penalty": 1.0}))
+        scores = torch.randn(2 * 4, 50).log_softmax(dim=-1)
+        beam_scores = torch.randn(2 * 4)
+
+        expected = searcher._beam_search_step(scores, beam_scores, 2)
+        result = searcher._diverse_beam_search_step(scores, beam_scores, 3, 2)
+
+        for actual, reference in zip(result, expected):
+            assert torch.equal(actual, reference)
+
+    def test_diverse_step_penalizes_earlier_groups_tokens(self, beam_config):
+        """Test later groups avoid tokens chosen by earlier groups at the same step."""
+        config = BeamSearchConfig(
+            **{**vars(beam_config), "num_beam_groups": 2, "diversity_penalty": 10.0}
+        )
+        searcher = BeamSearcher(config)
+        # Every beam prefers tokens 5 and 6, then 7 and 8
+        scores = torch.full((2 * 4, 10), -5.0)
+        scores[:, [5, 6]] = 0.0
+        scores[:, [7, 8]] = -1.0
+
+        # Only the first beam of every group is active, as at the start of a search
+        initial_scores = torch.tensor([0.0, -1e9] * 4)
+
+        beam_scores, beam_tokens, beam_indices = searcher._diverse_beam_search_step(
+            scores.log_softmax(dim=-1), initial_scores, 1, 2
+        )
+
+        tokens = beam_tokens.view(2, 2, 2)
+        assert set(tokens[:, 0].flatten().tolist()) == {5, 6}
+        assert set(tokens[:, 1].flatten().tolist()) == {7, 8}
+        # Beams stay within their batch item and group
+        groups = beam_indices.view(2, 4) // 2
+        assert torch.equal(groups, torch.tensor([[0, 0, 1, 1], [2, 2, 3, 3]]))
+
+    def test_diverse_search_returns_one_sequence_per_group(self, mock_model, beam_config):
+        """Test a grouped search returns distinct candidates from every group in one call."""
+        config = BeamSearchConfig(
+            **{
+                **vars(beam_config),
+                "num_beam_groups": 4,
+                "diversity_penalty": 5.0,
+                "num_return_sequences": 4,
+            }
+        )
+        torch.manual_seed(0)
+        sequences, scores = BeamSearcher(config).search(
+            mock_model, torch.ones(2, 1, dtype=torch.long)
+        )
+
+        assert sequences.shape[0] == scores.shape[0] == 2 * 4
+        for item in sequences.view(2, 4, -1):
+            assert len({tuple(sequence.tolist()) for sequence in item}) == 4
+
+    def test_search_returns_best_sequences_first(self, mock_model, beam_config):
+        """Test num_return_sequences returns each input's best beams in score order."""
+        torch.manual_seed(0)
+        best, best_scores = BeamSearcher(beam_config).search(
+            mock_model, torch.ones(2, 1, dtype=torch.long)
+        )
+        config = BeamSearchConfig(**{**vars(beam_config), "num_return_sequences": 3})
+        torch.manual_seed(0)
+        sequences, scores = BeamSearcher(config).search(
+            mock_model, torch.ones(2, 1, dtype=torch.long)
+        )
+
+        assert sequences.shape[0] == 6
+        assert torch.equal(sequences[::3, : best.shape[1]], best)
+        assert torch.allclose(scores[::3], best_scores)
+        assert torch.all(scores.view(2, 3)[:, :-1] >= scores.view(2, 3)[:, 1:])
+
 
 class TestBeamSearchGenerate:
     """Test the main beam search generation function."""
@@ -350,6 +499,11 @@ class TestBeamSearchIntegration:
         searcher = BeamSearcher(config)
         assert searcher.group_size == 3
 
+    def test_num_return_sequences_validation(self):
+        """Test more returned sequences than beams is rejected."""
+        with pytest.raises(ValueError):
+            BeamSearchConfig(num_beams=2, num_return_sequences=3)
+
     def test_config_edge_cases(self):
         """Test edge cases in configuration."""
         # Single beam (should work like greedy)
@@ -2,13 +2,16 @@
 Tests for streaming generation functionality.
 """
 
+import threading
 import time
 from unittest.mock import Mock, patch
 
 import pytest
 import torch
 
+from music_gen.models.transformer import StackedKVCache
 from music_gen.streaming.audio_streamer import AudioChunk, CrossfadeProcessor, StreamingBuffer
+from music_gen.streaming.engine import StreamingEngine
 from music_gen.streaming.generator import (
     StreamingConfig,
     StreamingGenerator,
@@ -430,6 +433,209 @@ class TestStreamingGenerator:
         assert "chunk_duration" in result
         assert generator.current_state.is_active == True
 
+    def test_long_session_keeps_cache_bounded(self, tiny_musicgen_model):
+        """Test the KV cache slides a fixed window however many chunks are generated."""
+        model = tiny_musicgen_model
+        model.audio_tokenizer = MockAudioTokenizer()
+        model.eos_token_id = -1
+        config = StreamingConfig(
+            chunk_duration=0.05, max_context_length=16, context_window_overlap=4, num_sink_tokens=2
+        )
+        generator = StreamingGenerator(model, config)
+        generator.prepare_streaming(texts=["test prompt"])
+
+        cache = generator.current_state.past_key_values
+        buffer_ptr = cache.key_cache[0].data_ptr()
+        for _ in range(5):
+            tokens, audio = generator._generate_next_chunk()
+            assert tokens.shape[0] == generator.chunk_tokens
+
+        assert generator.current_state.past_key_values is cache
+        assert cache.seq_length == config.max_context_length
+        # BOS plus every sampled token except the newest, which feeds the next step
+        assert cache.total_length == 5 * generator.chunk_tokens
+        assert cache.key_cache[0].data_ptr() == buffer_ptr
+
+    def test_eos_ends_chunk_between_checks(self, tiny_musicgen_model, monkeypatch):
+        """Test EOS sampled between periodic checks still ends the chunk right after it."""
+        model = tiny_musicgen_model
+        model.audio_tokenizer = MockAudioTokenizer()
+        model.eos_token_id = 2
+        sampled = iter([5, 6, 7, 8, 2, 9, 9, 9, 9, 9])
+        monkeypatch.setattr(
+            torch, "multinomial", lambda probs, num_samples: torch.tensor([[next(sampled)]])
+        )
+        config = StreamingConfig(chunk_duration=0.05, eos_check_interval=4)
+        generator = StreamingGenerator(model, config)
+        generator.prepare_streaming(texts=["test prompt"])
+
+        tokens, audio = generator._generate_next_chunk()
+
+        assert tokens.tolist() == [5, 6, 7, 8, 2]
+        assert generator.current_state.is_active is False
+        assert generator.current_state.generated_tokens[-1] == 2
+
+    def test_decoding_overlaps_generation(self, tiny_musicgen_model):
+        """Test the next chunk is generated while the previous one is still decoding."""
+        model = tiny_musicgen_model
+        model.audio_tokenizer = MockAudioTokenizer()
+        model.eos_token_id = -1
+        detokenize = model.audio_tokenizer.detokenize
+        decode_started = threading.Event()
+        release_decode = threading.Event()
+
+        def slow_detokenize(tokens, time_frames):
+            decode_started.set()
+            release_decode.wait(timeout=5.0)
+            return detokenize(tokens, time_frames)
+
+        model.audio_tokenizer.detokenize = slow_detokenize
+        config = StreamingConfig(chunk_duration=0.05, decode_queue_size=2, max_latency_ms=5000)
+        generator = StreamingGenerator(model, config)
+        generator.prepare_streaming(texts=["test prompt"])
+
+        chunks = []
+
+        def consume():
+            for item in generator.start_streaming():
+                if item["type"] == "chunk":
+                    chunks.append(item)
+                    if len(chunks) == 3:
+                        break
+
+        consumer = threading.Thread(target=consume)
+        consumer.start()
+        assert decode_started.wait(timeout=5.0)
+        deadline = time.time() + 5.0
+        while not generator.decode_queue.full() and time.time() < deadline:
+            time.sleep(0.01)
+
+        # Two more chunks are generated and waiting although the first is not decoded yet
+        assert generator.decode_queue.full()
+        assert generator.generation_stats["chunks_generated"] == 0
+
+        release_decode.set()
+        consumer.join(timeout=5.0)
+        assert [chunk["chunk_idx"] for chunk in chunks] == [0, 1, 2]
+        assert all(chunk["audio"] is not None for chunk in chunks)
+        generator.stop_streaming()
+
+    def test_stateful_decoder_continues_chunks(self, tiny_musicgen_model):
+        """Test chunks are decoded in order by the tokenizer's streaming decoder."""
+        model = tiny_musicgen_model
+        model.audio_tokenizer = MockAudioTokenizer()
+        model.eos_token_id = -1
+        decoder = Mock()
+        decoder.detokenize.side_effect = model.audio_tokenizer.detokenize
+        model.audio_tokenizer.streaming_decoder = Mock(return_value=decoder)
+        config = StreamingConfig(chunk_duration=0.05)
+        generator = StreamingGenerator(model, config)
+        generator.prepare_streaming(texts=["test prompt"])
+
+        chunk_tokens = [generator._generate_next_chunk()[0] for _ in range(2)]
+
+        decoder.reset.assert_called_once()
+        assert decoder.detokenize.call_count == 2
+        for call, tokens in zip(decoder.detokenize.call_args_list, chunk_tokens):
+            assert torch.equal(call.args[0], tokens.unsqueeze(0))
+
+
+class TestStreamingEngine:
+    """Test the shared batched decode loop."""
+
+    @pytest.fixture
+    def model(self, tiny_musicgen_model):
+        """Tiny model that streams without ever sampling EOS."""
+        tiny_musicgen_model.audio_tokenizer = MockAudioTokenizer()
+        tiny_musicgen_model.eos_token_id = -1
+        return tiny_musicgen_model
+
+    def _generator(self, model, prompt, engine=None, **config_kwargs):
+        config = StreamingConfig(
+            chunk_duration=0.05, max_context_length=16, context_window_overlap=4, **config_kwargs
+        )
+        generator = StreamingGenerator(model, config, engine=engine)
+        generator.prepare_streaming(texts=[prompt])
+        return generator
+
+    def test_batched_sessions_match_separate_generation(self, model, monkeypatch):
+        """Test sessions stepped together sample what each would sample alone."""
+        monkeypatch.setattr(
+            torch, "multinomial", lambda probs, num_samples: probs.argmax(-1, keepdim=True)
+        )
+        prompts = ["soft piano", "loud drums and bass"]
+        settings = [{"top_k": 5, "num_sink_tokens": 2}, {"repetition_penalty": 1.0}]
+
+        expected = []
+        for prompt, kwargs in zip(prompts, settings):
+            generator = self._generator(model, prompt, **kwargs)
+            expected.append(torch.cat([generator._generate_next_chunk()[0] for _ in range(4)]))
+
+        engine = StreamingEngine(model)
+        generators = [
+            self._generator(model, prompt, engine, **kwargs)
+            for prompt, kwargs in zip(prompts, settings)
+        ]
+        engine.generators = list(generators)  # Step by hand instead of the decode thread
+        chunks = [[] for _ in generators]
+        while any(len(generator_chunks) < 4 for generator_chunks in chunks):
+            assert engine.step() == 2
+            for generator, generator_chunks in zip(generators, chunks):
+                if not generator.decode_queue.empty():
+                    generator_chunks.append(generator.decode_queue.get()[0])
+
+        for generator_chunks, tokens in zip(chunks, expected):
+            assert torch.equal(torch.cat(generator_chunks[:4]), tokens)
+
+    def test_full_queue_sits_out(self, model):
+        """Test a session whose decode stage is behind is not stepped."""
+        engine = StreamingEngine(model)
+        generator = self._generator(model, "test prompt", engine, decode_queue_size=1)
+        engine.generators = [generator]
+
+        while generator.decode_queue.qsize() == 0:
+            engine.step()
+
+        assert engine.step() == 0
+        generator.decode_queue.get()
+        assert engine.step() == 1
+
+    def test_cross_attention_stacked_once(self, model, monkeypatch):
+        """Test the sessions' encoder states are stacked again only when the batch changes."""
+        stack = StackedKVCache.stack_cross_attention.__func__
+        stacked = []
+
+        def counting_stack(cls, caches):
+            stacked.append(len(caches))
+            return stack(cls, caches)
+
+        monkeypatch.setattr(StackedKVCache, "stack_cross_attention", classmethod(counting_stack))
+        engine = StreamingEngine(model)
+        engine.generators = [
+            self._generator(model, prompt, engine, decode_queue_size=8) for prompt in ["a", "b c"]
+        ]
+        for _ in range(6):
+            assert engine.step() == 2
+        assert stacked == [2]
+
+        engine.generators.append(self._generator(model, "d e f", engine, decode_queue_size=8))
+        for _ in range(6):
+            assert engine.step() == 3
+        assert stacked == [2, 3]
+
+    def test_streams_through_decode_thread(self, model):
+        """Test sessions started on an engine stream chunks and leave it when stopped."""
+        engine = StreamingEngine(model)
+        generators = [self._generator(model, prompt, engine) for prompt in ["a", "b c"]]
+
+        for generator in generators:
+            chunk = next(item for item in generator.start_streaming() if item["type"] == "chunk")
+            assert chunk["tokens"].shape[0] == generator.chunk_tokens
+            generator.stop_streaming()
+
+        assert engine.generators == []
+        engine.shutdown()
+
 
 class TestStreamingSession:
     """Test streaming session management."""
@@ -489,6 +695,7 @@ class TestSessionManager:
 
         assert session_id in manager.sessions
         assert len(manager.sessions) == 1
+        assert manager.sessions[session_id].engine is manager.engine
 
     @pytest.mark.asyncio
     async def test_session_limit(self):
@@ -74,3 +74,65 @@ class TestAudioTokenizerModel:
             assert len(audio_decoded) == 1
         except Exception as e:
             pytest.skip(f"MultiResolutionTokenizer forward test failed (expected without EnCodec): {e}")
+
+
+class TestDelayPattern:
+    """Test codebook interleaving with the delay pattern."""
+
+    def test_layout(self):
+        """Test codebook k is shifted right by k steps."""
+        codes = torch.tensor([[[1, 2, 3], [4, 5, 6]]])
+        delayed = EnCodecTokenizer.apply_delay_pattern(codes, special_token_id=9)
+
+        assert delayed.tolist() == [[[1, 2, 3, 9], [9, 4, 5, 6]]]
+
+    def test_round_trip(self):
+        """Test reverting the pattern recovers the codes."""
+        codes = torch.randint(0, 1024, (2, 8, 20))
+        delayed = EnCodecTokenizer.apply_delay_pattern(codes, special_token_id=1024)
+
+        assert delayed.shape == (2, 8, 27)
+        assert torch.equal(EnCodecTokenizer.revert_delay_pattern(delayed), codes)
+
+
+@pytest.mark.skipif(not ENCODEC_AVAILABLE, reason="EnCodec package not installed")
+class TestStreamingDecoder:
+    """Test incremental decoding of consecutive chunks."""
+
+    @pytest.fixture(scope="class")
+    def encodec(self):
+        """Randomly initialized 24 kHz EnCodec model (no download)."""
+        torch.manual_seed(0)
+        model = EncodecModel.encodec_model_24khz(pretrained=False).eval()
+        model.set_target_bandwidth(6.0)
+        return model
+
+    def test_chunks_match_full_decode(self, encodec):
+        """Test decoded chunks concatenate to the decode of the whole stream."""
+        codes = torch.randint(0, 1024, (2, 8, 60))
+        with torch.no_grad():
+            full = encodec.decode([(codes, None)])
+
+        decoder = EnCodecStreamingDecoder(encodec, num_quantizers=8)
+        chunks = [decoder.decode(codes[..., a:b]) for a, b in [(0, 10), (10, 11), (11, 60)]]
+
+        assert [chunk.shape[-1] for chunk in chunks] == [3200, 320, 15680]
+        assert torch.allclose(torch.cat(chunks, dim=-1), full, atol=1e-5)
+
+    def test_reset_starts_new_stream(self, encodec):
+        """Test a reset decoder decodes the next chunk as a fresh stream."""
+        codes = torch.randint(0, 1024, (1, 8, 20))
+        decoder = EnCodecStreamingDecoder(encodec, num_quantizers=8)
+        first = decoder.detokenize(codes.view(1, -1), 20)
+        decoder.detokenize(codes.view(1, -1), 20)
+        decoder.reset()
+
+        assert torch.allclose(decoder.detokenize(codes.view(1, -1), 20), first, atol=1e-6)
+
+    def test_non_causal_model_unsupported(self):
+        """Test models that can't be decoded incrementally are rejected."""
+        model = EncodecModel.encodec_model_48khz(pretrained=False)
+
+        assert not EnCodecStreamingDecoder.supports(model)
+        with pytest.raises(ValueError):
+            EnCodecStreamingDecoder(model, num_quantizers=8)
@@ -0,0 +1,502 @@
+"""
+Tests for music_gen.models.transformer.cache
+"""
+
+import copy
+
+import pytest
+import torch
+
+from music_gen.models.transformer.cache import (
+    PagedKVCache,
+    RingKVCache,
+    StackedKVCache,
+    StaticKVCache,
+)
+from music_gen.models.transformer.model import MusicGenTransformer
+
+
+class TestStaticKVCache:
+    """Test preallocated KV cache."""
+
+    @pytest.fixture
+    def transformer(self, test_config):
+        """Create a small transformer in eval mode."""
+        model = MusicGenTransformer(test_config.transformer)
+        model.eval()
+        return model
+
+    def test_cache_creation(self, test_config):
+        """Test cache buffers are allocated up front."""
+        cache = StaticKVCache.from_config(test_config.transformer, batch_size=2, max_length=16)
+
+        head_dim = test_config.transformer.hidden_size // test_config.transformer.num_heads
+        assert len(cache) == test_config.transformer.num_layers
+        assert cache.key_cache[0].shape == (2, test_config.transformer.num_heads, 16, head_dim)
+        assert cache.get_seq_length() == 0
+
+    def test_update_returns_valid_prefix(self):
+        """Test update writes in place and returns views of the valid length."""
+        cache = StaticKVCache(num_layers=1, batch_size=1, num_heads=2, head_dim=4, max_length=8)
+        buffer_ptr = cache.key_cache[0].data_ptr()
+
+        keys, values = cache.update(0, torch.ones(1, 2, 3, 4), torch.ones(1, 2, 3, 4))
+        cache.advance(3)
+        assert keys.shape[2] == 3
+
+        keys, values = cache.update(0, torch.full((1, 2, 1, 4), 2.0), torch.zeros(1, 2, 1, 4))
+        cache.advance(1)
+        assert keys.shape[2] == 4
+        assert torch.all(keys[:, :, 3] == 2.0)
+        assert cache.key_cache[0].data_ptr() == buffer_ptr
+
+    def test_overflow_raises(self):
+        """Test writing past max_length raises."""
+        cache = StaticKVCache(num_layers=1, batch_size=1, num_heads=1, head_dim=2, max_length=2)
+        with pytest.raises(ValueError):
+            cache.update(0, torch.zeros(1, 1, 3, 2), torch.zeros(1, 1, 3, 2))
+
+    def test_matches_legacy_cache(self, transformer, test_config):
+        """Test static cache decoding matches tuple-based past_key_values."""
+        torch.manual_seed(0)
+        input_ids = torch.randint(3, test_config.transformer.vocab_size, (2, 6))
+
+        static_cache = StaticKVCache.from_config(
+            test_config.transformer, batch_size=2, max_length=8
+        )
+        legacy_cache = None
+
+        with torch.no_grad():
+            for step in range(input_ids.shape[1]):
+                step_ids = input_ids[:, :1] if step == 0 else input_ids[:, step : step + 1]
+                legacy = transformer(step_ids, past_key_values=legacy_cache, use_cache=True)
+                static = transformer(step_ids, past_key_values=static_cache, use_cache=True)
+                legacy_cache = legacy["past_key_values"]
+
+                assert static["past_key_values"] is static_cache
+                assert torch.allclose(legacy["logits"], static["logits"], atol=1e-5)
+
+        assert static_cache.get_seq_length() == input_ids.shape[1]
+        for (legacy_k, legacy_v), (static_k, static_v) in zip(
+            legacy_cache, static_cache.to_legacy_cache()
+        ):
+            assert torch.allclose(legacy_k, static_k)
+            assert torch.allclose(legacy_v, static_v)
+
+    def test_cross_attention_projected_once(self, transformer, test_config):
+        """Test encoder keys/values are projected on the first step only."""
+        torch.manual_seed(0)
+        encoder_hidden_states = torch.randn(2, 7, test_config.transformer.text_hidden_size)
+        input_ids = torch.randint(3, test_config.transformer.vocab_size, (2, 5))
+
+        projections = []
+        handle = transformer.layers[0].cross_attn.k_proj.register_forward_hook(
+            lambda module, inputs, output: projections.append(output.shape)
+        )
+
+        static_cache = StaticKVCache.from_config(
+            test_config.transformer, batch_size=2, max_length=8
+        )
+        legacy_cache = None
+
+        with torch.no_grad():
+            for step in range(input_ids.shape[1]):
+                step_ids = input_ids[:, step : step + 1]
+                static = transformer(
+                    step_ids,
+                    encoder_hidden_states=encoder_hidden_states,
+                    past_key_values=static_cache,
+                    use_cache=True,
+                )
+                legacy = transformer(
+                    step_ids,
+                    encoder_hidden_states=encoder_hidden_states if step == 0 else None,
+                    past_key_values=legacy_cache,
+                    use_cache=True,
+                )
+                legacy_cache = legacy["past_key_values"]
+                assert torch.allclose(legacy["logits"], static["logits"], atol=1e-5)
+        handle.remove()
+
+        # One projection for the static cache and one for the legacy cache
+        assert len(projections) == 2
+        assert static_cache.get_cross_attention(0) is not None
+        assert all(len(layer_past) == 4 for layer_past in legacy_cache)
+
+    def test_reset_clears_cross_attention(self, test_config):
+        """Test reset drops cached cross-attention keys/values."""
+        cache = StaticKVCache.from_config(test_config.transformer, batch_size=1, max_length=4)
+        cache.set_cross_attention(0, torch.zeros(1, 1, 2, 2), torch.zeros(1, 1, 2, 2))
+        cache.advance(2)
+
+        cache.reset()
+
+        assert cache.get_seq_length() == 0
+        assert cache.get_cross_attention(0) is None
+
+    def test_select_batch(self, test_config):
+        """Test selecting rows keeps their keys/values and shrinks the buffers."""
+        cache = StaticKVCache(num_layers=1, batch_size=3, num_heads=1, head_dim=2, max_length=4)
+        cache.update(
+            0, torch.arange(3.0).view(3, 1, 1, 1).expand(3, 1, 1, 2), torch.zeros(3, 1, 1, 2)
+        )
+        cache.set_cross_attention(0, torch.arange(3.0).view(3, 1, 1, 1), torch.zeros(3, 1, 1, 1))
+        cache.advance(1)
+
+        cache.select_batch(torch.tensor([2, 0]))
+
+        assert cache.batch_size == 2
+        assert cache.key_cache[0].shape[0] == 2
+        assert cache.key_cache[0][:, 0, 0, 0].tolist() == [2.0, 0.0]
+        assert cache.get_cross_attention(0)[0][:, 0, 0, 0].tolist() == [2.0, 0.0]
+        assert cache.get_seq_length() == 1
+
+    def test_crop(self, transformer, test_config):
+        """Test cropping rolls back so decoding resumes as if the tail was never fed."""
+        torch.manual_seed(0)
+        input_ids = torch.randint(3, test_config.transformer.vocab_size, (1, 6))
+        cache = StaticKVCache.from_config(test_config.transformer, batch_size=1, max_length=8)
+
+        with torch.no_grad():
+            transformer(input_ids, past_key_values=cache, use_cache=True)
+            cache.crop(4)
+            cropped = transformer(input_ids[:, 4:5], past_key_values=cache, use_cache=True)
+            full = transformer(input_ids[:, :5])
+
+        assert cache.get_seq_length() == 5
+        assert torch.allclose(cropped["logits"][:, -1], full["logits"][:, -1], atol=1e-5)
+        with pytest.raises(ValueError):
+            cache.crop(6)
+
+
+class TestPagedKVCache:
+    """Test the block-paged beam search cache."""
+
+    @pytest.fixture
+    def transformer(self, test_config):
+        """Create a small transformer in eval mode."""
+        model = MusicGenTransformer(test_config.transformer)
+        model.eval()
+        return model
+
+    def _write(self, cache, values):
+        """Write one position per row holding ``values`` and advance."""
+        states = torch.tensor(values, dtype=torch.float).view(-1, 1, 1, 1).expand(-1, 1, 1, 2)
+        keys, _ = cache.update(0, states, states)
+        cache.advance(1)
+        return keys[:, 0, :, 0]
+
+    def test_matches_copied_cache_across_reorders(self, transformer, test_config):
+        """Test decoding with beam reorders matches reordering a tuple cache by copying."""
+        torch.manual_seed(0)
+        input_ids = torch.randint(3, test_config.transformer.vocab_size, (3, 7))
+        paged_cache = PagedKVCache.from_config(
+            test_config.transformer, batch_size=3, max_length=8, block_size=2
+        )
+        legacy_cache = None
+
+        with torch.no_grad():
+            for step in range(input_ids.shape[1]):
+                step_ids = input_ids[:, step : step + 1]
+                legacy = transformer(step_ids, past_key_values=legacy_cache, use_cache=True)
+                paged = transformer(step_ids, past_key_values=paged_cache, use_cache=True)
+                assert torch.allclose(legacy["logits"], paged["logits"], atol=1e-5)
+
+                beam_indices = torch.tensor([step % 3, 0, step % 2])
+                legacy_cache = tuple(
+                    tuple(state.index_select(0, beam_indices) for state in layer_past)
+                    for layer_past in legacy["past_key_values"]
+                )
+                paged_cache.reorder_beams(beam_indices)
+
+        for (legacy_k, legacy_v), (paged_k, paged_v) in zip(
+            legacy_cache, paged_cache.to_legacy_cache()
+        ):
+            assert torch.allclose(legacy_k, paged_k)
+            assert torch.allclose(legacy_v, paged_v)
+
+    def test_reorder_shares_blocks_until_written(self):
+        """Test reordered beams reference the same blocks and copy a shared block on write."""
+        cache = PagedKVCache(
+            num_layers=1, batch_size=2, num_heads=1, head_dim=2, max_length=8, block_size=4
+        )
+        self._write(cache, [1, 2])
+        self._write(cache, [3, 4])
+
+        cache.reorder_beams(torch.tensor([0, 0]))
+        assert cache.block_tables[0] == cache.block_tables[1]
+        assert cache.ref_counts[cache.block_tables[0][0]] == 2
+        assert cache.num_free_blocks == cache.num_blocks - 1
+
+        keys = self._write(cache, [5, 6])
+
+        assert cache.block_tables[0] != cache.block_tables[1]
+        assert keys.tolist() == [[1.0, 3.0, 5.0], [1.0, 3.0, 6.0]]
+        assert cache.num_free_blocks == cache.num_blocks - 2
+
+    def test_full_blocks_stay_shared(self):
+        """Test only the partially filled block is copied after a reorder."""
+        cache = PagedKVCache(
+            num_layers=1, batch_size=2, num_heads=1, head_dim=2, max_length=8, block_size=2
+        )
+        for step in range(3):
+            self._write(cache, [step, 10 + step])
+
+        cache.reorder_beams(torch.tensor([1, 1]))
+        self._write(cache, [7, 8])
+
+        assert cache.block_tables[0][0] == cache.block_tables[1][0]
+        assert cache.block_tables[0][1] != cache.block_tables[1][1]
+
+    def test_select_batch_releases_blocks(self):
+        """Test dropping rows returns their blocks to the pool."""
+        cache = PagedKVCache(
+            num_layers=1, batch_size=3, num_heads=1, head_dim=2, max_length=4, block_size=2
+        )
+        self._write(cache, [0, 1, 2])
+        cache.set_cross_attention(0, torch.arange(3.0).view(3, 1, 1, 1), torch.zeros(3, 1, 1, 1))
+
+        cache.select_batch(torch.tensor([2, 0]))
+
+        assert cache.batch_size == 2
+        assert cache.num_free_blocks == cache.num_blocks - 2
+        assert cache.get_cross_attention(0)[0][:, 0, 0, 0].tolist() == [2.0, 0.0]
+        assert cache.to_legacy_cache()[0][0][:, 0, :, 0].tolist() == [[2.0], [0.0]]
+
+    def test_out_of_blocks_raises(self):
+        """Test writing with no free blocks raises."""
+        cache = PagedKVCache(
+            num_layers=1,
+            batch_size=2,
+            num_heads=1,
+            head_dim=2,
+            max_length=4,
+            block_size=2,
+            num_blocks=1,
+        )
+        with pytest.raises(ValueError):
+            self._write(cache, [0, 1])
+
+
+class TestRingKVCache:
+    """Test the rolling streaming cache with attention sinks."""
+
+    def _write(self, cache, value):
+        """Write one position holding ``value`` and advance."""
+        states = torch.full((1, 1, 1, 2), float(value))
+        keys, _ = cache.update(0, states, states)
+        cache.advance(1)
+        return keys[0, 0, :, 0]
+
+    @staticmethod
+    def _rotate(states, position, inv_freq):
+        """Rotate ``states`` at ``position`` the way rotary embeddings do."""
+        freqs = torch.cat((position * inv_freq, position * inv_freq))
+        half = states.shape[-1] // 2
+        rotated = torch.cat((-states[..., half:], states[..., :half]), dim=-1)
+        return states * freqs.cos() + rotated * freqs.sin()
+
+    @pytest.mark.parametrize("use_rotary", [True, False])
+    def test_matches_static_cache_before_wrapping(self, test_config, use_rotary):
+        """Test decoding matches a static cache while everything still fits."""
+        config = copy.deepcopy(test_config.transformer)
+        config.use_rotary_positional_encoding = use_rotary
+        config.use_learned_positional_encoding = not use_rotary
+        transformer = MusicGenTransformer(config)
+        transformer.eval()
+
+        torch.manual_seed(0)
+        input_ids = torch.randint(3, config.vocab_size, (1, 8))
+        static_cache = StaticKVCache.from_config(config, batch_size=1, max_length=8)
+        ring_cache = RingKVCache.from_config(
+            config, batch_size=1, window_length=6, num_sink_tokens=2
+        )
+
+        with torch.no_grad():
+            static = transformer(input_ids[:, :3], past_key_values=static_cache, use_cache=True)
+            ring = transformer(input_ids[:, :3], past_key_values=ring_cache, use_cache=True)
+            assert torch.allclose(static["logits"], ring["logits"], atol=1e-5)
+            for step in range(3, input_ids.shape[1]):
+                step_ids = input_ids[:, step : step + 1]
+                static = transformer(step_ids, past_key_values=static_cache, use_cache=True)
+                ring = transformer(step_ids, past_key_values=ring_cache, use_cache=True)
+                assert torch.allclose(static["logits"], ring["logits"], atol=1e-5)
+
+    def test_keeps_sinks_and_recent_window(self):
+        """Test a full cache evicts the oldest window entry and keeps the sinks."""
+        cache = RingKVCache(
+            num_layers=1, batch_size=1, num_heads=1, head_dim=2, window_length=3, num_sink_tokens=2
+        )
+        buffer_ptr = cache.key_cache[0].data_ptr()
+        for value in range(10):
+            keys = self._write(cache, value)
+
+        assert sorted(keys.tolist()) == [0.0, 1.0, 7.0, 8.0, 9.0]
+        assert cache.to_legacy_cache()[0][0][0, 0, :, 0].tolist() == [0.0, 1.0, 7.0, 8.0, 9.0]
+        assert cache.get_seq_length() == 4
+        assert cache.total_length == 10
+        assert cache.key_cache[0].data_ptr() == buffer_ptr
+
+    def test_rotary_keys_follow_cache_positions(self):
+        """Test rotary keys are re-rotated by their position in the cache as it slides."""
+        cache = RingKVCache(
+            num_layers=1,
+            batch_size=1,
+            num_heads=1,
+            head_dim=4,
+            window_length=3,
+            num_sink_tokens=1,
+            rotary_base=10000.0,
+        )
+        torch.manual_seed(0)
+        raw_keys = torch.randn(9, 4)
+        for raw_key in raw_keys:
+            position = cache.get_seq_length()
+            states = self._rotate(raw_key, position, cache.inv_freq).view(1, 1, 1, 4)
+            cache.update(0, states, states)
+            cache.advance(1)
+
+        kept = torch.cat([raw_keys[:1], raw_keys[-3:]])
+        expected = torch.stack(
+            [self._rotate(key, position, cache.inv_freq) for position, key in enumerate(kept)]
+        )
+        assert torch.allclose(cache.to_legacy_cache()[0][0][0, 0], expected, atol=1e-5)
+
+    def test_full_cache_takes_one_token_per_step(self):
+        """Test a multi-token write into a full cache raises."""
+        cache = RingKVCache(
+            num_layers=1, batch_size=1, num_heads=1, head_dim=2, window_length=2, num_sink_tokens=1
+        )
+        for value in range(3):
+            self._write(cache, value)
+
+        with pytest.raises(ValueError):
+            cache.update(0, torch.zeros(1, 1, 2, 2), torch.zeros(1, 1, 2, 2))
+
+    def test_crop_after_sliding_raises(self):
+        """Test rolling back is refused once positions have been evicted."""
+        cache = RingKVCache(
+            num_layers=1, batch_size=1, num_heads=1, head_dim=2, window_length=2, num_sink_tokens=1
+        )
+        for value in range(3):
+            self._write(cache, value)
+        cache.crop(2)
+        assert cache.get_seq_length() == 2
+
+        for value in range(3):
+            self._write(cache, value)
+        with pytest.raises(ValueError):
+            cache.crop(2)
+
+
+class TestStackedKVCache:
+    """Test batching independent row caches into one decoding step."""
+
+    @pytest.fixture(params=["learned", "rotary"])
+    def transformer(self, request, test_config):
+        """Create a small transformer with learned or rotary positions."""
+        config = copy.deepcopy(test_config.transformer)
+        config.use_rotary_positional_encoding = request.param == "rotary"
+        config.use_learned_positional_encoding = request.param == "learned"
+        model = MusicGenTransformer(config)
+        model.eval()
+        return model
+
+    def test_matches_separate_decoding(self, transformer):
+        """Test a batched step over rows of different lengths matches decoding each row alone."""
+        config = transformer.config
+        torch.manual_seed(0)
+        encoder_lengths = [3, 5]
+        caches, reference_caches = [], []
+        with torch.no_grad():
+            for prompt_length, encoder_length in zip([2, 5], encoder_lengths):
+                prompt = torch.randint(3, config.vocab_size, (1, prompt_length))
+                encoder_states = torch.randn(1, encoder_length, config.text_hidden_size)
+                row_caches = [
+                    RingKVCache.from_config(
+                        config, batch_size=1, window_length=4, num_sink_tokens=1
+                    )
+                    for _ in range(2)
+                ]
+                for cache in row_caches:
+                    transformer(
+                        prompt,
+                        encoder_hidden_states=encoder_states,
+                        past_key_values=cache,
+                        use_cache=True,
+                    )
+                caches.append(row_caches[0])
+                reference_caches.append(row_caches[1])
+
+            for step in range(3):
+                step_ids = torch.randint(3, config.vocab_size, (2, 1))
+                stacked = StackedKVCache(caches)
+                batched = transformer(
+                    step_ids,
+                    attention_mask=stacked.attention_mask(),
+                    encoder_attention_mask=stacked.encoder_attention_mask(),
+                    position_ids=stacked.position_ids(),
+                    past_key_values=stacked,
+                    use_cache=True,
+                )
+                for row, cache in enumerate(reference_caches):
+                    single = transformer(
+                        step_ids[row : row + 1], past_key_values=cache, use_cache=True
+                    )
+                    assert torch.allclose(batched["logits"][row], single["logits"][0], atol=1e-5)
+
+        assert [cache.total_length for cache in caches] == [5, 8]
+        assert stacked.encoder_attention_mask().tolist() == [[1, 1, 1, 0, 0], [1, 1, 1, 1, 1]]
+
+
+class TestIncrementalPositions:
+    """Test cached decoding sees the same positions as a full forward pass."""
+
+    @pytest.fixture(params=["learned", "rotary"])
+    def transformer(self, request, test_config):
+        """Create a small transformer with learned or rotary positions."""
+        config = copy.deepcopy(test_config.transformer)
+        config.use_rotary_positional_encoding = request.param == "rotary"
+        config.use_learned_positional_encoding = request.param == "learned"
+        model = MusicGenTransformer(config)
+        model.eval()
+        return model
+
+    @pytest.mark.parametrize("use_static_cache", [True, False])
+    def test_cached_decode_matches_full_forward(self, transformer, use_static_cache):
+        """Test token-by-token decoding reproduces the uncached logits."""
+        torch.manual_seed(0)
+        input_ids = torch.randint(3, transformer.config.vocab_size, (2, 7))
+
+        with torch.no_grad():
+            full_logits = transformer(input_ids)["logits"]
+
+            past_key_values = None
+            if use_static_cache:
+                past_key_values = StaticKVCache.from_config(
+                    transformer.config, batch_size=2, max_length=8
+                )
+            outputs = transformer(input_ids[:, :3], past_key_values=past_key_values, use_cache=True)
+            step_logits = [outputs["logits"]]
+            for step in range(3, input_ids.shape[1]):
+                outputs = transformer(
+                    input_ids[:, step : step + 1],
+                    past_key_values=outputs["past_key_values"],
+                    use_cache=True,
+                )
+                step_logits.append(outputs["logits"])
+
+        assert torch.allclose(torch.cat(step_logits, dim=1), full_logits, atol=1e-5)
+
+    def test_explicit_position_ids(self, transformer):
+        """Test per-row position ids override the cache offset."""
+        torch.manual_seed(0)
+        input_ids = torch.randint(3, transformer.config.vocab_size, (1, 4))
+
+        with torch.no_grad():
+            expected = transformer(input_ids)["logits"]
+            shifted = transformer(input_ids, position_ids=torch.arange(4).unsqueeze(0))["logits"]
+            moved = transformer(input_ids, position_ids=torch.tensor([[0, 1, 2, 6]]))["logits"]
+
+        assert torch.allclose(shifted, expected, atol=1e-6)
+        assert not torch.allclose(moved[:, -1], expected[:, -1], atol=1e-4)
@@ -2,11 +2,16 @@
 Tests for music_gen.optimization.fast_generator
 """
 
+import threading
+import time
 from unittest.mock import MagicMock, patch
 
 import pytest
+import torch
 
+from music_gen.models.encodec.audio_tokenizer import EnCodecTokenizer
 from music_gen.optimization.fast_generator import *
+from music_gen.optimization.model_cache import model_cache
 
 
 class TestFastGenerator:
@@ -31,3 +36,122 @@ class TestFastGenerator:
         """Test FastMusicGenerator creation."""
         # TODO: Implement test
         pass
+
+
+class TestContinuousBatching:
+    """Test native models decode through the shared scheduler."""
+
+    @staticmethod
+    def _cache_native_model(model, monkeypatch):
+        """Give a tiny native model a (mock-mode) EnCodec tokenizer and put it in the cache."""
+        with patch("music_gen.models.encodec.audio_tokenizer.ENCODEC_AVAILABLE", False):
+            tokenizer = EnCodecTokenizer()
+        tokenizer.num_quantizers = 4
+        model.audio_tokenizer = tokenizer
+        monkeypatch.setitem(model_cache._models, "native-test_cpu", model)
+        monkeypatch.setitem(model_cache._access_counts, "native-test_cpu", 1)
+        return model
+
+    @pytest.fixture
+    def model(self, tiny_musicgen_model, monkeypatch):
+        return self._cache_native_model(tiny_musicgen_model, monkeypatch)
+
+    @pytest.fixture
+    def generator(self, model):
+        generator = FastMusicGenerator(model_name="native-test", device="cpu", warmup=False)
+        yield generator
+        for scheduler in generator._schedulers.values():
+            scheduler.stop()
+
+    def test_scheduler_cache_sized_for_max_duration(self, model):
+        """Test the scheduler preallocates for the longest request, not the model context."""
+        generator = FastMusicGenerator(
+            model_name="native-test", device="cpu", warmup=False, max_duration=1.0
+        )
+        scheduler = generator._get_scheduler(model)
+        scheduler.stop()
+
+        assert scheduler.max_length == model.audio_tokenizer.get_sequence_length(1.0) + 1
+        assert scheduler.max_length < model.config.transformer.max_sequence_length
+
+    def test_generate_batch_shares_decode_batch(self, model, generator, monkeypatch):
+        """Test batch requests for a cached native model run in one decode batch."""
+        # The requests keep the default guidance scale
+        scheduler = generator._get_scheduler(model, guided=True)
+        batch_sizes = []
+        decode_step = scheduler._decode_step
+
+        def recording_decode_step():
+            batch_sizes.append(scheduler.num_active)
+            decode_step()
+
+        monkeypatch.setattr(scheduler, "_decode_step", recording_decode_step)
+        requests = [
+            GenerationRequest(prompt=f"prompt {i}", duration=0.2, request_id=str(i))
+            for i in range(3)
+        ]
+
+        # Hold the decode loop until every request is queued
+        results = []
+        with scheduler._lock:
+            worker = threading.Thread(
+                target=lambda: results.extend(generator.generate_batch(requests))
+            )
+            worker.start()
+            deadline = time.time() + 5.0
+            while scheduler.pending.qsize() < 3 and time.time() < deadline:
+                time.sleep(0.01)
+        worker.join(timeout=30.0)
+
+        assert [result.request_id for result in results] == ["0", "1", "2"]
+        assert all("error" not in (result.metadata or {}) for result in results)
+        assert max(batch_sizes) == 3
+        assert len(batch_sizes) < 3 * model.audio_tokenizer.get_sequence_length(0.2)
+
+    def test_guidance_selects_scheduler(self, model, generator):
+        """Test guided and unguided requests decode on separate schedulers."""
+        result = generator.generate_single("prompt", duration=0.2, guidance_scale=3.0)
+        generator.generate_single("prompt", duration=0.2, guidance_scale=1.0)
+
+        assert set(generator._schedulers) == {True, False}
+        assert generator._schedulers[True].guided
+        assert not generator._schedulers[False].guided
+        assert result.metadata["parameters"]["guidance_scale"] == 3.0
+
+    def test_seed_becomes_request_generator(self, model):
+        """Test a seed gives the scheduler request its own seeded generator."""
+        seeded = FastMusicGenerator._to_decode_request(
+            model, "prompt", 0.2, 1.0, 3.0, 250, 0.0, seed=1234
+        )
+        unseeded = FastMusicGenerator._to_decode_request(model, "prompt", 0.2, 1.0, 3.0, 250, 0.0)
+
+        assert seeded.generator.initial_seed() == 1234
+        assert unseeded.generator is None
+
+    def test_early_eos_result_decodes_whole_frames(self, model, generator, monkeypatch):
+        """Test an early-EOS result drops BOS, EOS and the partial frame before decoding."""
+        sampled = iter([7] * 6 + [model.eos_token_id])
+        monkeypatch.setattr(
+            torch,
+            "multinomial",
+            lambda probs, num_samples, **kwargs: torch.full(
+                (probs.shape[0], num_samples), next(sampled), dtype=torch.long
+            ),
+        )
+
+        result = generator.generate_single("prompt", duration=0.2)
+
+        # Six codes hold one whole frame of four quantizers
+        assert result.audio.shape == (model.audio_tokenizer.hop_length,)
+        assert "error" not in (result.metadata or {})
+
+    def test_delay_pattern_model_bypasses_scheduler(self, tiny_delay_musicgen_model, monkeypatch):
+        """Test delay-pattern models generate directly instead of through the scheduler."""
+        model = self._cache_native_model(tiny_delay_musicgen_model, monkeypatch)
+        generator = FastMusicGenerator(model_name="native-test", device="cpu", warmup=False)
+
+        result = generator.generate_single("prompt", duration=0.2)
+
+        num_frames = model.audio_tokenizer.get_sequence_length(0.2) // 4
+        assert not generator._schedulers
+        assert result.audio.shape == (num_frames * model.audio_tokenizer.hop_length,)
@@ -0,0 +1,291 @@
+"""
+Tests for music_gen.generation.logits_process
+"""
+
+import pytest
+import torch
+import torch.nn.functional as F
+
+from music_gen.configs.config import InferenceConfig
+from music_gen.generation.logits_process import (
+    ClassifierFreeGuidanceLogitsProcessor,
+    LogitsProcessorList,
+    MinLengthLogitsProcessor,
+    NoRepeatNGramLogitsProcessor,
+    TemperatureLogitsWarper,
+    TopKLogitsWarper,
+    TypicalLogitsWarper,
+    apply_repetition_penalty,
+    apply_top_k_filtering,
+    apply_top_p_filtering,
+    apply_typical_filtering,
+    build_logits_processor,
+    build_logits_processor_from_config,
+)
+
+
+def _reference_repetition_penalty(scores, input_ids, penalty):
+    scores = scores.clone()
+    for i in range(scores.shape[0]):
+        for previous_token in set(input_ids[i].tolist()):
+            if scores[i, previous_token] < 0:
+                scores[i, previous_token] *= penalty
+            else:
+                scores[i, previous_token] /= penalty
+    return scores
+
+
+def _reference_top_p(scores, top_p):
+    scores = scores.clone()
+    sorted_logits, sorted_indices = torch.sort(scores, descending=True, dim=-1)
+    cumulative_probs = torch.cumsum(F.softmax(sorted_logits, dim=-1), dim=-1)
+    sorted_indices_to_remove = cumulative_probs > top_p
+    sorted_indices_to_remove[..., 1:] = sorted_indices_to_remove[..., :-1].clone()
+    sorted_indices_to_remove[..., 0] = 0
+    for i in range(scores.shape[0]):
+        scores[i][sorted_indices[i][sorted_indices_to_remove[i]]] = -float("inf")
+    return scores
+
+
+class TestRepetitionPenalty:
+    """Test batched repetition penalty."""
+
+    def test_matches_reference(self):
+        """Test the batched penalty matches the per-row loop exactly."""
+        torch.manual_seed(0)
+        scores = torch.randn(4, 32)
+        input_ids = torch.randint(0, 32, (4, 20))
+
+        result = apply_repetition_penalty(scores, input_ids, 1.3)
+
+        assert torch.equal(result, _reference_repetition_penalty(scores, input_ids, 1.3))
+
+    def test_does_not_modify_input(self):
+        """Test scores are not modified in place."""
+        scores = torch.ones(1, 8)
+        result = apply_repetition_penalty(scores, torch.tensor([[3, 3, 5]]), 2.0)
+
+        assert torch.all(scores == 1.0)
+        assert result[0, 3] == 0.5
+        assert result[0, 4] == 1.0
+
+    def test_no_penalty_is_identity(self):
+        """Test a penalty of 1.0 returns scores unchanged."""
+        scores = torch.randn(2, 8)
+        assert apply_repetition_penalty(scores, torch.tensor([[1], [2]]), 1.0) is scores
+
+
+class TestTopKTopP:
+    """Test batched top-k and nucleus filtering."""
+
+    def test_top_p_matches_reference(self):
+        """Test nucleus filtering matches the per-row loop exactly."""
+        torch.manual_seed(0)
+        scores = torch.randn(6, 64) * 3
+
+        for top_p in [0.1, 0.5, 0.9, 0.99]:
+            assert torch.equal(
+                apply_top_p_filtering(scores, top_p), _reference_top_p(scores, top_p)
+            )
+
+    def test_top_p_keeps_best_token(self):
+        """Test the most likely token always survives."""
+        scores = torch.tensor([[10.0, 0.0, -1.0]])
+        result = apply_top_p_filtering(scores, 0.01)
+
+        assert result[0, 0] == 10.0
+        assert torch.isinf(result[0, 1:]).all()
+
+    def test_top_k(self):
+        """Test top-k keeps exactly k tokens per row."""
+        torch.manual_seed(0)
+        scores = torch.randn(3, 16)
+        result = apply_top_k_filtering(scores, 4)
+
+        assert (torch.isfinite(result).sum(dim=-1) == 4).all()
+
+
+class TestTypicalFiltering:
+    """Test locally typical filtering."""
+
+    def test_keeps_typical_tokens(self):
+        """Test tokens far from the expected surprisal are removed first."""
+        # One dominant token and many near-uniform ones: the dominant token is
+        # atypical (much lower surprisal than the entropy)
+        scores = torch.tensor([[8.0] + [0.0] * 15])
+        probs = F.softmax(scores, dim=-1)
+
+        result = apply_typical_filtering(scores, 0.2)
+        kept = torch.isfinite(result[0])
+
+        assert kept.sum() >= 1
+        assert probs[0][kept].sum() >= 0.2 or kept.sum() == 1
+
+    def test_full_mass_is_identity(self):
+        """Test typical_p=1.0 keeps every token."""
+        scores = torch.randn(2, 10)
+        assert torch.equal(apply_typical_filtering(scores, 1.0), scores)
+
+    def test_ignores_masked_tokens(self):
+        """Test tokens already at -inf do not produce NaNs."""
+        scores = torch.tensor([[1.0, 0.5, -float("inf"), 0.2]])
+        result = TypicalLogitsWarper(0.9)(None, scores.clone())
+
+        assert not torch.isnan(result).any()
+        assert torch.isinf(result[0, 2])
+
+    def test_invalid_mass(self):
+        """Test typical_p outside (0, 1] is rejected."""
+        with pytest.raises(ValueError):
+            TypicalLogitsWarper(0.0)
+
+
+class TestLogitsProcessorList:
+    """Test the composed processing pipeline."""
+
+    def test_does_not_modify_model_scores(self):
+        """Test the pipeline works on its own copy of the scores."""
+        scores = torch.ones(2, 8)
+        processors = LogitsProcessorList([TemperatureLogitsWarper(2.0)])
+
+        result = processors(torch.zeros(2, 1, dtype=torch.long), scores)
+
+        assert torch.all(scores == 1.0)
+        assert torch.all(result == 0.5)
+
+    def test_reuses_work_buffer(self):
+        """Test consecutive steps write into the same buffer."""
+        processors = LogitsProcessorList([TopKLogitsWarper(2)])
+        input_ids = torch.zeros(2, 1, dtype=torch.long)
+
+        first = processors(input_ids, torch.randn(2, 8))
+        second = processors(input_ids, torch.randn(2, 8))
+        assert first.data_ptr() == second.data_ptr()
+
+        # A new batch shape reallocates
+        third = processors(input_ids[:1], torch.randn(1, 8))
+        assert third.shape == (1, 8)
+
+    def test_empty_pipeline_passthrough(self):
+        """Test an empty pipeline returns scores unchanged."""
+        scores = torch.randn(1, 4)
+        assert LogitsProcessorList()(None, scores) is scores
+
+    def test_matches_reference_sampling_stage(self):
+        """Test the sampling pipeline matches penalty, temperature, top-k and top-p in order."""
+        torch.manual_seed(0)
+        scores = torch.randn(3, 40) * 2
+        input_ids = torch.randint(0, 40, (3, 12))
+
+        expected = _reference_repetition_penalty(scores, input_ids, 1.2) / 0.8
+        expected = apply_top_k_filtering(expected, 10)
+        expected = _reference_top_p(expected, 0.9)
+
+        processors = build_logits_processor(
+            temperature=0.8, top_k=10, top_p=0.9, repetition_penalty=1.2
+        )
+        assert torch.equal(processors(input_ids, scores), expected)
+
+    def test_greedy_skips_filtering(self):
+        """Test greedy decoding only keeps the repetition penalty."""
+        processors = build_logits_processor(
+            temperature=0.5, top_k=10, top_p=0.9, repetition_penalty=1.2, do_sample=False
+        )
+        assert len(processors) == 1
+
+    def test_from_inference_config(self):
+        """Test InferenceConfig sampling switches are honoured."""
+        config = InferenceConfig(use_typical_sampling=True, typical_p=0.8)
+        processors = build_logits_processor_from_config(config)
+        assert isinstance(processors[-1], TypicalLogitsWarper)
+        assert processors[-1].typical_p == 0.8
+
+        config = InferenceConfig(use_nucleus_sampling=False)
+        processors = build_logits_processor_from_config(config)
+        assert not any(isinstance(p, TypicalLogitsWarper) for p in processors)
+        assert all(type(p).__name__ != "TopPLogitsWarper" for p in processors)
+
+
+class TestClassifierFreeGuidance:
+    """Test combining a doubled batch of conditional and unconditional scores."""
+
+    def test_combines_halves(self):
+        """Test guided scores extrapolate from the unconditional rows."""
+        cond, uncond = torch.randn(2, 8), torch.randn(2, 8)
+        processor = ClassifierFreeGuidanceLogitsProcessor(3.0)
+
+        result = processor(torch.zeros(2, 1, dtype=torch.long), torch.cat([cond, uncond]))
+
+        assert result.shape == (2, 8)
+        torch.testing.assert_close(result, uncond + 3.0 * (cond - uncond))
+
+    def test_runs_before_other_stages(self):
+        """Test later stages see the guided scores of the original batch."""
+        input_ids = torch.tensor([[1, 2], [3, 3]])
+        scores = torch.randn(4, 8)
+        processors = build_logits_processor(
+            repetition_penalty=1.5, temperature=0.5, top_k=0, top_p=1.0, guidance_scale=2.0
+        )
+
+        cond, uncond = scores.chunk(2)
+        expected = _reference_repetition_penalty(uncond + 2.0 * (cond - uncond), input_ids, 1.5)
+        torch.testing.assert_close(processors(input_ids, scores), expected / 0.5)
+
+    def test_rejects_undoubled_batch(self):
+        """Test a batch without unconditional rows is refused."""
+        with pytest.raises(ValueError):
+            ClassifierFreeGuidanceLogitsProcessor(3.0)(torch.zeros(2, 1), torch.randn(2, 8))
+        with pytest.raises(ValueError):
+            ClassifierFreeGuidanceLogitsProcessor(0.0)
+
+
+class TestBeamSearchStages:
+    """Test stages used only by beam search."""
+
+    def test_min_length_bans_eos(self):
+        """Test EOS is banned until min_length is reached."""
+        processor = MinLengthLogitsProcessor(min_length=3, eos_token_id=2)
+
+        short = processor(torch.zeros(1, 2, dtype=torch.long), torch.zeros(1, 5))
+        long = processor(torch.zeros(1, 3, dtype=torch.long), torch.zeros(1, 5))
+
+        assert torch.isinf(short[0, 2])
+        assert long[0, 2] == 0.0
+
+    def test_no_repeat_ngram(self):
+        """Test a token completing a seen bigram is banned."""
+        processor = NoRepeatNGramLogitsProcessor(ngram_size=2)
+        input_ids = torch.tensor([[4, 5, 6, 4]])
+
+        scores = processor(input_ids, torch.zeros(1, 8))
+
+        assert torch.isinf(scores[0, 5])
+        assert torch.isfinite(scores[0, [0, 1, 2, 3, 4, 6, 7]]).all()
+
+    def test_no_repeat_ngram_incremental_matches_rescan(self):
+        """Test the incremental index bans what a fresh rescan bans, across beam reorders."""
+        torch.manual_seed(0)
+        processor = NoRepeatNGramLogitsProcessor(ngram_size=3)
+        input_ids = torch.randint(0, 4, (3, 2))
+
+        for step in range(20):
+            if step % 3 == 2:
+                beam_indices = torch.tensor([1, 1, 0])
+                input_ids = input_ids[beam_indices]
+                processor.reorder(beam_indices)
+
+            scores = processor(input_ids, torch.zeros(3, 4))
+            expected = NoRepeatNGramLogitsProcessor(ngram_size=3)(input_ids, torch.zeros(3, 4))
+
+            assert torch.equal(scores, expected)
+            input_ids = torch.cat([input_ids, torch.randint(0, 4, (3, 1))], dim=-1)
+
+    def test_no_repeat_ngram_rebuilds_on_new_history(self):
+        """Test a history that does not extend the indexed one rebuilds the index."""
+        processor = NoRepeatNGramLogitsProcessor(ngram_size=2)
+        processor(torch.tensor([[4, 5, 6, 4]]), torch.zeros(1, 8))
+
+        scores = processor(torch.tensor([[1, 2, 1], [3, 3, 3]]), torch.zeros(2, 8))
+
+        assert torch.isinf(scores[0, 2]) and torch.isfinite(scores[0, 5])
+        assert torch.isinf(scores[1, 3])
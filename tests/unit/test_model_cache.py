@@ -36,3 +36,49 @@ class TestModelCache:
         """Test ModelCache creation."""
         # TODO: Implement test
         pass
+
+
+class TestNativeCheckpoints:
+    """Test native MusicGenModel checkpoints load into the cache."""
+
+    def test_detects_native_checkpoint(self, tiny_musicgen_model, tmp_path):
+        """Test saved native models are told apart from Hugging Face checkpoints."""
+        tiny_musicgen_model.save_pretrained(str(tmp_path / "native"))
+        hf_dir = tmp_path / "hf"
+        hf_dir.mkdir()
+        (hf_dir / "config.json").write_text('{"model_type": "musicgen", "decoder": {}}')
+        (hf_dir / "pytorch_model.bin").write_bytes(b"")
+
+        assert is_native_checkpoint(str(tmp_path / "native"))
+        assert not is_native_checkpoint(str(hf_dir))
+        assert not is_native_checkpoint("facebook/musicgen-small")
+
+    def test_loads_native_checkpoint(self, tiny_musicgen_model, test_config, tmp_path):
+        """Test the cache loads a native checkpoint as a MusicGenModel."""
+        import torch
+
+        from music_gen.models.musicgen import MusicGenModel
+        from tests.conftest import FakeTextEncoder
+
+        tiny_musicgen_model.save_pretrained(str(tmp_path))
+        cache = ModelCache()
+        key = f"{tmp_path}_cpu"
+
+        with patch("music_gen.models.musicgen.EnCodecTokenizer", return_value=MagicMock()), patch(
+            "music_gen.models.musicgen.MultiModalEncoder",
+            lambda **kwargs: FakeTextEncoder(
+                test_config.transformer.text_hidden_size, test_config.transformer.conditioning_dim
+            ),
+        ):
+            try:
+                model = cache.get_model(str(tmp_path), "cpu")
+            finally:
+                cache._models.pop(key, None)
+                cache._load_times.pop(key, None)
+                cache._access_counts.pop(key, None)
+
+        assert isinstance(model, MusicGenModel)
+        assert not model.training
+        expected = tiny_musicgen_model.state_dict()
+        for name, value in model.state_dict().items():
+            assert torch.equal(value, expected[name])
@@ -9,6 +9,7 @@ import torch
 
 from music_gen.models.encoders import MultiModalEncoder, T5TextEncoder
 from music_gen.models.musicgen import MusicGenModel, create_musicgen_model
+from music_gen.models.transformer.cache import StaticKVCache
 from music_gen.models.transformer.config import MusicGenConfig, TransformerConfig
 from music_gen.models.transformer.model import (
     MultiHeadAttention,
@@ -104,6 +105,90 @@ class TestTransformerComponents:
         assert outputs["logits"].shape == (batch_size, seq_len, config.vocab_size)
         assert "hidden_states" in outputs
 
+    def test_causal_prefill_and_decode_skip_mask(self, test_config):
+        """Test prefill runs causally and single-token decoding without a mask."""
+        prepare = MusicGenTransformer._prepare_attention_mask
+
+        assert prepare(None, 6, 0, torch.float32, None) == (None, True)
+        assert prepare(None, 1, 5, torch.float32, None) == (None, False)
+
+        mask, is_causal = prepare(torch.ones(2, 6), 1, 5, torch.float32, None)
+        assert mask.shape == (2, 1, 1, 6)
+        assert not is_causal
+
+    def test_padding_mask_matches_unpadded(self, test_config):
+        """Test padded rows see the same logits as running them unpadded."""
+        model = MusicGenTransformer(test_config.transformer)
+        model.eval()
+
+        torch.manual_seed(0)
+        input_ids = torch.randint(3, test_config.transformer.vocab_size, (2, 6))
+        attention_mask = torch.ones(2, 6, dtype=torch.long)
+        attention_mask[1, 4:] = 0
+
+        with torch.no_grad():
+            padded = model(input_ids, attention_mask=attention_mask)["logits"]
+            full = model(input_ids[:1])["logits"]
+            short = model(input_ids[1:, :4])["logits"]
+
+        assert torch.allclose(padded[0], full[0], atol=1e-5)
+        assert torch.allclose(padded[1, :4], short[0], atol=1e-5)
+
+    def test_multi_token_step_on_cache(self, test_config):
+        """Test feeding several tokens on top of a cache stays causal."""
+        model = MusicGenTransformer(test_config.transformer)
+        model.eval()
+
+        torch.manual_seed(0)
+        input_ids = torch.randint(3, test_config.transformer.vocab_size, (2, 7))
+
+        with torch.no_grad():
+            full = model(input_ids)["logits"]
+            prefix = model(input_ids[:, :3], use_cache=True)
+            rest = model(
+                input_ids[:, 3:], past_key_values=prefix["past_key_values"], use_cache=True
+            )["logits"]
+
+        assert torch.allclose(rest, full[:, 3:], atol=1e-5)
+
+    @pytest.mark.parametrize("use_cache", [False, True])
+    def test_encoder_padding_mask(self, test_config, use_cache):
+        """Test padded encoder positions are ignored by cross-attention."""
+        model = MusicGenTransformer(test_config.transformer)
+        model.eval()
+
+        torch.manual_seed(0)
+        input_ids = torch.randint(3, test_config.transformer.vocab_size, (2, 3))
+        encoder_states = torch.randn(2, 7, test_config.transformer.text_hidden_size)
+        encoder_mask = torch.ones(2, 7, dtype=torch.long)
+        encoder_mask[1, 3:] = 0
+
+        with torch.no_grad():
+            if use_cache:
+                cache = StaticKVCache.from_config(test_config.transformer, 2, max_length=3)
+                model(
+                    input_ids[:, :2],
+                    encoder_hidden_states=encoder_states,
+                    encoder_attention_mask=encoder_mask,
+                    past_key_values=cache,
+                    use_cache=True,
+                )
+                padded = model(
+                    input_ids[:, 2:],
+                    encoder_attention_mask=encoder_mask,
+                    past_key_values=cache,
+                    use_cache=True,
+                )["logits"][:, -1]
+            else:
+                padded = model(
+                    input_ids,
+                    encoder_hidden_states=encoder_states,
+                    encoder_attention_mask=encoder_mask,
+                )["logits"][:, -1]
+            short = model(input_ids[1:], encoder_hidden_states=encoder_states[1:, :3])["logits"]
+
+        assert torch.allclose(padded[1], short[0, -1], atol=1e-5)
+
 
 @pytest.mark.unit
 class TestEncoders:
@@ -158,6 +243,52 @@ class TestEncoders:
         expected_dim = 64 * 2  # genre_embedding_dim + tempo_embedding_dim
         assert output.shape[1] == expected_dim
 
+    def test_t5_length_buckets(self):
+        """Test bucketed T5 calls match one padded call on the unpadded positions."""
+        from transformers import T5Config, T5EncoderModel
+
+        class CharTokenizer:
+            def __call__(self, texts, max_length, padding, truncation, return_tensors):
+                ids = [[3 + ord(c) % 50 for c in text][:max_length] + [1] for text in texts]
+                width = max(len(row) for row in ids)
+                return {
+                    "input_ids": torch.tensor([row + [0] * (width - len(row)) for row in ids]),
+                    "attention_mask": torch.tensor(
+                        [[1] * len(row) + [0] * (width - len(row)) for row in ids]
+                    ),
+                }
+
+        torch.manual_seed(0)
+        t5 = T5EncoderModel(
+            T5Config(vocab_size=64, d_model=32, d_kv=8, d_ff=64, num_layers=2, num_heads=4)
+        ).eval()
+        with patch(
+            "music_gen.models.encoders.T5EncoderModel.from_pretrained", return_value=t5
+        ), patch(
+            "music_gen.models.encoders.T5Tokenizer.from_pretrained", return_value=CharTokenizer()
+        ):
+            bucketed = T5TextEncoder(length_buckets=[4, 8, 16])
+            single = T5TextEncoder(length_buckets=None)
+
+        texts = ["ab", "a much longer prompt than the others", "abcdef", "x"]
+        widths = []
+        hook = t5.register_forward_hook(
+            lambda module, inputs, output: widths.append(output.last_hidden_state.shape[1])
+        )
+        try:
+            expected = single.encode_text(texts, torch.device("cpu"))
+            widths.clear()
+            outputs = bucketed.encode_text(texts, torch.device("cpu"))
+        finally:
+            hook.remove()
+
+        valid = outputs["attention_mask"].bool()
+        assert sorted(widths) == [3, 7, 37]
+        assert outputs["hidden_states"].shape == expected["hidden_states"].shape
+        assert torch.allclose(
+            outputs["hidden_states"][valid], expected["hidden_states"][valid], atol=1e-5
+        )
+
     @pytest.mark.model
     def test_t5_text_encoder(self):
         """Test T5 text encoder (requires model download)."""
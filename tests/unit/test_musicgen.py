@@ -8,7 +8,9 @@ import pytest
 import torch
 import torch.nn as nn
 
+from music_gen.generation.progress import CancellationToken
 from music_gen.models.musicgen import *
+from music_gen.utils.exceptions import GenerationCancelled
 
 
 class TestMusicgenModel:
@@ -55,3 +57,338 @@ class TestMusicgenModel:
                     assert "logits" in output
         except Exception as e:
             pytest.skip(f"MusicGenModel forward test failed (expected in test env): {e}")
+
+
+class TestMusicGenGenerate:
+    """Test the native sampling loop."""
+
+    def test_finished_rows_leave_the_batch(self, tiny_musicgen_model):
+        """Test rows stop at EOS, are padded, and the others are unaffected."""
+        model = tiny_musicgen_model
+        prompts = ["a b c", "d", "e f g h"]
+        reference = model.generate(prompts, max_length=24, do_sample=False)
+
+        # Make row 1 finish early
+        model.eos_token_id = int(reference[1, 4])
+        batch_sizes = []
+        hook = model.transformer.register_forward_hook(
+            lambda module, inputs, output: batch_sizes.append(output["logits"].shape[0])
+        )
+        try:
+            result = model.generate(prompts, max_length=24, do_sample=False)
+        finally:
+            hook.remove()
+
+        for row in range(len(prompts)):
+            eos_hits = (reference[row] == model.eos_token_id).nonzero()
+            if len(eos_hits) == 0:
+                assert torch.equal(result[row], reference[row])
+                continue
+            end = eos_hits[0].item() + 1
+            assert torch.equal(result[row, :end], reference[row, :end])
+            assert torch.all(result[row, end:] == model.pad_token_id)
+
+        assert batch_sizes[0] == 3
+        assert min(batch_sizes) < 3
+
+    def test_static_and_dynamic_cache_agree(self, tiny_musicgen_model):
+        """Test compaction works the same with both cache formats."""
+        model = tiny_musicgen_model
+        prompts = ["a b c", "d", "e f g h"]
+        reference = model.generate(prompts, max_length=16, do_sample=False)
+        model.eos_token_id = int(reference[0, 3])
+
+        static = model.generate(prompts, max_length=16, do_sample=False)
+        dynamic = model.generate(prompts, max_length=16, do_sample=False, use_static_cache=False)
+
+        assert torch.equal(static, dynamic)
+
+
+class TestPrefixCacheGenerate:
+    """Test generate with the prompt prefix cache."""
+
+    @pytest.mark.parametrize("use_static_cache", [True, False])
+    def test_cached_prompt_reproduces_output(self, tiny_musicgen_model, use_static_cache):
+        """Test a cache hit skips the encoder and BOS step without changing the tokens."""
+        model = tiny_musicgen_model
+        prompts = ["calm piano", "upbeat electronic dance track"]
+        kwargs = {"max_length": 12, "top_k": 5, "use_static_cache": use_static_cache}
+
+        torch.manual_seed(0)
+        reference = model.generate(prompts, **kwargs)
+
+        model.enable_prefix_cache()
+        torch.manual_seed(0)
+        first = model.generate(prompts, **kwargs)
+
+        num_forwards = []
+        hook = model.transformer.register_forward_hook(
+            lambda module, inputs, output: num_forwards.append(1)
+        )
+        with patch.object(model, "prepare_inputs") as prepare_inputs:
+            try:
+                torch.manual_seed(0)
+                second = model.generate(prompts, **kwargs)
+            finally:
+                hook.remove()
+
+        assert torch.equal(first, reference)
+        assert torch.equal(second, reference)
+        prepare_inputs.assert_not_called()
+        assert len(num_forwards) == reference.shape[1] - 2
+        assert model.prefix_cache.get_stats()["hits"] == 1
+
+    def test_key_covers_conditioning_and_version(self, tiny_musicgen_model):
+        """Test different conditioning or weights never share an entry."""
+        model = tiny_musicgen_model
+        model.enable_prefix_cache()
+        device = torch.device("cpu")
+
+        key = model.prefix_cache_key(["calm piano"], device, genre_ids=torch.tensor([1]))
+        assert key == model.prefix_cache_key(["calm piano"], device, genre_ids=torch.tensor([1]))
+        assert key != model.prefix_cache_key(["calm piano"], device, genre_ids=torch.tensor([2]))
+
+        model.model_version = "v2"
+        assert key != model.prefix_cache_key(["calm piano"], device, genre_ids=torch.tensor([1]))
+
+        model.train()
+        assert model.prefix_cache_key(["calm piano"], device) is None
+
+
+class TestClassifierFreeGuidanceGenerate:
+    """Test classifier-free guidance in the native sampling loop."""
+
+    def test_single_pass_over_doubled_batch(self, tiny_musicgen_model):
+        """Test conditional and unconditional rows share one transformer call per step."""
+        model = tiny_musicgen_model
+        batch_sizes = []
+        hook = model.transformer.register_forward_hook(
+            lambda module, inputs, output: batch_sizes.append(output["logits"].shape[0])
+        )
+        try:
+            tokens = model.generate(["a b", "c d e"], max_length=8, guidance_scale=3.0)
+        finally:
+            hook.remove()
+
+        assert tokens.shape[0] == 2
+        assert len(batch_sizes) == tokens.shape[1] - 1
+        assert batch_sizes[0] == 4
+
+    def test_matches_separate_passes(self, tiny_musicgen_model):
+        """Test guided greedy decoding equals combining separate conditional/null passes."""
+        model = tiny_musicgen_model
+        scale, max_length = 3.0, 8
+        device = torch.device("cpu")
+        conditional = model.prepare_inputs(["a b c"], device)
+        unconditional = model.prepare_inputs([""], device)
+
+        sequence = torch.full((1, 1), model.bos_token_id)
+        with torch.no_grad():
+            for _ in range(max_length - 1):
+                cond_logits, uncond_logits = (
+                    model.transformer(
+                        sequence,
+                        encoder_hidden_states=inputs["text_hidden_states"],
+                        conditioning_embeddings=inputs["conditioning_embeddings"],
+                    )["logits"][:, -1]
+                    for inputs in (conditional, unconditional)
+                )
+                guided = uncond_logits + scale * (cond_logits - uncond_logits)
+                sequence = torch.cat([sequence, guided.argmax(-1, keepdim=True)], dim=-1)
+                if sequence[0, -1] == model.eos_token_id:
+                    break
+
+        for use_static_cache in (True, False):
+            tokens = model.generate(
+                ["a b c"],
+                max_length=max_length,
+                do_sample=False,
+                repetition_penalty=1.0,
+                guidance_scale=scale,
+                use_static_cache=use_static_cache,
+            )
+            assert torch.equal(tokens[:, : sequence.shape[1]], sequence)
+
+    def test_unconditional_inputs_cached(self, tiny_musicgen_model):
+        """Test the null prompt is encoded once across calls."""
+        model = tiny_musicgen_model
+        encoded = []
+        hook = model.multimodal_encoder.register_forward_hook(
+            lambda module, inputs, output: encoded.append(inputs)
+        )
+        try:
+            model.generate(["a"], max_length=4, guidance_scale=3.0)
+            model.generate(["b"], max_length=4, guidance_scale=3.0)
+            model.generate(
+                ["c"], max_length=4, guidance_scale=3.0, cache_unconditional_inputs=False
+            )
+        finally:
+            hook.remove()
+
+        assert len(encoded) == 5
+        assert "cpu" in model._unconditional_inputs
+
+        model.train()
+        assert not model._unconditional_inputs
+
+    def test_beam_search_rejected(self, tiny_musicgen_model):
+        """Test guidance is refused where it is not supported."""
+        with pytest.raises(ValueError):
+            tiny_musicgen_model.generate(["a"], max_length=8, num_beams=2, guidance_scale=3.0)
+
+
+class TestGenerateProgress:
+    """Test progress callbacks and cancellation in the native sampling loop."""
+
+    def test_reports_every_step(self, tiny_musicgen_model):
+        """Test the callback sees one report per generated token."""
+        model = tiny_musicgen_model
+        model.eos_token_id = -1  # Never stop early
+        reports = []
+
+        tokens = model.generate(["a b"], max_length=10, progress_callback=reports.append)
+
+        assert tokens.shape[1] == 10
+        assert [report.tokens_done for report in reports] == list(range(1, 10))
+        assert all(report.total_tokens == 9 for report in reports)
+
+    def test_cancel_between_steps(self, tiny_musicgen_model):
+        """Test cancellation stops generation at the next step."""
+        model = tiny_musicgen_model
+        model.eos_token_id = -1
+        token = CancellationToken()
+        steps = []
+
+        def cancel_after_three(progress):
+            steps.append(progress.tokens_done)
+            if progress.tokens_done == 3:
+                token.cancel()
+
+        with pytest.raises(GenerationCancelled):
+            model.generate(
+                ["a b"],
+                max_length=50,
+                progress_callback=cancel_after_three,
+                cancellation_token=token,
+            )
+        assert steps == [1, 2, 3]
+
+        # Already cancelled requests do not start
+        with pytest.raises(GenerationCancelled):
+            model.generate(["a b"], max_length=50, cancellation_token=token)
+
+    def test_beam_search_cancel(self, tiny_musicgen_model):
+        """Test beam search checks the token too."""
+        token = CancellationToken()
+        token.cancel()
+        with pytest.raises(GenerationCancelled):
+            tiny_musicgen_model.generate(["a"], max_length=8, num_beams=2, cancellation_token=token)
+
+
+class TestDiverseBeamSearchGenerate:
+    """Test group beam search through the model entry point."""
+
+    def test_diverse_candidates_in_one_batched_pass(self, tiny_musicgen_model):
+        """Test every prompt gets distinct candidates while all beams share each forward pass."""
+        model = tiny_musicgen_model
+        batch_sizes = []
+        hook = model.transformer.register_forward_hook(
+            lambda module, inputs, output: batch_sizes.append(output["logits"].shape[0])
+        )
+        try:
+            tokens = model.generate_with_beam_search(
+                ["a b", "c d e"],
+                num_beams=4,
+                num_beam_groups=2,
+                diversity_penalty=5.0,
+                num_return_sequences=2,
+                max_length=8,
+            )
+        finally:
+            hook.remove()
+
+        assert tokens.shape[0] == 4
+        assert set(batch_sizes) == {8}
+        for candidates in tokens.view(2, 2, -1):
+            assert not torch.equal(candidates[0], candidates[1])
+
+
+class TestPagedBeamSearchGenerate:
+    """Test beam search decoding into a block-paged cache."""
+
+    @pytest.mark.parametrize("num_beam_groups", [1, 2])
+    def test_matches_copied_cache(self, tiny_musicgen_model, num_beam_groups):
+        """Test paged and copied beam caches produce the same sequences."""
+        outputs = []
+        for use_paged_cache in (False, True):
+            torch.manual_seed(0)
+            outputs.append(
+                tiny_musicgen_model.generate_with_beam_search(
+                    ["a b", "c d e"],
+                    num_beams=4,
+                    num_beam_groups=num_beam_groups,
+                    diversity_penalty=1.0,
+                    max_length=24,
+                    use_paged_cache=use_paged_cache,
+                )
+            )
+
+        assert torch.equal(outputs[0], outputs[1])
+
+
+class TestDelayPatternGenerate:
+    """Test generation with the delay codebook pattern."""
+
+    def test_one_step_per_frame(self, tiny_delay_musicgen_model):
+        """Test all codebooks of a frame come from one forward pass."""
+        model = tiny_delay_musicgen_model
+        calls = []
+        hook = model.transformer.register_forward_hook(
+            lambda module, inputs, output: calls.append(output["logits"].shape)
+        )
+        try:
+            codes = model.generate(["a b", "c d e"], max_length=12, top_k=5)
+        finally:
+            hook.remove()
+
+        assert codes.shape == (2, 4, 8)
+        assert len(calls) == 11
+        assert calls[0] == (2, 4, 1, model.config.transformer.vocab_size)
+        assert codes.max() < model.config.transformer.vocab_size
+
+    def test_matches_uncached_decoding(self, tiny_delay_musicgen_model):
+        """Test cached delayed decoding equals greedy decoding over full forward passes."""
+        model = tiny_delay_musicgen_model
+        num_codebooks, max_length = 4, 9
+        special = model.transformer.special_token_id
+        encoder_outputs = model.prepare_inputs(["a b"], torch.device("cpu"))
+
+        sequence = torch.full((1, num_codebooks, 1), model.bos_token_id)
+        with torch.no_grad():
+            for step in range(1, max_length):
+                logits = model.transformer(
+                    sequence,
+                    encoder_hidden_states=encoder_outputs["text_hidden_states"],
+                    conditioning_embeddings=encoder_outputs["conditioning_embeddings"],
+                )["logits"]
+                next_tokens = logits[:, :, -1].argmax(-1)
+                for codebook in range(num_codebooks):
+                    if not 0 <= step - 1 - codebook < max_length - num_codebooks:
+                        next_tokens[:, codebook] = special
+                sequence = torch.cat([sequence, next_tokens.unsqueeze(-1)], dim=-1)
+        expected = EnCodecTokenizer.revert_delay_pattern(sequence[:, :, 1:])
+
+        for use_static_cache in (True, False):
+            codes = model.generate(
+                ["a b"],
+                max_length=max_length,
+                do_sample=False,
+                repetition_penalty=1.0,
+                use_static_cache=use_static_cache,
+            )
+            assert torch.equal(codes, expected)
+
+    def test_beam_search_rejected(self, tiny_delay_musicgen_model):
+        """Test flattened-only decoding modes refuse the delay pattern."""
+        with pytest.raises(ValueError):
+            tiny_delay_musicgen_model.generate(["a"], max_length=8, num_beams=2)
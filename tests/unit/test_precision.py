@@ -0,0 +1,55 @@
+"""
+Tests for music_gen.optimization.precision
+"""
+
+import pytest
+import torch
+
+from music_gen.optimization.precision import check_inference_precision
+
+PROMPTS = ["warm jazz", "a b c", "dark ambient drone"]
+
+
+class TestInferencePrecision:
+    """Test bf16 / int8 inference modes against fp32."""
+
+    def test_rejects_unknown_precision(self, tiny_musicgen_model):
+        """Test unsupported precisions are refused."""
+        with pytest.raises(ValueError):
+            tiny_musicgen_model.set_inference_precision("fp8")
+
+    def test_fp32_is_exact(self, tiny_musicgen_model):
+        """Test the accuracy check reports no drift for an fp32 copy."""
+        metrics = check_inference_precision(tiny_musicgen_model, "fp32", PROMPTS, num_tokens=16)
+
+        assert metrics["kl_divergence"] == pytest.approx(0.0, abs=1e-7)
+        assert metrics["top1_agreement"] == 1.0
+
+    @pytest.mark.parametrize("precision", ["bf16", "int8"])
+    def test_distributions_track_fp32(self, tiny_musicgen_model, precision):
+        """Test reduced precision stays close to the fp32 token distributions."""
+        metrics = check_inference_precision(tiny_musicgen_model, precision, PROMPTS, num_tokens=16)
+
+        assert tiny_musicgen_model.inference_precision == "fp32"
+        assert metrics["kl_divergence"] < 1e-2
+        assert metrics["total_variation"] < 0.05
+        assert metrics["top1_agreement"] > 0.8
+
+    @pytest.mark.parametrize("precision", ["bf16", "int8"])
+    def test_generate(self, tiny_musicgen_model, precision):
+        """Test sampling runs end to end with caches in the inference dtype."""
+        model = tiny_musicgen_model.set_inference_precision(precision)
+
+        output = model.generate(PROMPTS, max_length=12, do_sample=False)
+
+        assert output.shape == (len(PROMPTS), 12)
+        if precision == "bf16":
+            assert model.inference_dtype == torch.bfloat16
+
+    def test_int8_cannot_be_reverted(self, tiny_musicgen_model):
+        """Test quantization is one-way."""
+        model = tiny_musicgen_model.set_inference_precision("int8")
+
+        assert isinstance(model.transformer.lm_head, torch.ao.nn.quantized.dynamic.Linear)
+        with pytest.raises(ValueError):
+            model.set_inference_precision("fp32")
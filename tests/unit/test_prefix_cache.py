@@ -0,0 +1,98 @@
+"""
+Tests for music_gen.generation.prefix_cache
+"""
+
+import copy
+
+import torch
+
+from music_gen.generation.prefix_cache import PrefixCache, PrefixCacheEntry
+from music_gen.models.transformer.cache import StaticKVCache
+
+
+def make_entry(num_floats: int) -> PrefixCacheEntry:
+    """Entry holding exactly ``num_floats`` float32 values."""
+    return PrefixCacheEntry(
+        encoder_outputs={"text_hidden_states": torch.zeros(num_floats - 2), "mask": None},
+        past_key_values=((torch.zeros(1), torch.zeros(1)),),
+        logits=torch.zeros(0),
+    )
+
+
+class TestPrefixCache:
+    """Test the byte-bounded LRU prefix cache."""
+
+    def test_entry_size(self):
+        """Test entry size counts every stored tensor."""
+        assert make_entry(10).nbytes == 40
+
+    def test_lru_eviction_by_bytes(self):
+        """Test least recently used entries are evicted once the budget is exceeded."""
+        cache = PrefixCache(max_bytes=100)
+        cache.put("a", make_entry(10))
+        cache.put("b", make_entry(10))
+        assert cache.get("a") is not None  # "b" is now least recently used
+
+        cache.put("c", make_entry(10))
+
+        assert "a" in cache and "c" in cache and "b" not in cache
+        assert cache.current_bytes == 80
+        assert cache.get_stats()["evictions"] == 1
+
+    def test_oversized_entry_not_cached(self):
+        """Test an entry larger than the whole budget is skipped."""
+        cache = PrefixCache(max_bytes=100)
+        cache.put("a", make_entry(10))
+        cache.put("big", make_entry(100))
+
+        assert "big" not in cache
+        assert "a" in cache
+
+    def test_replace_and_clear(self):
+        """Test re-inserting a key replaces its size, and clear frees everything."""
+        cache = PrefixCache(max_bytes=100)
+        cache.put("a", make_entry(10))
+        cache.put("a", make_entry(20))
+        assert len(cache) == 1
+        assert cache.current_bytes == 80
+
+        cache.clear()
+        assert len(cache) == 0
+        assert cache.current_bytes == 0
+
+    def test_hit_and_miss_counters(self):
+        """Test lookups are counted."""
+        cache = PrefixCache()
+        cache.get("missing")
+        cache.put("a", make_entry(4))
+        cache.get("a")
+
+        stats = cache.get_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+
+    def test_from_static_cache_copies(self):
+        """Test snapshots of a static cache are detached from its buffers."""
+        cache = StaticKVCache(num_layers=1, batch_size=1, num_heads=1, head_dim=2, max_length=4)
+        cache.update(0, torch.ones(1, 1, 1, 2), torch.ones(1, 1, 1, 2))
+        cache.advance(1)
+
+        entry = PrefixCacheEntry.from_step({}, cache, torch.zeros(1, 3))
+        cache.key_cache[0].zero_()
+
+        assert entry.past_key_values[0][0].shape == (1, 1, 1, 2)
+        assert torch.all(entry.past_key_values[0][0] == 1)
+
+        restored = StaticKVCache(num_layers=1, batch_size=1, num_heads=1, head_dim=2, max_length=4)
+        restored.load_legacy_cache(entry.past_key_values)
+        assert restored.get_seq_length() == 1
+        assert torch.all(restored.key_cache[0][:, :, 0] == 1)
+
+    def test_deepcopy_starts_empty(self):
+        """Test copying a model does not copy (or share) its cached state."""
+        cache = PrefixCache(max_bytes=100)
+        cache.put("a", make_entry(4))
+
+        copied = copy.deepcopy(cache)
+        assert copied.max_bytes == 100
+        assert len(copied) == 0
@@ -0,0 +1,67 @@
+"""
+Tests for music_gen.generation.progress
+"""
+
+import pytest
+
+from music_gen.generation.progress import CancellationToken, GenerationProgress, ProgressMonitor
+from music_gen.utils.exceptions import GenerationCancelled
+
+
+class TestCancellationToken:
+    """Test the cooperative cancellation flag."""
+
+    def test_cancel(self):
+        """Test the token raises only once cancelled."""
+        token = CancellationToken()
+        token.raise_if_cancelled()
+        assert not token.cancelled
+
+        token.cancel()
+        assert token.cancelled
+        with pytest.raises(GenerationCancelled):
+            token.raise_if_cancelled()
+
+    def test_callbacks_run_once(self):
+        """Test callbacks run on cancellation, or immediately once cancelled."""
+        token = CancellationToken()
+        calls = []
+        token.add_callback(lambda: calls.append("early"))
+
+        token.cancel()
+        token.cancel()
+        token.add_callback(lambda: calls.append("late"))
+
+        assert calls == ["early", "late"]
+
+
+class TestProgressMonitor:
+    """Test per-step progress reporting."""
+
+    def test_nothing_to_monitor(self):
+        """Test no monitor is created without a callback or token."""
+        assert ProgressMonitor.create(10) is None
+
+    def test_reports_steps(self):
+        """Test every step is reported with its rate."""
+        reports = []
+        monitor = ProgressMonitor.create(4, progress_callback=reports.append)
+
+        for step in range(1, 5):
+            monitor.step(step)
+
+        assert [report.tokens_done for report in reports] == [1, 2, 3, 4]
+        assert all(isinstance(report, GenerationProgress) for report in reports)
+        assert reports[-1].fraction == 1.0
+        assert reports[-1].tokens_per_second > 0
+
+    def test_stops_when_cancelled(self):
+        """Test the step after cancellation raises."""
+        token = CancellationToken()
+        monitor = ProgressMonitor.create(10, cancellation_token=token)
+        monitor.step(1)
+
+        token.cancel()
+        with pytest.raises(GenerationCancelled) as excinfo:
+            monitor.step(2)
+        assert excinfo.value.details["tokens_done"] == 2
@@ -32,3 +32,39 @@ class TestGenerationApi:
         assert response.task_id == "test-task-123"
         assert response.status == "completed"
         assert response.audio_url == "/download/test-task-123"
+
+    def test_cancel_generation(self):
+        """Test cancelling a task stops its generation and marks it cancelled."""
+        import asyncio
+        from unittest.mock import MagicMock, patch
+
+        from music_gen.api.endpoints import generation
+        from music_gen.generation.progress import GenerationProgress
+
+        def fake_generate_single(progress_callback, cancellation_token, **kwargs):
+            progress_callback(GenerationProgress(5, 500, 0.5, 10.0))
+            cancellation_token.raise_if_cancelled()
+
+        model = MagicMock()
+        model.generate_single.side_effect = fake_generate_single
+        manager = MagicMock()
+        manager.get_model.return_value = model
+
+        task_id = "cancel-test"
+        generation.tasks[task_id] = {"status": "pending"}
+        generation.cancellation_tokens[task_id] = generation.CancellationToken()
+        try:
+            response = asyncio.run(generation.cancel_generation(task_id))
+            assert response.status == "cancelling"
+
+            with patch.object(generation, "ModelManager", return_value=manager):
+                asyncio.run(
+                    generation.generate_music_task(task_id, GenerationRequest(prompt="test"))
+                )
+
+            assert generation.tasks[task_id]["status"] == "cancelled"
+            assert generation.tasks[task_id]["progress"]["tokens_done"] == 5
+            assert task_id not in generation.cancellation_tokens
+        finally:
+            generation.tasks.pop(task_id, None)
+            generation.cancellation_tokens.pop(task_id, None)
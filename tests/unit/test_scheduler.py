@@ -0,0 +1,214 @@
+"""
+Tests for music_gen.generation.scheduler
+"""
+
+import pytest
+import torch
+
+from music_gen.generation.progress import CancellationToken
+from music_gen.generation.scheduler import ContinuousBatchingScheduler, DecodeRequest
+from music_gen.utils.exceptions import GenerationCancelled
+
+
+@pytest.fixture
+def model(tiny_musicgen_model):
+    """Small MusicGenModel for scheduling tests."""
+    return tiny_musicgen_model
+
+
+def _reference(model, prompt, max_length, **kwargs):
+    """Generate one prompt on its own with MusicGenModel.generate."""
+    return model.generate([prompt], max_length=max_length, **kwargs)
+
+
+class TestContinuousBatchingScheduler:
+    """Test in-flight batching of decode requests."""
+
+    def test_single_request_matches_generate(self, model):
+        """Test one sampled request reproduces MusicGenModel.generate."""
+        scheduler = ContinuousBatchingScheduler(model, max_batch_size=2, max_length=32)
+
+        torch.manual_seed(0)
+        expected = _reference(model, "warm jazz", 20, temperature=0.8, top_p=0.8)
+        torch.manual_seed(0)
+        result = scheduler.generate(
+            [DecodeRequest("warm jazz", max_length=20, temperature=0.8, top_p=0.8)]
+        )[0]
+
+        assert torch.equal(result, expected)
+
+    def test_requests_join_and_leave_mid_flight(self, model):
+        """Test staggered requests with their own parameters match individual runs."""
+        prompts = ["a b c", "d", "e f g h i", "k l", "m n o"]
+        lengths = [24, 6, 18, 30, 10]
+        penalties = [1.1, 1.3, 1.0, 1.2, 1.1]
+
+        scheduler = ContinuousBatchingScheduler(model, max_batch_size=2, max_length=32)
+        futures = [
+            scheduler.submit(
+                DecodeRequest(prompt, max_length=length, do_sample=False, repetition_penalty=p)
+            )
+            for prompt, length, p in zip(prompts, lengths, penalties)
+        ]
+
+        max_active = 0
+        while scheduler.has_work():
+            max_active = max(max_active, scheduler.step())
+        assert max_active == 2
+
+        for prompt, length, p, future in zip(prompts, lengths, penalties, futures):
+            expected = _reference(model, prompt, length, do_sample=False, repetition_penalty=p)
+            assert torch.equal(future.result(), expected)
+
+    def test_guided_requests_join_and_leave_mid_flight(self, model):
+        """Test guided requests in a shared batch match classifier-free guided generate."""
+        prompts = ["a b c", "d", "e f g h i", "k l"]
+        lengths = [24, 6, 18, 30]
+        scales = [3.0, 1.5, 3.0, 5.0]
+
+        scheduler = ContinuousBatchingScheduler(model, max_batch_size=2, max_length=32, guided=True)
+        futures = [
+            scheduler.submit(
+                DecodeRequest(prompt, max_length=length, do_sample=False, guidance_scale=scale)
+            )
+            for prompt, length, scale in zip(prompts, lengths, scales)
+        ]
+        scheduler.run_until_complete()
+
+        for prompt, length, scale, future in zip(prompts, lengths, scales, futures):
+            expected = _reference(model, prompt, length, do_sample=False, guidance_scale=scale)
+            assert torch.equal(future.result(), expected)
+
+    def test_guidance_must_match_scheduler(self, model):
+        """Test guided and unguided requests are refused by the other kind of scheduler."""
+        unguided = ContinuousBatchingScheduler(model, max_batch_size=1, max_length=8)
+        guided = ContinuousBatchingScheduler(model, max_batch_size=1, max_length=8, guided=True)
+
+        with pytest.raises(ValueError):
+            unguided.submit(DecodeRequest("a", max_length=8, guidance_scale=3.0))
+        with pytest.raises(ValueError):
+            guided.submit(DecodeRequest("a", max_length=8))
+
+    def test_stops_at_eos(self, model):
+        """Test a sequence leaves the batch as soon as it emits EOS."""
+        scheduler = ContinuousBatchingScheduler(model, max_batch_size=1, max_length=16)
+        reference = _reference(model, "a b", 16, do_sample=False)
+        model.eos_token_id = int(reference[0, 3])
+        scheduler.eos_token_id = model.eos_token_id
+
+        result = scheduler.generate([DecodeRequest("a b", max_length=16, do_sample=False)])[0]
+
+        assert result.shape[1] == 4
+        assert result[0, -1] == model.eos_token_id
+
+    def test_background_worker(self, model):
+        """Test futures resolve when decoding runs on the background thread."""
+        scheduler = ContinuousBatchingScheduler(model, max_batch_size=2, max_length=16)
+        scheduler.start()
+        try:
+            futures = [scheduler.submit(DecodeRequest(p, max_length=8)) for p in ["a", "b c", "d"]]
+            results = [future.result(timeout=30) for future in futures]
+        finally:
+            scheduler.stop()
+
+        assert all(result.shape[0] == 1 and result.shape[1] <= 8 for result in results)
+
+    def test_seeded_request_independent_of_batch(self, model):
+        """Test a request with its own generator samples the same tokens in any batch."""
+
+        def seeded():
+            return DecodeRequest(
+                "warm jazz", max_length=16, generator=torch.Generator().manual_seed(7)
+            )
+
+        scheduler = ContinuousBatchingScheduler(model, max_batch_size=4, max_length=32)
+        scheduler.eos_token_id = -1
+        torch.manual_seed(0)
+        alone = scheduler.generate([seeded()])[0]
+
+        torch.manual_seed(1)
+        batched = scheduler.generate(
+            [
+                DecodeRequest("a", max_length=16),
+                seeded(),
+                DecodeRequest("slow ambient drone", max_length=12, temperature=0.7),
+            ]
+        )[1]
+
+        assert torch.equal(batched, alone)
+
+    def test_rejects_oversized_request(self, model):
+        """Test requests longer than the cache capacity are refused."""
+        scheduler = ContinuousBatchingScheduler(model, max_batch_size=1, max_length=8)
+        with pytest.raises(ValueError):
+            scheduler.submit(DecodeRequest("a", max_length=9))
+
+    def test_rejects_delay_pattern_model(self, tiny_delay_musicgen_model):
+        """Test delay-pattern models are refused instead of decoded one codebook per step."""
+        with pytest.raises(ValueError, match="flattened codebook pattern"):
+            ContinuousBatchingScheduler(tiny_delay_musicgen_model, max_batch_size=1, max_length=8)
+
+    def test_cancelled_request_leaves_batch(self, model):
+        """Test a cancelled sequence frees its slot without disturbing the others."""
+        model.eos_token_id = -1
+        scheduler = ContinuousBatchingScheduler(model, max_batch_size=2, max_length=32)
+        scheduler.eos_token_id = -1
+        token = CancellationToken()
+        reports = []
+
+        cancelled = scheduler.submit(
+            DecodeRequest(
+                "a b",
+                max_length=30,
+                do_sample=False,
+                progress_callback=reports.append,
+                cancellation_token=token,
+            )
+        )
+        kept = scheduler.submit(DecodeRequest("c d", max_length=12, do_sample=False))
+        waiting = scheduler.submit(DecodeRequest("e", max_length=6, cancellation_token=token))
+
+        for _ in range(3):
+            scheduler.step()
+        assert scheduler.num_active == 2
+
+        token.cancel()
+        assert waiting.cancelled()
+        scheduler.step()
+        assert scheduler.num_active == 1
+        with pytest.raises(GenerationCancelled):
+            cancelled.result()
+        assert [report.tokens_done for report in reports] == [2, 3, 4]
+
+        scheduler.run_until_complete()
+        assert torch.equal(kept.result(), _reference(model, "c d", 12, do_sample=False))
+
+    def test_failed_step_resets_batch(self, model, monkeypatch):
+        """Test a failing step fails the running requests and leaves a clean batch."""
+        scheduler = ContinuousBatchingScheduler(model, max_batch_size=2, max_length=32)
+        first = scheduler.submit(DecodeRequest("a b", max_length=20, do_sample=False))
+        scheduler.step()
+        second = scheduler.submit(DecodeRequest("c d e", max_length=20, do_sample=False))
+        scheduler.step()
+
+        decode_step = scheduler._decode_step
+
+        def failing_decode_step():
+            monkeypatch.setattr(scheduler, "_decode_step", decode_step)
+            raise RuntimeError("device lost")
+
+        monkeypatch.setattr(scheduler, "_decode_step", failing_decode_step)
+        scheduler.start()
+        try:
+            with pytest.raises(RuntimeError, match="device lost"):
+                first.result(timeout=30)
+            with pytest.raises(RuntimeError, match="device lost"):
+                second.result(timeout=30)
+            assert not scheduler.key_mask.any()
+
+            retry = scheduler.submit(DecodeRequest("c d e", max_length=12, do_sample=False))
+            result = retry.result(timeout=30)
+        finally:
+            scheduler.stop()
+
+        assert torch.equal(result, _reference(model, "c d e", 12, do_sample=False))
@@ -0,0 +1,112 @@
+"""
+Tests for music_gen.generation.speculative
+"""
+
+import copy
+
+import pytest
+import torch
+import torch.nn.functional as F
+
+from music_gen.generation.logits_process import LogitsProcessorList
+from music_gen.generation.speculative import SpeculativeDecoder
+from music_gen.models.transformer.model import MusicGenTransformer
+
+
+class TestSpeculativeDecoder:
+    """Test draft/verify decoding against plain decoding."""
+
+    @pytest.fixture
+    def config(self, test_config):
+        """Small-vocabulary transformer config (copied, test_config is session-scoped)."""
+        config = copy.deepcopy(test_config.transformer)
+        config.vocab_size = 8
+        return config
+
+    @pytest.fixture
+    def models(self, config):
+        """Target and an unrelated draft transformer."""
+        torch.manual_seed(0)
+        target = MusicGenTransformer(config).eval()
+        draft = MusicGenTransformer(config).eval()
+        return target, draft
+
+    def _decode(self, decoder, input_ids, max_length, do_sample):
+        return decoder.generate(
+            input_ids,
+            model_inputs={},
+            draft_inputs={},
+            logits_processor=LogitsProcessorList(),
+            max_length=max_length,
+            do_sample=do_sample,
+        )
+
+    def test_greedy_matches_target(self, models):
+        """Test greedy speculative decoding reproduces the target's greedy output."""
+        target, draft = models
+        input_ids = torch.tensor([[1], [3]])
+
+        expected = input_ids
+        with torch.no_grad():
+            for _ in range(9):
+                logits = target(expected)["logits"][:, -1]
+                expected = torch.cat([expected, logits.argmax(-1, keepdim=True)], dim=-1)
+
+        for num_speculative_tokens in (1, 3, 6):
+            decoder = SpeculativeDecoder(
+                target, draft, num_speculative_tokens=num_speculative_tokens, eos_token_id=-1
+            )
+            output = self._decode(decoder, input_ids, max_length=10, do_sample=False)
+            assert torch.equal(output, expected)
+
+    def test_identical_draft_accepts_everything(self, models):
+        """Test a draft equal to the target never has a proposal rejected."""
+        target, _ = models
+        decoder = SpeculativeDecoder(target, target, num_speculative_tokens=4, eos_token_id=-1)
+
+        torch.manual_seed(0)
+        output = self._decode(decoder, torch.ones(4, 1, dtype=torch.long), 12, do_sample=True)
+
+        assert output.shape == (4, 12)
+        assert decoder.stats["proposed"] > 0
+        assert decoder.stats["accepted"] == decoder.stats["proposed"]
+
+    def test_sampling_preserves_target_distribution(self, models):
+        """Test accept/resample leaves the first token distributed as the target's."""
+        target, draft = models
+        decoder = SpeculativeDecoder(target, draft, num_speculative_tokens=1, eos_token_id=-1)
+        input_ids = torch.ones(20000, 1, dtype=torch.long)
+
+        torch.manual_seed(0)
+        output = self._decode(decoder, input_ids, max_length=3, do_sample=True)
+
+        with torch.no_grad():
+            expected = F.softmax(target(input_ids[:1])["logits"][0, -1], dim=-1)
+        observed = torch.bincount(output[:, 1], minlength=expected.shape[0]).float()
+        observed /= observed.sum()
+        assert 0.5 * (observed - expected).abs().sum() < 0.02
+
+    def test_eos_rows_are_padded(self, models):
+        """Test rows stop at their first EOS and are padded afterwards."""
+        target, draft = models
+        decoder = SpeculativeDecoder(
+            target, draft, num_speculative_tokens=3, eos_token_id=5, pad_token_id=0
+        )
+
+        torch.manual_seed(0)
+        output = self._decode(decoder, torch.ones(16, 1, dtype=torch.long), 20, do_sample=True)
+
+        for row in output:
+            eos = (row == 5).nonzero()
+            if eos.numel():
+                assert torch.all(row[int(eos[0]) + 1 :] == 0)
+
+    def test_vocab_mismatch_raises(self, config, models):
+        """Test draft and target must share a vocabulary."""
+        target, _ = models
+        other = copy.deepcopy(config)
+        other.vocab_size = 16
+        with pytest.raises(ValueError):
+            SpeculativeDecoder(target, MusicGenTransformer(other))
+        with pytest.raises(ValueError):
+            SpeculativeDecoder(target, target, num_speculative_tokens=0)
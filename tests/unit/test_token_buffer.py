@@ -0,0 +1,60 @@
+"""
+Tests for music_gen.generation.token_buffer
+"""
+
+import pytest
+import torch
+
+from music_gen.generation.token_buffer import TokenBuffer
+
+
+class TestTokenBuffer:
+    """Test the preallocated decode token buffer."""
+
+    def test_append_matches_concatenation(self):
+        """Test appending columns reproduces torch.cat growth."""
+        prompt = torch.tensor([[1, 5], [1, 7]])
+        buffer = TokenBuffer.from_tokens(prompt, max_length=6)
+        expected = prompt
+
+        for step in range(4):
+            next_tokens = torch.tensor([[step], [step + 10]])
+            buffer.append(next_tokens)
+            expected = torch.cat([expected, next_tokens], dim=-1)
+
+            assert torch.equal(buffer.view(), expected)
+            assert torch.equal(buffer.last(), next_tokens)
+
+    def test_view_shares_storage(self):
+        """Test views are not copies of the history."""
+        buffer = TokenBuffer.from_tokens(torch.tensor([[1, 2, 3]]), max_length=8)
+        assert buffer.view().data_ptr() == buffer.buffer.data_ptr()
+
+    def test_overflow_raises(self):
+        """Test writing past capacity is refused."""
+        buffer = TokenBuffer.from_tokens(torch.tensor([[1, 2]]), max_length=3)
+        buffer.append(torch.tensor([3]))
+        with pytest.raises(ValueError):
+            buffer.append(torch.tensor([4]))
+
+    def test_reorder_and_select_batch(self):
+        """Test beam reordering and row compaction."""
+        buffer = TokenBuffer.from_tokens(torch.tensor([[1, 2], [3, 4], [5, 6]]), max_length=4)
+
+        buffer.reorder(torch.tensor([2, 2, 0]))
+        assert torch.equal(buffer.view(), torch.tensor([[5, 6], [5, 6], [1, 2]]))
+
+        buffer.select_batch(torch.tensor([2]))
+        buffer.append(torch.tensor([9]))
+        assert buffer.batch_size == 1
+        assert torch.equal(buffer.view(), torch.tensor([[1, 2, 9]]))
+
+    def test_crop(self):
+        """Test cropping drops trailing tokens and the cursor restarts there."""
+        buffer = TokenBuffer.from_tokens(torch.tensor([[1, 2, 3, 4]]), max_length=5)
+
+        buffer.crop(2)
+        buffer.append(torch.tensor([7]))
+        assert torch.equal(buffer.view(), torch.tensor([[1, 2, 7]]))
+        with pytest.raises(ValueError):
+            buffer.crop(4)